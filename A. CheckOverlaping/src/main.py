@@ -1,4 +1,5 @@
 import begin
+import numpy
 
 
 def check_overlapping(first_line, second_line):
@@ -22,6 +23,28 @@ def check_overlapping(first_line, second_line):
     return False
 
 
+def check_overlapping_batch(first_starts, first_ends, second_starts, second_ends):
+    """Check if each pair of lines overlap, with the same rules of check_overlapping, in one vectorized pass.
+    The arguments are sequences of the same length, like numpy arrays, array.array buffers or lists, where the
+    lines of index i are (first_starts[i], first_ends[i]) and (second_starts[i], second_ends[i]).
+    Return a numpy boolean array where index i is True if the lines of index i overlap"""
+
+    arrays = [numpy.asarray(values) for values in (first_starts, first_ends, second_starts, second_ends)]
+
+    if any(array.ndim != 1 for array in arrays):
+        print("Starts and ends must be one dimensional")
+        return None
+
+    if len({len(array) for array in arrays}) != 1:
+        print("Starts and ends must have the same length")
+        return None
+
+    first_starts, first_ends, second_starts, second_ends = arrays
+
+    return (((first_starts <= second_starts) & (second_starts < first_ends)) |
+            ((second_starts <= first_starts) & (first_starts < second_ends)))
+
+
 def get_line_integer_list(line):
     if line is None:
         print("Line must not be empty")
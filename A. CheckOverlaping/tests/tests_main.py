@@ -1,7 +1,10 @@
+import array
 import io
 import unittest
 import unittest.mock
 
+import numpy
+
 from src import main
 
 
@@ -204,5 +207,61 @@ class TestCheckOverlappingMethod(unittest.TestCase):
         self.assertFalse(result)
 
 
+class TestCheckOverlappingBatchMethod(unittest.TestCase):
+    def test_same_result_as_check_overlapping(self):
+        """
+        Test if each pair of lines has the same result of check_overlapping
+        """
+        first_lines = [[1, 5], [1, 5], [-5, -1], [-1, -5], [1, 5], [5, 9], [2, 6], [3, 4]]
+        second_lines = [[2, 6], [6, 8], [-6, -2], [-6, -8], [5, 9], [1, 5], [1, 5], [1, 5]]
+        result = main.check_overlapping_batch(numpy.array([line[0] for line in first_lines]),
+                                              numpy.array([line[1] for line in first_lines]),
+                                              numpy.array([line[0] for line in second_lines]),
+                                              numpy.array([line[1] for line in second_lines]))
+        expected = [main.check_overlapping(first, second) for first, second in zip(first_lines, second_lines)]
+        self.assertEqual(result.dtype, bool)
+        self.assertEqual(result.tolist(), expected)
+
+    def test_touching_lines(self):
+        """
+        Test if lines where one ends where the other starts do not overlap
+        """
+        result = main.check_overlapping_batch([1, 5], [5, 9], [5, 1], [9, 5])
+        self.assertEqual(result.tolist(), [False, False])
+
+    def test_array_buffers(self):
+        """
+        Test if array.array buffers are accepted
+        """
+        result = main.check_overlapping_batch(array.array('q', [1, 1]), array.array('q', [5, 5]),
+                                              array.array('q', [2, 6]), array.array('q', [6, 8]))
+        self.assertEqual(result.tolist(), [True, False])
+
+    def test_empty_input(self):
+        """
+        Test if empty arrays return an empty result
+        """
+        result = main.check_overlapping_batch([], [], [], [])
+        self.assertEqual(len(result), 0)
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_different_lengths_input(self, mock_stdout):
+        """
+        Test if arrays of different lengths are correctly validated
+        """
+        result = main.check_overlapping_batch([1, 2], [5, 6], [2], [6])
+        self.assertIsNone(result)
+        self.assertEqual(mock_stdout.getvalue(), 'Starts and ends must have the same length\n')
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_not_one_dimensional_input(self, mock_stdout):
+        """
+        Test if arrays with more than one dimension are correctly validated
+        """
+        result = main.check_overlapping_batch([[1, 5]], [[5, 9]], [[2, 6]], [[6, 8]])
+        self.assertIsNone(result)
+        self.assertEqual(mock_stdout.getvalue(), 'Starts and ends must be one dimensional\n')
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
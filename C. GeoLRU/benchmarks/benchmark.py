@@ -0,0 +1,183 @@
+import json
+import platform
+import random
+import subprocess
+import time
+import begin
+from benchmarks import stand_ins
+from src import metrics
+from src.settings import CompressionConfig, LocalCacheConfig, MetricsConfig, SerializerConfig
+
+# Number of distinct keys used by each scenario, so big payloads don't fill the memory
+KEYS = 100
+
+# Executions before each measurement, as a fraction of the measured ones
+WARMUP_DIVISOR = 10
+
+
+def percentile(sorted_latencies, percent):
+    """
+    Get a percentile of latencies by the nearest rank method.
+    :param sorted_latencies: Latencies in ascending order.
+    :param percent: Percentile, from 0 to 100.
+    :return: The percentile latency.
+    """
+    index = max(0, int(round(percent / 100 * len(sorted_latencies))) - 1)
+    return sorted_latencies[index]
+
+
+def measure(operation, operations):
+    """
+    Execute an operation many times, measuring each execution. Some executions are done before the measurement, to
+    warm up connections and caches.
+    :param operation: Function that receives the execution index.
+    :param operations: Number of executions.
+    :return: Dictionary with the throughput (operations per second) and the latency percentiles in milliseconds.
+    """
+    for index in range(operations, operations + operations // WARMUP_DIVISOR):
+        operation(index)
+
+    latencies = []
+
+    started_at = time.perf_counter()
+    for index in range(operations):
+        operation_started_at = time.perf_counter()
+        operation(index)
+        latencies.append(time.perf_counter() - operation_started_at)
+    total_seconds = time.perf_counter() - started_at
+
+    latencies.sort()
+    return dict(operations=operations,
+                throughput_ops=round(operations / total_seconds, 1),
+                p50_ms=round(percentile(latencies, 50) * 1000, 4),
+                p99_ms=round(percentile(latencies, 99) * 1000, 4),
+                max_ms=round(latencies[-1] * 1000, 4))
+
+
+def benchmark_redis_client(redis_client, payload_size, operations):
+    """
+    Benchmark the redis client writes and reads of a payload size.
+    :return: List with the scenarios results.
+    """
+    payload = b'x' * payload_size
+    key_prefix = 'benchmark:{}:'.format(payload_size)
+
+    results = [dict(scenario='write', **measure(
+        lambda index: redis_client.write(key_prefix + str(index % KEYS), payload), operations))]
+    results.append(dict(scenario='read_hit', **measure(
+        lambda index: redis_client.read(key_prefix + str(index % KEYS)), operations)))
+    results.append(dict(scenario='read_miss', **measure(
+        lambda index: redis_client.read(key_prefix + 'missing'), operations)))
+
+    for result in results:
+        result['payload_bytes'] = payload_size
+
+    return results
+
+
+def benchmark_lru_client(lru_client, origin_url, payload_size, hit_ratio, operations, seed):
+    """
+    Benchmark the LRU client with a mix of hits (hot URLs in the cache) and misses (URLs requested to the origin).
+    :return: The scenario result.
+    """
+    hot_urls = ['{}/{}/hot-{}-{}'.format(origin_url, payload_size, hit_ratio, index) for index in range(KEYS)]
+    for url in hot_urls:
+        lru_client.request_with_cache(url)
+
+    draws = random.Random(seed)
+    miss_prefix = '{}/{}/miss-{}-{}-'.format(origin_url, payload_size, hit_ratio, time.time())
+
+    def request(index):
+        if draws.random() < hit_ratio:
+            lru_client.request_with_cache(draws.choice(hot_urls))
+        else:
+            lru_client.request_with_cache(miss_prefix + str(index), cache_expiration=60)
+
+    return dict(scenario='request_mix', payload_bytes=payload_size, hit_ratio=hit_ratio,
+                **measure(request, operations))
+
+
+def get_commit():
+    """
+    Get the current git commit, to identify the results.
+    :return: The commit hash, or None if it's not a git repository.
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """
+    Print the throughput change of each scenario against the results of a previous run.
+    :param results: Current results.
+    :param baseline_path: File with the previous results.
+    """
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+
+    def scenario_key(result):
+        return result['scenario'], result['payload_bytes'], result.get('hit_ratio')
+
+    baseline_results = {scenario_key(result): result for result in baseline['results']}
+
+    print('Comparison with {} (commit {}):'.format(baseline_path, baseline.get('commit')))
+    for result in results['results']:
+        baseline_result = baseline_results.get(scenario_key(result))
+        if baseline_result is not None:
+            change = (result['throughput_ops'] / baseline_result['throughput_ops'] - 1) * 100
+            print('  {:<12} {:>9} bytes {:>6} {:+7.1f}% throughput, p99 {} ms -> {} ms'.format(
+                result['scenario'], result['payload_bytes'], result.get('hit_ratio') or '', change,
+                baseline_result['p99_ms'], result['p99_ms']))
+
+
+@begin.start(auto_convert=True)
+def main(operations: 'Operations per scenario' = 1000,
+         payload_sizes: 'Payload sizes in bytes, comma separated' = '100,10000,1000000',
+         hit_ratios: 'Hit ratios of the requests mix, comma separated' = '0.5,0.9,0.99',
+         output: 'File where the results are saved in json' = 'benchmark.json',
+         baseline: 'Results file of a previous run to compare with' = '',
+         seed: 'Random seed of the requests mix' = 42):
+    """ Benchmark the GeoLRU clients against an in-process Redis and a local HTTP origin """
+    stand_ins.install()
+    origin_url, origin = stand_ins.start_origin()
+
+    # Imported after the stand-ins installation, so they use them
+    from src.geo_lru import LruClient
+
+    lru_client = LruClient()
+    payload_sizes = [int(size) for size in payload_sizes.split(',')]
+    hit_ratios = [float(ratio) for ratio in hit_ratios.split(',')]
+    metrics.registry.reset()
+
+    results = []
+    try:
+        for payload_size in payload_sizes:
+            results.extend(benchmark_redis_client(lru_client.redis_client, payload_size, operations))
+            for hit_ratio in hit_ratios:
+                results.append(benchmark_lru_client(lru_client, origin_url, payload_size, hit_ratio, operations,
+                                                    seed))
+    finally:
+        origin.shutdown()
+
+    results = dict(commit=get_commit(),
+                   timestamp=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                   python=platform.python_version(),
+                   settings=dict(serializer=SerializerConfig.SERIALIZER,
+                                 compressor=CompressionConfig.COMPRESSOR,
+                                 local_cache=LocalCacheConfig.ENABLED,
+                                 metrics=MetricsConfig.ENABLED),
+                   results=results)
+
+    with open(output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+
+    for result in results['results']:
+        print('{:<12} {:>9} bytes {:>6} {:>10} ops/s  p50 {:>8} ms  p99 {:>8} ms'.format(
+            result['scenario'], result['payload_bytes'], result.get('hit_ratio') or '', result['throughput_ops'],
+            result['p50_ms'], result['p99_ms']))
+    print('Results saved in {}'.format(output))
+
+    if baseline:
+        compare(results, baseline)
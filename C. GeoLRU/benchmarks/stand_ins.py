@@ -0,0 +1,130 @@
+import contextlib
+import http.server
+import threading
+import unittest.mock
+import fakeredis
+from src import async_redis_client, redis_client
+from src.geo_lru import LruClient
+from src.settings import LocationCacheConfig, RedisConfig
+
+# Addresses and locations of the stand-in servers: the client is in Montreal, the master in New York and the
+# slaves in Paris and Toronto
+MY_LOCATION = (45.50, -73.57)
+MASTER_ADDRESS = ('10.0.0.1', 6379)
+SLAVES_ADDRESSES = [('10.0.0.2', 6379), ('10.0.0.3', 6379)]
+SERVERS_LOCATIONS = {
+    '10.0.0.1': (40.71, -74.01),
+    '10.0.0.2': (48.86, 2.35),
+    '10.0.0.3': (43.65, -79.38),
+}
+
+
+class StandInSentinel:
+    """
+    Sentinel that always discovers the stand-in master and slaves.
+    """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    @staticmethod
+    def discover_master(master_name):
+        return MASTER_ADDRESS
+
+    @staticmethod
+    def discover_slaves(master_name):
+        return list(SLAVES_ADDRESSES)
+
+
+class AsyncStandInSentinel:
+    """
+    Asyncio version of StandInSentinel.
+    """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    @staticmethod
+    async def discover_master(master_name):
+        return MASTER_ADDRESS
+
+    @staticmethod
+    async def discover_slaves(master_name):
+        return list(SLAVES_ADDRESSES)
+
+
+class OriginHandler(http.server.BaseHTTPRequestHandler):
+    """
+    HTTP origin answering GET /<size>/<anything> with a body of <size> bytes.
+    """
+
+    def do_GET(self):
+        size = int(self.path.split('/')[1])
+        self.send_response(200)
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        self.wfile.write(b'x' * size)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _get_replacements(server):
+    """
+    Get the attributes replaced to use the stand-ins.
+    :param server: The fakeredis server.
+    :return: List of (object, attribute name, new value).
+    """
+    return [
+        (redis_client, 'Sentinel', StandInSentinel),
+        (redis_client.RedisCli, '_redis_server_connection',
+         lambda self, ip, port, socket_timeout=None: fakeredis.FakeRedis(server=server)),
+        (async_redis_client, 'Sentinel', AsyncStandInSentinel),
+        (async_redis_client.AsyncRedisCli, '_redis_server_connection',
+         lambda self, ip, port, socket_timeout=None: fakeredis.FakeAsyncRedis(server=server)),
+        (redis_client, 'get_ip_location_ipinfo', lambda ip=None: None),
+        (RedisConfig, 'SENTINEL_SERVERS', [('127.0.0.1', 26379)]),
+        (RedisConfig, 'MY_LOCATION', MY_LOCATION),
+        (RedisConfig, 'SERVERS_LOCATIONS', SERVERS_LOCATIONS),
+        (LocationCacheConfig, 'FILE_PATH', None),
+    ]
+
+
+def install():
+    """
+    Make the clients use an in-process Redis (fakeredis) instead of the sentinel and servers, and static locations
+    instead of the IP location service. The master and the slaves share the same data, so writes are replicated
+    instantly.
+    :return: The fakeredis server.
+    """
+    server = fakeredis.FakeServer()
+
+    for target, attribute, value in _get_replacements(server):
+        setattr(target, attribute, value)
+
+    return server
+
+
+@contextlib.contextmanager
+def installed():
+    """
+    Install the stand-ins (see install) only inside the context, e.g. in tests. The LRU clients created inside it
+    don't share their redis clients with the ones created outside.
+    :return: The fakeredis server.
+    """
+    server = fakeredis.FakeServer()
+
+    with contextlib.ExitStack() as stack:
+        for target, attribute, value in _get_replacements(server) + [(LruClient, '_redis_clients', {})]:
+            stack.enter_context(unittest.mock.patch.object(target, attribute, value))
+        yield server
+
+
+def start_origin():
+    """
+    Start the local HTTP origin in a background thread.
+    :return: The origin base URL and the server, to be shut down after use.
+    """
+    origin = http.server.ThreadingHTTPServer(('127.0.0.1', 0), OriginHandler)
+    threading.Thread(target=origin.serve_forever, name='benchmark-origin', daemon=True).start()
+    return 'http://127.0.0.1:{}'.format(origin.server_port), origin
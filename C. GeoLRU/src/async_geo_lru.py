@@ -0,0 +1,379 @@
+import asyncio
+import http.client
+import time
+import aiohttp
+import multidict
+import yarl
+from src import cache_entry, http_cache, keys, metrics
+from src.async_redis_client import AsyncRedisCli
+from src.local_cache import create_local_cache
+from src.settings import HttpCacheConfig, RedisConfig, RequestCoalescingConfig, SlidingExpirationConfig, StaleConfig, \
+    StreamConfig
+from src.single_flight import AsyncSingleFlight
+
+
+class AsyncLruClient:
+    """
+    Asyncio version of geo_lru.LruClient. It must be connected with "connect" before use and closed with "close"
+    after use, or used as an async context manager.
+    """
+
+    # Shared by all instances, so concurrent misses of the same key in the process do a single request
+    _single_flight = AsyncSingleFlight()
+
+    def __init__(self, namespace=None):
+        """
+        Create an instance of LRU client.
+        :param namespace: Namespace prefixed to the keys of this client, e.g. to limit the space they use in the
+                          cache with "QuotaConfig". If None, "KeyConfig.NAMESPACE" is used.
+        """
+        self.namespace = namespace
+        self.redis_client = AsyncRedisCli(RedisConfig.SENTINEL_SERVERS,
+                                          RedisConfig.SENTINEL_MASTER_NAME,
+                                          RedisConfig.SERVERS_PASSWORD,
+                                          RedisConfig.SENTINEL_SOCKET_TIMEOUT,
+                                          create_local_cache())
+        self.http_session = None
+        self._revalidate_tasks = {}
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def connect(self):
+        """
+        Connect to the redis servers and open the HTTP session.
+        """
+        await self.redis_client.connect()
+        self.http_session = aiohttp.ClientSession()
+
+    async def close(self):
+        """
+        Close the connections with the redis servers and the HTTP session, cancelling the requests of stale keys
+        executed in background.
+        """
+        for task in list(self._revalidate_tasks.values()):
+            task.cancel()
+
+        await self.redis_client.close()
+
+        if self.http_session is not None:
+            await self.http_session.close()
+            self.http_session = None
+
+    async def request_with_cache(self,
+                                 url,
+                                 data=None,
+                                 headers={},
+                                 method=None,
+                                 cache_expiration=None):
+        """
+        Execute a request, but before that, checks if it's value is in cache.
+        :param url: Request URL.
+        :param data: Request data.
+        :param headers: Request headers.
+        :param method: Request method. If None, POST is used when there is data, otherwise GET.
+        :param cache_expiration: Time to expire this key in the cache. If HTTP caching is enabled, it's used only
+                                 for responses without Cache-Control or Expires headers.
+        :return:
+        """
+        started_at = time.perf_counter()
+
+        if method is None:
+            method = 'GET' if data is None else 'POST'
+
+        key_name = keys.get_cache_key(url, method, data, headers, self.namespace)
+        value_from_cache, expires_at, validators = cache_entry.unpack(await self.redis_client.read(key_name))
+        request = (key_name, url, method, data, headers)
+
+        state = cache_entry.get_state(value_from_cache, expires_at)
+        metrics.increment('geo_lru_requests_total', state=state)
+
+        try:
+            if state == 'miss':
+                return await self._single_flight.do(key_name, self._request_and_cache, request, cache_expiration)
+
+            if state == 'error':
+                self._raise_cached_error(request, value_from_cache)
+
+            if expires_at is None:
+                if SlidingExpirationConfig.ENABLED and not HttpCacheConfig.ENABLED:
+                    self.redis_client.touch(key_name, cache_expiration)
+                return value_from_cache
+
+            return await self._handle_expiring_value(request, value_from_cache, expires_at, validators,
+                                                     cache_expiration)
+        finally:
+            metrics.observe('geo_lru_request_seconds', time.perf_counter() - started_at, state=state)
+
+    async def request_with_cache_stream(self, url, headers={}, cache_expiration=None):
+        """
+        Execute a GET request, but before that, checks if it's value is in cache, without keeping the entire value
+        in memory: it's read from the origin and from the cache in chunks of "StreamConfig.CHUNK_SIZE_BYTES", each
+        one written in its own key. Use it for big responses.
+        :param url: Request URL.
+        :param headers: Request headers.
+        :param cache_expiration: Time to expire this key in the cache.
+        :return: Async iterator over the value chunks.
+        """
+        key_name = keys.get_cache_key(url, namespace=self.namespace)
+        chunks = await self.redis_client.read_stream(key_name)
+        if chunks is not None:
+            return chunks
+
+        response = await self.http_session.get(url, headers=headers)
+        try:
+            response.raise_for_status()
+        except aiohttp.ClientResponseError:
+            response.release()
+            raise
+
+        return self._stream_and_cache(key_name, response, cache_expiration)
+
+    async def get_quota_usage(self):
+        """
+        Get the usage of the namespaces with quota (see QuotaConfig), shared by all clients.
+        :return: Dictionary with the quota, bytes used and number of keys by namespace, or None if error.
+        """
+        return await self.redis_client.get_quota_usage()
+
+    async def _stream_and_cache(self, key_name, response, cache_expiration):
+        """
+        Read a response in chunks, writing them in the cache as they are read. If the response is not read until
+        its end, it's not added to the cache.
+        :param key_name: Cache key name.
+        :param response: Response to be read.
+        :param cache_expiration: Time to expire this key in the cache.
+        :return: Async iterator over the response chunks.
+        """
+        stream_writer = self.redis_client.create_stream_writer(key_name, cache_expiration)
+
+        try:
+            async for chunk in response.content.iter_chunked(StreamConfig.CHUNK_SIZE_BYTES):
+                await stream_writer.write(chunk)
+                yield chunk
+        finally:
+            response.release()
+
+        await stream_writer.close()
+
+    async def _handle_expiring_value(self, request, value_from_cache, expires_at, validators, cache_expiration):
+        """
+        Get the value of a key written with its expiration time. While it's fresh, the value from the cache is
+        returned. After its expiration, it's returned stale while it's requested again in background
+        (stale-while-revalidate) or if the new request fails (stale-if-error). If it has HTTP validators, it's
+        revalidated with a conditional request.
+        :param request: Cache key name, URL, method, data and headers of the request.
+        :param value_from_cache: Value read from the cache.
+        :param expires_at: Timestamp when the value expires.
+        :param validators: HTTP validators of the value.
+        :param cache_expiration: Time to expire this key in the cache.
+        :return: The request result.
+        """
+        key_name = request[0]
+        stale_seconds = time.time() - expires_at
+
+        if stale_seconds < 0:
+            return value_from_cache
+
+        if stale_seconds < (StaleConfig.STALE_WHILE_REVALIDATE_SECONDS or 0):
+            if key_name not in self._revalidate_tasks:
+                task = asyncio.get_running_loop().create_task(
+                    self._revalidate(request, cache_expiration, value_from_cache, validators))
+                self._revalidate_tasks[key_name] = task
+            return value_from_cache
+
+        try:
+            return await self._single_flight.do(key_name, self._request_and_cache, request, cache_expiration,
+                                                value_from_cache, validators)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            if stale_seconds < (StaleConfig.STALE_IF_ERROR_SECONDS or 0) and self._is_origin_error(error):
+                return value_from_cache
+            raise
+
+    async def _write(self, key_name, value, expiration_seconds, url):
+        """
+        Write a value in the cache.
+        :param key_name: Cache key name.
+        :param value: Value to be written.
+        :param expiration_seconds: Time to expire this key in seconds.
+        :param url: Original URL of the key, written with it if "KeyConfig.STORE_ORIGINAL_URL" is enabled.
+        """
+        values = keys.add_original_urls({key_name: value}, {key_name: url})
+
+        if len(values) == 1:
+            await self.redis_client.write(key_name, value, expiration_seconds)
+        else:
+            await self.redis_client.write_many(values, expiration_seconds)
+
+    async def _cache_error(self, key_name, status, url):
+        """
+        Write an origin error in the cache, if errors with its status are cached, so it's raised again without
+        requesting the origin until it expires.
+        :param key_name: Cache key name.
+        :param status: HTTP status of the error.
+        :param url: Request URL.
+        """
+        error_expiration = cache_entry.get_error_expiration(status)
+        if error_expiration is not None:
+            await self._write(key_name, cache_entry.pack_error(status), error_expiration, url)
+
+    @staticmethod
+    def _raise_cached_error(request, value_from_cache):
+        """
+        Raise the origin error read from the cache.
+        :param request: Cache key name, URL, method, data and headers of the request.
+        :param value_from_cache: Error read from the cache.
+        """
+        _, url, method, _, headers = request
+        status = cache_entry.get_error_status(value_from_cache)
+        request_info = aiohttp.RequestInfo(yarl.URL(url), method,
+                                           multidict.CIMultiDictProxy(multidict.CIMultiDict(headers)), yarl.URL(url))
+        raise aiohttp.ClientResponseError(request_info, (), status=status,
+                                          message=http.client.responses.get(status, ''))
+
+    @staticmethod
+    def _is_origin_error(error):
+        """
+        Check if a request error is an origin failure, so a stale value can be returned instead: network errors,
+        timeouts and server errors. Client errors (HTTP status 4xx) are not.
+        :param error: Request error.
+        :return: True | False
+        """
+        return not isinstance(error, aiohttp.ClientResponseError) or error.status >= 500
+
+    async def _revalidate(self, request, cache_expiration, stale_value, validators):
+        """
+        Execute a request of a stale key and add its result to the cache.
+        :param request: Cache key name, URL, method, data and headers of the request.
+        :param cache_expiration: Time to expire this key in the cache.
+        :param stale_value: Value in the cache.
+        :param validators: HTTP validators of the value in the cache.
+        """
+        try:
+            await self._single_flight.do(request[0], self._request_and_cache, request, cache_expiration,
+                                         stale_value, validators)
+        except Exception:
+            # The stale value is still in the cache, so it will be requested again on its next read
+            pass
+        finally:
+            self._revalidate_tasks.pop(request[0], None)
+
+    async def _request_and_cache(self, request, cache_expiration, stale_value=None, validators=None):
+        """
+        Execute a request and add its result to the cache. If the distributed lock is enabled and another client
+        is already executing the same request, wait for its result in the cache instead.
+        :param request: Cache key name, URL, method, data and headers of the request.
+        :param cache_expiration: Time to expire this key in the cache.
+        :param stale_value: Expired value in the cache, if any.
+        :param validators: HTTP validators of the expired value, to revalidate it with a conditional request.
+        :return: The request result.
+        """
+        key_name, url, method, data, headers = request
+        lock = None
+
+        if RequestCoalescingConfig.DISTRIBUTED_LOCK_ENABLED:
+            lock = await self.redis_client.acquire_lock(key_name, RequestCoalescingConfig.LOCK_TIMEOUT_SECONDS)
+            if lock is None:
+                value_from_cache = await self._wait_for_cache(key_name)
+                if cache_entry.get_error_status(value_from_cache) is not None:
+                    self._raise_cached_error(request, value_from_cache)
+                if value_from_cache is not None:
+                    return value_from_cache
+
+        try:
+            if HttpCacheConfig.ENABLED:
+                return await self._request_http_and_cache(request, cache_expiration, stale_value, validators)
+
+            started_at = time.perf_counter()
+
+            try:
+                async with self.http_session.request(method, url, data=data, headers=headers) as response:
+                    response.raise_for_status()
+                    response_data = await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                metrics.increment('geo_lru_origin_errors_total')
+                raise
+
+            metrics.observe('geo_lru_origin_request_seconds', time.perf_counter() - started_at)
+
+            await self._write(key_name,
+                              cache_entry.pack(response_data, cache_expiration),
+                              cache_entry.get_storage_expiration(cache_expiration),
+                              url)
+            return response_data
+        except aiohttp.ClientResponseError as error:
+            # An error must not replace a stale value, which can still be returned
+            if stale_value is None:
+                await self._cache_error(key_name, error.status, url)
+            raise
+        finally:
+            if lock is not None:
+                await self.redis_client.release_lock(lock)
+
+    async def _request_http_and_cache(self, request, cache_expiration, stale_value=None, validators=None):
+        """
+        Execute a request and add its result to the cache according to its HTTP caching headers. If there is an
+        expired value with validators, the request is conditional and, if the server answers 304 (not modified),
+        the expired value is renewed in the cache without downloading it again.
+        :param request: Cache key name, URL, method, data and headers of the request.
+        :param cache_expiration: Time to expire this key if the response has no caching headers.
+        :param stale_value: Expired value in the cache, if any.
+        :param validators: HTTP validators of the expired value.
+        :return: The request result.
+        """
+        key_name, url, method, data, headers = request
+
+        if stale_value is None:
+            validators = None
+
+        request_headers = dict(headers, **http_cache.get_conditional_headers(validators))
+
+        started_at = time.perf_counter()
+
+        try:
+            async with self.http_session.request(method, url, data=data, headers=request_headers) as response:
+                if response.status == 304 and validators is not None:
+                    response_data = stale_value
+                else:
+                    response.raise_for_status()
+                    response_data = await response.read()
+                    validators = None
+                response_headers = response.headers
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            metrics.increment('geo_lru_origin_errors_total')
+            raise
+
+        metrics.observe('geo_lru_origin_request_seconds', time.perf_counter() - started_at)
+
+        if http_cache.is_storable(request_headers, response_headers):
+            cache_expiration = http_cache.get_cache_expiration(response_headers, cache_expiration)
+            validators = http_cache.get_validators(response_headers, validators)
+            storage_expiration = cache_entry.get_storage_expiration(cache_expiration, validators)
+
+            if storage_expiration is None or storage_expiration > 0:
+                await self._write(key_name,
+                                  cache_entry.pack(response_data, cache_expiration, validators),
+                                  storage_expiration,
+                                  url)
+
+        return response_data
+
+    async def _wait_for_cache(self, key_name):
+        """
+        Wait for another client to add a key to the cache.
+        :param key_name: Cache key name.
+        :return: The key value, or None if it wasn't added to the cache in time.
+        """
+        deadline = time.monotonic() + RequestCoalescingConfig.LOCK_WAIT_SECONDS
+
+        while time.monotonic() < deadline:
+            await asyncio.sleep(RequestCoalescingConfig.LOCK_POLL_INTERVAL_SECONDS)
+            value_from_cache, expires_at, _ = cache_entry.unpack(await self.redis_client.read(key_name))
+            if value_from_cache is not None and (expires_at is None or expires_at > time.time()):
+                return value_from_cache
+
+        return None
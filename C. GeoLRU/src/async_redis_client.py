@@ -0,0 +1,594 @@
+import asyncio
+import time
+import redis
+import redis.asyncio
+from redis.asyncio.sentinel import MasterNotFoundError, Sentinel
+from src import invalidation, quotas, serializers, streams
+from src.redis_client import _NOT_CACHED, BaseRedisCli
+from src.settings import InvalidationConfig, QuotaConfig
+
+
+class AsyncRedisCli(BaseRedisCli):
+    """
+    Asyncio redis client, with the same behavior of redis_client.RedisCli. It must be connected with "connect"
+    before use and closed with "close" after use.
+    """
+
+    def __init__(self, sentinels_addresses, master_name, master_password=None, sentinel_socket_timeout=1.0,
+                 local_cache=None, serializer=None):
+        """
+        Create an instance of asyncio redis client, not connected yet (see connect).
+        :param sentinels_addresses: redis sentinel addresses
+        :param master_name: redis master name
+        :param master_password: redis master password
+        :param sentinel_socket_timeout: redis sentinel socket timeout
+        :param local_cache: optional in-process cache (local_cache.LocalCache) checked before the redis servers
+        :param serializer: serializer used to write values. If None, the one configured in the settings is used
+        """
+        super().__init__(sentinels_addresses, master_name, master_password, sentinel_socket_timeout, local_cache,
+                         serializer)
+        self.sentinel = None
+        self._touch_task = None
+        self._access_task = None
+        self._invalidations_task = None
+
+    async def connect(self):
+        """
+        Connect to the sentinel and load masters and slaves list.
+        """
+        self.sentinel = Sentinel(self.sentinels_addresses, socket_timeout=self.sentinel_socket_timeout)
+        await self._load_master()
+        await self._load_slaves()
+        self._load_nearest_cache()
+
+        if InvalidationConfig.ENABLED and self.local_cache is not None:
+            self._invalidations_task = asyncio.get_running_loop().create_task(self._listen_invalidations())
+
+    async def close(self):
+        """
+        Close the connections with the master and the slave servers, renewing the keys touched and ranking the
+        keys read before. Nothing is done if the client is not connected.
+        """
+        if self.sentinel is None:
+            return
+
+        if self._touch_task is not None:
+            self._touch_task.cancel()
+            self._touch_task = None
+
+        if self._access_task is not None:
+            self._access_task.cancel()
+            self._access_task = None
+
+        if self._invalidations_task is not None:
+            self._invalidations_task.cancel()
+            self._invalidations_task = None
+
+        pending = self._touch_batcher.pop_pending()
+        if pending:
+            await self.expire_many(pending)
+
+        accesses = self._access_batcher.pop_pending()
+        if accesses:
+            await self.rank_accesses(accesses)
+
+        if self.master is not None:
+            await self.master.aclose()
+
+        for connection in self._slave_connections.values():
+            await connection.aclose()
+
+        self.master = None
+        self.nearest_cache = None
+        self.read_servers = []
+        self._slave_connections = {}
+        self.sentinel = None
+
+    def _redis_server_connection(self, ip, port, socket_timeout=None):
+        """
+        Return a new instance os asyncio redis server connection.
+        :param ip: Server IP.
+        :param port: Server port.
+        :param socket_timeout: Server socket timeout. If None, the servers socket timeout is used.
+        :return: A new instance of redis server connection.
+        """
+        return redis.asyncio.Redis(
+                host=ip,
+                port=port,
+                password=self.master_password,
+                socket_timeout=socket_timeout or self.server_socket_timeout,
+                socket_connect_timeout=self.server_socket_connect_timeout)
+
+    async def _load_master(self):
+        """
+        Communicates with sentinel and load redis master server.
+        """
+        self.master = None
+
+        try:
+            master_info = await self.sentinel.discover_master(self.master_name)
+        except MasterNotFoundError:
+            return
+
+        if master_info is not None:
+            master_ip, master_port = master_info
+            self.master = self._redis_server_connection(master_ip, master_port, self.master_socket_timeout)
+            self.master_address = master_info
+
+    async def _get_ip_location_async(self, ip=None):
+        """
+        Get an IP location coordinates without blocking the event loop.
+        :param ip: IP to get coordinates.
+        :return: Null if fail or the coordinates if success.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, self._get_ip_location, ip)
+
+    async def _load_slaves(self):
+        """
+        Load the slaves list, getting my location and the slaves locations concurrently.
+        """
+        self.slaves = []
+
+        if self.master is None:
+            return
+
+        sentinel_slaves = await self.sentinel.discover_slaves(self.master_name)
+        # TODO remove
+        sentinel_slaves = [slave for slave in sentinel_slaves if slave[0] != '127.0.0.1']
+
+        # My location (IP None) is loaded with the slaves locations, so it will be possible to calculate distance
+        ips = [None] + [slave[0] for slave in sentinel_slaves]
+        my_location, *ip_locations = await asyncio.gather(*[self._get_ip_location_async(ip) for ip in ips])
+
+        if self.my_location is None:
+            self.my_location = my_location
+            if self.my_location is None:
+                # If my location is unknown, it will not be possible to calculate the nearest slave
+                return
+
+        self.slaves = [self._build_slave(slave, ip_location)
+                       for slave, ip_location in zip(sentinel_slaves, ip_locations)]
+
+    async def _listen_invalidations(self):
+        """
+        Remove from the local cache the keys invalidated by other clients until the client is closed, subscribing
+        again after errors. The local cache is cleared when subscribing, since invalidations may have been lost
+        while not subscribed.
+        """
+        while True:
+            pubsub = None
+
+            try:
+                pubsub = self._get_invalidations_server().pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(InvalidationConfig.CHANNEL)
+                self.local_cache.clear()
+
+                while True:
+                    self._invalidate_local_cache(await pubsub.get_message(timeout=1.0))
+            except (redis.RedisError, OSError):
+                await asyncio.sleep(InvalidationConfig.RETRY_INTERVAL_SECONDS)
+            finally:
+                if pubsub is not None:
+                    await pubsub.aclose()
+
+    async def _read_with_failover(self, command, command_name='get'):
+        """
+        Execute a read command in the nearest available server. Servers that fail are skipped, trying the next
+        nearest slave and finally the master, and are not used again until their circuit breaker allows it.
+        :param command: Function that receives a server connection and returns the command awaitable.
+        :param command_name: Command name, for the metrics.
+        :return: The command result, or None if all servers failed.
+        """
+        for address, server in self.read_servers:
+            circuit_breaker = self._get_circuit_breaker(address)
+            if not circuit_breaker.allow_request():
+                continue
+
+            started_at = time.perf_counter()
+            try:
+                result = await command(server)
+            except redis.RedisError as error:
+                if self._is_pool_exhausted(error):
+                    circuit_breaker.release()
+                else:
+                    circuit_breaker.record_failure()
+                self._record_command(address, command_name, started_at, failed=True)
+                continue
+
+            circuit_breaker.record_success()
+            self._record_command(address, command_name, started_at)
+            return result
+
+        return None
+
+    async def _read_writen_values(self, key_names, command_name):
+        """
+        Read raw values from the nearest available server. If the local cache is enabled, the keys remaining time
+        to live is read in the same request, so they don't stay in the local cache after expiring in the servers.
+        :param key_names: Names of the keys to read.
+        :param command_name: Command name, for the metrics.
+        :return: Lists with the raw values (None for keys not found or error) and the remaining times to live in
+                 milliseconds (None if not read), in the same order of key_names.
+        """
+        if self.local_cache is None:
+            if len(key_names) == 1:
+                writen_values = [await self._read_with_failover(lambda server: server.get(key_names[0]),
+                                                                command_name)]
+            else:
+                writen_values = await self._read_with_failover(lambda server: server.mget(key_names), command_name)
+
+            return writen_values or [None] * len(key_names), [None] * len(key_names)
+
+        def command(server):
+            pipeline = server.pipeline(transaction=False)
+            self._add_read_commands(pipeline, key_names)
+            return pipeline.execute()
+
+        return self._split_read_results(await self._read_with_failover(command, command_name), key_names)
+
+    async def read(self, key_name, default=None):
+        """
+        Read a value from the nearest cache server, restoring it data type to the original ones.
+        :param key_name: Name of the key to read from server.
+        :param default: Value returned if the key is not found, to tell it from keys whose value is None.
+        :return: The key value obtained from server, or default if not found or error
+        """
+        value = self._read_from_local_cache(key_name)
+        if value is not _NOT_CACHED:
+            self._record_reads('local', 1)
+            self._record_accesses([key_name])
+            return value
+
+        (writen_value,), (ttl_milliseconds,) = await self._read_writen_values([key_name], 'get')
+        self._record_reads('redis', int(writen_value is not None), int(writen_value is None))
+        if writen_value is None:
+            return default
+
+        self._record_accesses([key_name])
+
+        value = self._decode_writen_value(writen_value)
+        self._add_read_to_local_cache(key_name, value, writen_value, ttl_milliseconds)
+
+        return value
+
+    async def read_many(self, key_names, default=None):
+        """
+        Read many values from the nearest cache server in a single request (MGET), restoring their data types to
+        the original ones.
+        :param key_names: Names of the keys to read from server.
+        :param default: Value returned for keys not found, to tell them from keys whose value is None.
+        :return: List with the keys values, in the same order of key_names. Default for keys not found.
+        """
+        values = [self._read_from_local_cache(key_name) for key_name in key_names]
+        missing_indexes = [index for index, value in enumerate(values) if value is _NOT_CACHED]
+
+        self._record_reads('local', len(key_names) - len(missing_indexes))
+        for index in missing_indexes:
+            values[index] = default
+
+        if missing_indexes:
+            missing_key_names = [key_names[index] for index in missing_indexes]
+            writen_values, ttls_milliseconds = await self._read_writen_values(missing_key_names, 'mget')
+
+            hits = sum(writen_value is not None for writen_value in writen_values)
+            self._record_reads('redis', hits, len(missing_key_names) - hits)
+
+            for index, key_name, writen_value, ttl_milliseconds in zip(missing_indexes, missing_key_names,
+                                                                       writen_values, ttls_milliseconds):
+                if writen_value is not None:
+                    values[index] = self._decode_writen_value(writen_value)
+                    self._add_read_to_local_cache(key_name, values[index], writen_value, ttl_milliseconds)
+
+        self._record_accesses([key_name for key_name, value in zip(key_names, values) if value is not default])
+        return values
+
+    async def _execute_in_master(self, add_commands):
+        """
+        Execute commands in the master database in a single request. If the quota script isn't loaded in the master
+        (first write, failover or restart), load it and execute the commands again.
+        :param add_commands: Function that adds the commands to a pipeline.
+        :return: Results of the commands.
+        """
+        try:
+            pipeline = self.master.pipeline(transaction=False)
+            add_commands(pipeline)
+            return await pipeline.execute()
+        except redis.exceptions.NoScriptError:
+            await self.master.script_load(quotas.RECORD_WRITE_SCRIPT)
+
+        pipeline = self.master.pipeline(transaction=False)
+        add_commands(pipeline)
+        return await pipeline.execute()
+
+    async def write(self, key_name, value, expiration_seconds=None):
+        """
+        Write a value in the master database to be replicated to all others.
+        :param key_name: Name of the key to be written.
+        :param value: Value.
+        :param expiration_seconds: Time to expire this key in seconds.
+        :return: True: key/value were written | False: error.
+        """
+        object_to_write = None
+        evicted = []
+
+        def add_commands(pipeline):
+            # Record its size and broadcast its invalidation in the same request
+            pipeline.set(key_name, object_to_write, ex=expiration_seconds)
+            quotas.add_write_commands(pipeline, self._client_id, {key_name: len(object_to_write)}, expiration_seconds)
+            invalidation.add_publish_command(pipeline, self._client_id, [key_name])
+
+        if self.master is not None:
+            try:
+                object_to_write = self._get_object_to_write(value)
+                started_at = time.perf_counter()
+                evicted = quotas.record_evictions(await self._execute_in_master(add_commands))
+                self._record_command(self.master_address, 'set', started_at)
+            except redis.RedisError:
+                self._record_command(self.master_address, 'set', None, failed=True)
+                object_to_write = None
+            except serializers.SerializationError:
+                object_to_write = None
+
+        self._add_write_to_local_cache(key_name, object_to_write, expiration_seconds)
+        self._remove_evicted_from_local_cache(evicted)
+        return object_to_write is not None
+
+    async def write_many(self, values, expiration_seconds=None):
+        """
+        Write many values in the master database in a single request (pipelined SET commands).
+        :param values: Dictionary with the values by key name.
+        :param expiration_seconds: Time to expire the keys in seconds.
+        :return: True: keys/values were written | False: error, or some values can't be serialized (the others
+                 are written).
+        """
+        objects_to_write = {}
+        evicted = []
+        written = False
+
+        def add_commands(pipeline):
+            for key_name, object_to_write in objects_to_write.items():
+                pipeline.set(key_name, object_to_write, ex=expiration_seconds)
+            quotas.add_write_commands(pipeline,
+                                      self._client_id,
+                                      {key_name: len(object_to_write)
+                                       for key_name, object_to_write in objects_to_write.items()},
+                                      expiration_seconds)
+            invalidation.add_publish_command(pipeline, self._client_id, objects_to_write)
+
+        if self.master is not None:
+            objects_to_write = self._get_objects_to_write(values)
+            try:
+                started_at = time.perf_counter()
+                evicted = quotas.record_evictions(await self._execute_in_master(add_commands))
+                self._record_command(self.master_address, 'set_many', started_at)
+                written = True
+            except redis.RedisError:
+                self._record_command(self.master_address, 'set_many', None, failed=True)
+                objects_to_write = {}
+
+        for key_name in values:
+            self._add_write_to_local_cache(key_name, objects_to_write.get(key_name), expiration_seconds)
+        self._remove_evicted_from_local_cache(evicted)
+
+        return written and len(objects_to_write) == len(values)
+
+    async def read_stream(self, key_name):
+        """
+        Read a value written in chunks (see create_stream_writer) from the nearest cache server. Only one chunk is
+        in memory at a time.
+        :param key_name: Name of the key to read from server.
+        :return: Async iterator over the value chunks, or None if the key was not found or error. If a chunk is not
+                 in the server anymore, the iterator raises streams.IncompleteStreamError.
+        """
+        manifest_key = streams.get_manifest_key(key_name)
+
+        async def command(server):
+            return server, await server.get(manifest_key)
+
+        result = await self._read_with_failover(command)
+        if result is None or result[1] is None:
+            return None
+
+        server, writen_manifest = result
+        return self._iterate_stream(server, key_name, self._decode_writen_value(writen_manifest))
+
+    @staticmethod
+    async def _iterate_stream(server, key_name, manifest):
+        """
+        Read the chunks of a value from the server where its manifest was read. The manifest is written after the
+        chunks, so a server that has the manifest has the chunks too.
+        :param server: Server connection.
+        :param key_name: Name of the key being read.
+        :param manifest: Value manifest.
+        :return: Async iterator over the value chunks.
+        """
+        for index in range(manifest['chunks']):
+            chunk = await server.get(streams.get_chunk_key(key_name, manifest['id'], index))
+            if chunk is None:
+                raise streams.IncompleteStreamError('Chunk {} of key {} is not in the cache'.format(index, key_name))
+            yield chunk
+
+    def create_stream_writer(self, key_name, expiration_seconds=None):
+        """
+        Create a writer to write a value in the master database in chunks, so it's never entirely in memory. The
+        value can be read with read_stream after the writer is closed.
+        :param key_name: Name of the key to be written.
+        :param expiration_seconds: Time to expire this key in seconds.
+        :return: The async stream writer.
+        """
+        return streams.AsyncStreamWriter(self, key_name, expiration_seconds)
+
+    def touch(self, key_name, expiration_seconds):
+        """
+        Renew a key expiration time in the master database (sliding expiration). The slaves are read only, so
+        touches are coalesced and sent to the master in background, at most once per key per interval. Touches
+        before the client is connected are sent with the first ones after it.
+        :param key_name: Key to be renewed.
+        :param expiration_seconds: New time to expire the key in seconds. If None, nothing is done.
+        """
+        if expiration_seconds is None:
+            return
+
+        self._touch_batcher.touch(key_name, expiration_seconds)
+
+        if self._touch_task is None and self.sentinel is not None:
+            self._touch_task = asyncio.get_running_loop().create_task(self._renew_touched_periodically())
+
+    async def _renew_touched_periodically(self):
+        """
+        Renew the touched keys until the client is closed.
+        """
+        while True:
+            await asyncio.sleep(self._touch_batcher.interval_seconds)
+            pending = self._touch_batcher.pop_pending()
+            if pending:
+                await self.expire_many(pending)
+
+    async def exists_many(self, key_names):
+        """
+        Check if many keys exist in the master database in a single request (pipelined EXISTS commands).
+        :param key_names: Names of the keys to check.
+        :return: List with True for each key that exists, in the same order of key_names, or None if error.
+        """
+        if self.master is not None:
+            try:
+                pipeline = self.master.pipeline(transaction=False)
+                for key_name in key_names:
+                    pipeline.exists(key_name)
+                started_at = time.perf_counter()
+                results = await pipeline.execute()
+                self._record_command(self.master_address, 'exists_many', started_at)
+                return [bool(result) for result in results]
+            except redis.RedisError:
+                self._record_command(self.master_address, 'exists_many', None, failed=True)
+
+        return None
+
+    async def expire_many(self, expirations):
+        """
+        Set many keys expiration time in the master database in a single request (pipelined EXPIRE commands).
+        Keys that don't exist anymore are ignored.
+        :param expirations: Dictionary with the expiration time in seconds by key name.
+        :return: True: expiration times were set | False: error.
+        """
+        if self.master is not None:
+            try:
+                pipeline = self.master.pipeline(transaction=False)
+                for key_name, expiration_seconds in expirations.items():
+                    pipeline.expire(key_name, expiration_seconds)
+                quotas.add_expire_commands(pipeline, expirations)
+                started_at = time.perf_counter()
+                await pipeline.execute()
+                self._record_command(self.master_address, 'expire_many', started_at)
+                return True
+            except redis.RedisError:
+                self._record_command(self.master_address, 'expire_many', None, failed=True)
+
+        return False
+
+    def _record_accesses(self, key_names):
+        """
+        Record the reads of keys in namespaces with quota, updating their ranks in the master in background.
+        :param key_names: Keys read.
+        """
+        if QuotaConfig.QUOTAS_BYTES and any([self._access_batcher.record_access(key_name) for key_name in key_names]) \
+                and self._access_task is None and self.sentinel is not None:
+            self._access_task = asyncio.get_running_loop().create_task(self._rank_accesses_periodically())
+
+    async def _rank_accesses_periodically(self):
+        """
+        Update the ranks of the keys read until the client is closed.
+        """
+        while True:
+            await asyncio.sleep(self._access_batcher.interval_seconds)
+            accesses = self._access_batcher.pop_pending()
+            if accesses:
+                await self.rank_accesses(accesses)
+
+    async def rank_accesses(self, accesses):
+        """
+        Update the ranks of keys read in namespaces with quota in the master database in a single request, so the
+        least recently or frequently used keys are evicted first (see QuotaConfig).
+        :param accesses: Dictionary with the number of reads by key name.
+        :return: True: ranks updated | False: error.
+        """
+        if self.master is not None:
+            try:
+                pipeline = self.master.pipeline(transaction=False)
+                quotas.add_access_commands(pipeline, accesses)
+                started_at = time.perf_counter()
+                await pipeline.execute()
+                self._record_command(self.master_address, 'rank_accesses', started_at)
+                return True
+            except redis.RedisError:
+                self._record_command(self.master_address, 'rank_accesses', None, failed=True)
+
+        return False
+
+    async def get_quota_usage(self):
+        """
+        Get the usage of the namespaces with quota, recorded in the master database by all clients.
+        :return: Dictionary with the quota, bytes used and number of keys by namespace, or None if error.
+        """
+        if self.master is not None:
+            try:
+                return quotas.get_usage(await self._execute_in_master(quotas.add_usage_commands))
+            except redis.RedisError:
+                pass
+
+        return None
+
+    async def delete(self, key_name):
+        """
+        Delete a key from the master database.
+        :param key_name: Key to be deleted.
+        :return: True: key deleted | False: error.
+        """
+        if self.local_cache is not None:
+            self.local_cache.delete(key_name)
+
+        def add_commands(pipeline):
+            pipeline.delete(key_name)
+            quotas.add_delete_command(pipeline, key_name)
+            invalidation.add_publish_command(pipeline, self._client_id, [key_name])
+
+        if self.master is not None:
+            started_at = time.perf_counter()
+            try:
+                await self._execute_in_master(add_commands)
+                self._record_command(self.master_address, 'delete', started_at)
+                return True
+            except redis.RedisError:
+                self._record_command(self.master_address, 'delete', None, failed=True)
+
+        return False
+
+    async def acquire_lock(self, key_name, timeout_seconds):
+        """
+        Try to acquire, without blocking, a lock for a key in the master database, shared by all clients.
+        :param key_name: Key to be locked.
+        :param timeout_seconds: Time to release the lock automatically, if its owner doesn't release it.
+        :return: The lock if acquired | None: lock owned by another client or error.
+        """
+        if self.master is not None:
+            try:
+                lock = self.master.lock('lock:{}'.format(key_name), timeout=timeout_seconds, thread_local=False)
+                if await lock.acquire(blocking=False):
+                    return lock
+            except redis.RedisError:
+                pass
+
+        return None
+
+    @staticmethod
+    async def release_lock(lock):
+        """
+        Release a lock acquired with acquire_lock.
+        :param lock: Lock to be released.
+        :return: True: lock released | False: error, like a lock already expired.
+        """
+        try:
+            await lock.release()
+            return True
+        except redis.RedisError:
+            return False
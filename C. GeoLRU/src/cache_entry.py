@@ -0,0 +1,135 @@
+import json
+import struct
+import time
+from src.serializers import RawBytes
+from src.settings import HttpCacheConfig, NegativeCacheConfig, StaleConfig
+
+# Prefix of values written with their expiration time. Values without it were written without stale serving or
+# HTTP validators, so they are fresh while they are in the cache.
+ENTRY_PREFIX = b'\xb5GLRU'
+
+# Expiration timestamp and size of the validators that follow it
+_HEADER = struct.Struct('>dH')
+
+# Prefix of origin errors written in the cache, followed by their HTTP status
+ERROR_PREFIX = b'\xb5GLRE'
+_ERROR_STATUS = struct.Struct('>H')
+
+
+def is_stale_enabled():
+    """
+    Check if stale values are kept in the cache after their expiration.
+    :return: True | False
+    """
+    return bool(StaleConfig.STALE_WHILE_REVALIDATE_SECONDS or StaleConfig.STALE_IF_ERROR_SECONDS)
+
+
+def get_storage_expiration(cache_expiration, validators=None):
+    """
+    Get the time to keep a value in the cache: its expiration time plus the time it can be returned stale or, if
+    it has HTTP validators, revalidated with a conditional request.
+    :param cache_expiration: Time to expire the value (soft expiration).
+    :param validators: HTTP validators of the value (ETag and Last-Modified).
+    :return: Time to remove the value from the cache (hard expiration), or None if it never expires.
+    """
+    if cache_expiration is None:
+        return None
+
+    extra_seconds = max(StaleConfig.STALE_WHILE_REVALIDATE_SECONDS or 0, StaleConfig.STALE_IF_ERROR_SECONDS or 0)
+    if validators:
+        extra_seconds = max(extra_seconds, HttpCacheConfig.REVALIDATION_SECONDS)
+
+    return cache_expiration + extra_seconds
+
+
+def pack(value, cache_expiration, validators=None):
+    """
+    Add the expiration time and the HTTP validators to a value, so it's known when it becomes stale and how to
+    revalidate it.
+    :param value: Value (bytes) to be written in the cache.
+    :param cache_expiration: Time to expire the value (soft expiration).
+    :param validators: HTTP validators of the value (ETag and Last-Modified).
+    :return: The value with its expiration time (serializers.RawBytes, so it's written as it is whatever the
+             serializer), or the value itself if it never expires or if there is no reason to keep it after its
+             expiration.
+    """
+    if cache_expiration is None or not (validators or is_stale_enabled()):
+        return value
+
+    encoded_validators = json.dumps(validators).encode() if validators else b''
+    return RawBytes(ENTRY_PREFIX + _HEADER.pack(time.time() + cache_expiration, len(encoded_validators)) +
+                    encoded_validators + value)
+
+
+def unpack(entry):
+    """
+    Split a value read from the cache, its expiration time and its HTTP validators.
+    :param entry: Value read from the cache.
+    :return: The value, the timestamp when it expires (None if it was written without expiration time) and its
+             validators (None if it has no validators).
+    """
+    if not isinstance(entry, bytes) or not entry.startswith(ENTRY_PREFIX):
+        return entry, None, None
+
+    expires_at, validators_size = _HEADER.unpack_from(entry, len(ENTRY_PREFIX))
+    validators_start = len(ENTRY_PREFIX) + _HEADER.size
+    value_start = validators_start + validators_size
+    validators = json.loads(entry[validators_start:value_start]) if validators_size else None
+    return entry[value_start:], expires_at, validators
+
+
+def get_state(value, expires_at):
+    """
+    Get the state of a value read from the cache.
+    :param value: Value read from the cache.
+    :param expires_at: Timestamp when the value expires, or None if it was written without expiration time.
+    :return: "miss" if there is no value, "stale" if it's expired, "error" if it's an origin error (expired
+             errors are misses), otherwise "hit".
+    """
+    if value is None:
+        return 'miss'
+
+    is_error = get_error_status(value) is not None
+
+    if expires_at is not None and expires_at <= time.time():
+        # Expired errors are not returned stale, they are requested again
+        return 'miss' if is_error else 'stale'
+
+    return 'error' if is_error else 'hit'
+
+
+def pack_error(status):
+    """
+    Get the value written in the cache for an origin error.
+    :param status: HTTP status of the error.
+    :return: The error value (serializers.RawBytes, so it's written as it is whatever the serializer).
+    """
+    return RawBytes(ERROR_PREFIX + _ERROR_STATUS.pack(status))
+
+
+def get_error_status(value):
+    """
+    Get the HTTP status of an origin error read from the cache.
+    :param value: Value read from the cache.
+    :return: The error status, or None if the value is not an error.
+    """
+    if not isinstance(value, bytes) or not value.startswith(ERROR_PREFIX):
+        return None
+
+    status, = _ERROR_STATUS.unpack_from(value, len(ERROR_PREFIX))
+    return status
+
+
+def get_error_expiration(status):
+    """
+    Get the time to cache an origin error.
+    :param status: HTTP status of the error.
+    :return: Time to expire the error in seconds, or None if errors with this status are not cached.
+    """
+    if 400 <= status < 500:
+        return NegativeCacheConfig.CLIENT_ERROR_EXPIRATION_SECONDS
+
+    if 500 <= status < 600:
+        return NegativeCacheConfig.SERVER_ERROR_EXPIRATION_SECONDS
+
+    return None
@@ -0,0 +1,51 @@
+import functools
+import inspect
+from src import keys
+from src.geo_lru import LruClient
+
+
+def cached(cache_expiration=None, namespace=None, ignored_arguments=(), key_name=None):
+    """
+    Decorator caching the results of a function in the redis servers, shared by all processes, e.g. database
+    queries or computed results (see LruClient.call_with_cache). The decorated function gets an "invalidate"
+    method, which receives the same arguments and deletes their result from the cache.
+
+        @cached(cache_expiration=60, namespace='reports')
+        def get_report(customer_id, month):
+            ...
+
+    :param cache_expiration: Time to expire the results in the cache.
+    :param namespace: Namespace prefixed to the keys. If None, "KeyConfig.NAMESPACE" is used.
+    :param ignored_arguments: Names of the arguments that don't change the result, like "self" in methods.
+    :param key_name: Function that receives the same arguments and returns the cache key name. If None, it's
+                     derived from the function and its arguments (see keys.get_call_key).
+    :return: The decorator.
+    """
+    def decorator(function):
+        assert not inspect.iscoroutinefunction(function), 'cached doesn\'t support coroutine functions'
+
+        # Created on the first call, so the servers are not connected on import
+        lru_clients = []
+
+        def get_lru_client():
+            if not lru_clients:
+                lru_clients.append(LruClient(namespace))
+            return lru_clients[0]
+
+        def get_key_name(args, kwargs):
+            if key_name is not None:
+                return key_name(*args, **kwargs)
+            return keys.get_call_key(function, args, kwargs, namespace, ignored_arguments)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            return get_lru_client().call_with_cache(function, args, kwargs, cache_expiration,
+                                                    get_key_name(args, kwargs))
+
+        def invalidate(*args, **kwargs):
+            return get_lru_client().redis_client.delete(get_key_name(args, kwargs))
+
+        wrapper.invalidate = invalidate
+        return wrapper
+
+    return decorator
@@ -0,0 +1,71 @@
+import threading
+import time
+
+
+class CircuitBreaker:
+    """
+    Stop sending requests to a server after consecutive failures. After a while, one request is allowed to check
+    if the server is back: if it succeeds, the server is used again, otherwise it waits again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=1, reset_timeout_seconds=10):
+        """
+        Create an instance of circuit breaker.
+        :param failure_threshold: Number of consecutive failures to stop sending requests.
+        :param reset_timeout_seconds: Time to wait before allowing a request to check if the server is back.
+        """
+        assert failure_threshold > 0, 'Failure threshold must be greater than zero'
+
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """
+        Check if a request can be sent to the server.
+        :return: True: request allowed | False: the server is failing.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout_seconds:
+                # Allow only this request until its result is known
+                self.state = self.HALF_OPEN
+                return True
+
+            return False
+
+    def record_success(self):
+        """
+        Record a request success, closing the circuit.
+        """
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        """
+        Record a request failure, opening the circuit if the failure threshold was reached.
+        """
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """
+        Give up a request allowed whose result says nothing about the server, like errors of the local connection
+        pool. If it was the request checking if the server is back, the next one checks it instead.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
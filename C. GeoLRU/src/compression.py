@@ -0,0 +1,114 @@
+import zlib
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class ZlibCompressor:
+    """
+    Compress values with zlib, from the python standard library.
+    """
+    id = 1
+
+    @staticmethod
+    def compress(data):
+        """
+        Compress data.
+        """
+        return zlib.compress(data)
+
+    @staticmethod
+    def decompress(data):
+        """
+        Decompress data compressed by this compressor.
+        """
+        return zlib.decompress(data)
+
+
+class Lz4Compressor:
+    """
+    Compress values with lz4 (https://lz4.github.io/lz4/): fast, with lower compression ratios. It requires the
+    lz4 package.
+    """
+    id = 2
+
+    def __init__(self):
+        assert lz4 is not None, 'The lz4 compressor requires the lz4 package'
+
+    @staticmethod
+    def compress(data):
+        """
+        Compress data.
+        """
+        return lz4.frame.compress(data)
+
+    @staticmethod
+    def decompress(data):
+        """
+        Decompress data compressed by this compressor.
+        """
+        return lz4.frame.decompress(data)
+
+
+class ZstdCompressor:
+    """
+    Compress values with zstandard (https://facebook.github.io/zstd/). It requires the zstandard package.
+    """
+    id = 3
+
+    def __init__(self):
+        assert zstandard is not None, 'The zstd compressor requires the zstandard package'
+
+    @staticmethod
+    def compress(data):
+        """
+        Compress data.
+        """
+        return zstandard.ZstdCompressor().compress(data)
+
+    @staticmethod
+    def decompress(data):
+        """
+        Decompress data compressed by this compressor.
+        """
+        return zstandard.ZstdDecompressor().decompress(data)
+
+
+COMPRESSORS = {
+    'zlib': ZlibCompressor,
+    'lz4': Lz4Compressor,
+    'zstd': ZstdCompressor,
+}
+
+_COMPRESSORS_BY_ID = {compressor.id: compressor for compressor in COMPRESSORS.values()}
+
+
+def get_compressor(name):
+    """
+    Create a compressor by its name.
+    :param name: Compressor name: zlib, lz4 or zstd.
+    :return: A new compressor.
+    """
+    assert name in COMPRESSORS, 'Compressor must be one of: {}'.format(', '.join(COMPRESSORS))
+    return COMPRESSORS[name]()
+
+
+def decompress(compressor_id, data):
+    """
+    Decompress data compressed by any compressor.
+    :param compressor_id: Id of the compressor used to compress the data.
+    :param data: Compressed data.
+    :return: The data decompressed.
+    """
+    compressor = _COMPRESSORS_BY_ID.get(compressor_id)
+    if compressor is None:
+        raise ValueError('Unknown compressor id {}'.format(compressor_id))
+
+    return compressor().decompress(data)
@@ -0,0 +1,35 @@
+import threading
+import redis
+from src.settings import ConnectionPoolConfig
+
+_connection_pools = {}
+_connection_pools_lock = threading.Lock()
+
+
+def get_connection_pool(ip, port, password=None, socket_timeout=None, socket_connect_timeout=None):
+    """
+    Get the connection pool of a redis server, shared by all clients in the process.
+    :param ip: Server IP.
+    :param port: Server port.
+    :param password: Server password.
+    :param socket_timeout: Server socket timeout.
+    :param socket_connect_timeout: Server socket connect timeout.
+    :return: The server connection pool.
+    """
+    key = (ip, port, password, socket_timeout, socket_connect_timeout)
+
+    with _connection_pools_lock:
+        connection_pool = _connection_pools.get(key)
+        if connection_pool is None:
+            connection_pool = redis.BlockingConnectionPool(
+                host=ip,
+                port=port,
+                password=password,
+                socket_timeout=socket_timeout,
+                socket_connect_timeout=socket_connect_timeout,
+                max_connections=ConnectionPoolConfig.MAX_CONNECTIONS,
+                timeout=ConnectionPoolConfig.TIMEOUT_SECONDS,
+                health_check_interval=ConnectionPoolConfig.HEALTH_CHECK_INTERVAL_SECONDS)
+            _connection_pools[key] = connection_pool
+
+    return connection_pool
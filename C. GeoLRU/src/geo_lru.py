@@ -1,6 +1,17 @@
+import email.message
+import http.client
+import threading
+import time
+import urllib.error
 import urllib.request
-from src.redis_client import RedisCli
-from src.settings import RedisConfig
+from concurrent.futures import ThreadPoolExecutor
+from src import cache_entry, http_cache, keys, metrics
+from src.local_cache import create_local_cache
+from src.origin_client import get_origin_client
+from src.redis_client import _NOT_CACHED, RedisCli
+from src.settings import HttpCacheConfig, OriginConfig, RedisConfig, RequestCoalescingConfig, SlidingExpirationConfig, \
+    StaleConfig, StreamConfig, TopologyConfig, WriteBehindConfig
+from src.single_flight import SingleFlight
 
 
 class LruClient:
@@ -8,11 +19,57 @@ class LruClient:
     Represents the LRU list, linked to reds backends.
     """
 
-    def __init__(self):
-        self.redis_client = RedisCli(RedisConfig.SENTINEL_SERVERS,
-                                     RedisConfig.SENTINEL_MASTER_NAME,
-                                     RedisConfig.SERVERS_PASSWORD,
-                                     RedisConfig.SENTINEL_SOCKET_TIMEOUT)
+    # Shared by all instances, so concurrent misses of the same key in the process do a single request
+    _single_flight = SingleFlight()
+
+    # Redis clients shared by all instances, by sentinel configuration
+    _redis_clients = {}
+    _redis_clients_lock = threading.Lock()
+
+    # Requests of stale keys executed in background, shared by all instances
+    _revalidate_executor = None
+    _revalidating_keys = set()
+    _revalidate_lock = threading.Lock()
+
+    # Requests executed concurrently, shared by all instances
+    _prefetch_executor = None
+    _prefetch_lock = threading.Lock()
+
+    def __init__(self, namespace=None):
+        """
+        Create an instance of LRU client.
+        :param namespace: Namespace prefixed to the keys of this client, e.g. to limit the space they use in the
+                          cache with "QuotaConfig". If None, "KeyConfig.NAMESPACE" is used.
+        """
+        self.namespace = namespace
+        self.redis_client = self._get_redis_client()
+
+    @classmethod
+    def _get_redis_client(cls):
+        """
+        Get the redis client of the configured sentinels, shared by all instances. Only the first instance
+        connects to the servers, so creating new instances is almost free.
+        :return: The redis client.
+        """
+        key = (tuple(tuple(address) for address in RedisConfig.SENTINEL_SERVERS),
+               RedisConfig.SENTINEL_MASTER_NAME,
+               RedisConfig.SERVERS_PASSWORD)
+
+        with cls._redis_clients_lock:
+            redis_client = cls._redis_clients.get(key)
+            if redis_client is None:
+                redis_client = RedisCli(RedisConfig.SENTINEL_SERVERS,
+                                        RedisConfig.SENTINEL_MASTER_NAME,
+                                        RedisConfig.SERVERS_PASSWORD,
+                                        RedisConfig.SENTINEL_SOCKET_TIMEOUT,
+                                        create_local_cache())
+
+                if TopologyConfig.REFRESH_INTERVAL_SECONDS is not None:
+                    redis_client.start_topology_refresh(TopologyConfig.REFRESH_INTERVAL_SECONDS)
+
+                cls._redis_clients[key] = redis_client
+
+        return redis_client
 
     def request_with_cache(self,
                            url,
@@ -30,20 +87,512 @@ class LruClient:
         :param origin_req_host: Request URL.
         :param unverifiable:
         :param method: Request method.
-        :param cache_expiration: Time to expire this key in the cache.
+        :param cache_expiration: Time to expire this key in the cache. If HTTP caching is enabled, it's used only
+                                 for responses without Cache-Control or Expires headers.
         :return:
         """
+        started_at = time.perf_counter()
+        key_name = keys.get_cache_key(url, method, data, headers, self.namespace)
+        value_from_cache, expires_at, validators = cache_entry.unpack(self.redis_client.read(key_name))
+        request = urllib.request.Request(url, data, headers, origin_req_host, unverifiable, method)
+
+        state = cache_entry.get_state(value_from_cache, expires_at)
+        metrics.increment('geo_lru_requests_total', state=state)
+
+        try:
+            if state == 'miss':
+                return self._single_flight.do(key_name, self._request_and_cache, key_name, request,
+                                              cache_expiration)
+
+            if state == 'error':
+                self._raise_cached_error(url, value_from_cache)
+
+            if expires_at is None:
+                self._touch(key_name, cache_expiration)
+                return value_from_cache
+
+            return self._handle_expiring_value(key_name, value_from_cache, expires_at, validators, request,
+                                               cache_expiration)
+        finally:
+            metrics.observe('geo_lru_request_seconds', time.perf_counter() - started_at, state=state)
+
+    def request_with_cache_many(self, urls, headers={}, cache_expiration=None):
+        """
+        Execute many GET requests, but before that, checks which values are in cache. All keys are read from the
+        cache in a single request, the missing ones are requested concurrently and written in the cache in a single
+        request too.
+        :param urls: Requests URLs.
+        :param headers: Headers used in all requests.
+        :param cache_expiration: Time to expire the new keys in the cache.
+        :return: List with the requests results, in the same order of urls.
+        :raise Exception: The error of the first URL that failed, in the order of urls, or its error read from the
+                          cache. It's raised after the values of the other URLs are written in the cache.
+        """
+        keys_names = [keys.get_cache_key(url, headers=headers, namespace=self.namespace) for url in urls]
+
+        values_from_cache = []
+        requested_values = {}
+        values_to_write = {}
+        errors = {}
+        for url, key_name, entry in zip(urls, keys_names, self.redis_client.read_many(keys_names)):
+            value_from_cache, expires_at, validators = cache_entry.unpack(entry)
+            request = urllib.request.Request(url, headers=headers)
+            state = cache_entry.get_state(value_from_cache, expires_at)
+            metrics.increment('geo_lru_requests_total', state=state)
+
+            if state == 'error':
+                try:
+                    self._raise_cached_error(url, value_from_cache)
+                except urllib.error.HTTPError as error:
+                    errors.setdefault(key_name, error)
+                value_from_cache = None
+            elif state == 'miss':
+                value_from_cache = None
+                if key_name not in requested_values:
+                    requested_values[key_name] = self._get_prefetch_executor().submit(
+                        self._request_many_item, key_name, request, cache_expiration, values_to_write)
+            elif expires_at is None:
+                self._touch(key_name, cache_expiration)
+            else:
+                value_from_cache = self._handle_expiring_value(key_name, value_from_cache, expires_at, validators,
+                                                               request, cache_expiration)
+
+            values_from_cache.append(value_from_cache)
+
+        # The missing values are requested concurrently. One failing doesn't prevent the others from being cached.
+        for key_name, future in list(requested_values.items()):
+            try:
+                requested_values[key_name] = future.result()
+            except Exception as error:
+                errors[key_name] = error
+
+        if values_to_write:
+            self._write_many({key_name: cache_entry.pack(value, cache_expiration)
+                              for key_name, value in values_to_write.items()},
+                             cache_entry.get_storage_expiration(cache_expiration),
+                             {key_name: url for key_name, url in zip(keys_names, urls) if key_name in values_to_write})
+
+        for key_name in keys_names:
+            if key_name in errors:
+                raise errors[key_name]
+
+        return [value_from_cache if value_from_cache is not None else requested_values[key_name]
+                for key_name, value_from_cache in zip(keys_names, values_from_cache)]
+
+    def _request_many_item(self, key_name, request, cache_expiration, values_to_write):
+        """
+        Execute a request missing in the cache of request_with_cache_many.
+        :param key_name: Cache key name.
+        :param request: Request to be executed.
+        :param cache_expiration: Time to expire this key in the cache.
+        :param values_to_write: Dictionary where the result is added to be written with the other results, unless
+                                it's written on its own.
+        :return: The request result.
+        """
+        try:
+            if HttpCacheConfig.ENABLED:
+                # Each response has its own expiration time, so it's written on its own
+                return self._request_http_and_cache(key_name, request, cache_expiration)
+
+            values_to_write[key_name] = self._request(request)
+            return values_to_write[key_name]
+        except urllib.error.HTTPError as error:
+            self._cache_error(key_name, error.code, request.full_url)
+            raise
+
+    def request_with_cache_stream(self, url, headers={}, cache_expiration=None):
+        """
+        Execute a GET request, but before that, checks if it's value is in cache, without keeping the entire value
+        in memory: it's read from the origin and from the cache in chunks of "StreamConfig.CHUNK_SIZE_BYTES", each
+        one written in its own key. Use it for big responses.
+        :param url: Request URL.
+        :param headers: Request headers.
+        :param cache_expiration: Time to expire this key in the cache.
+        :return: Iterator over the value chunks.
+        """
+        key_name = keys.get_cache_key(url, namespace=self.namespace)
+        chunks = self.redis_client.read_stream(key_name)
+        if chunks is not None:
+            return chunks
+
+        response = get_origin_client().urlopen(urllib.request.Request(url, headers=headers))
+        return self._stream_and_cache(key_name, response, cache_expiration)
+
+    def call_with_cache(self, function, args=(), kwargs=None, cache_expiration=None, key_name=None):
+        """
+        Call a function, but before that, checks if its result is in cache. Concurrent calls with the same key in
+        the process do a single call. Results are written with the serializer, so their types are preserved, and
+        None results are cached too. Results the serializer doesn't support are returned without being cached.
+        :param function: Function to be called.
+        :param args: Call positional arguments.
+        :param kwargs: Call keyword arguments.
+        :param cache_expiration: Time to expire this key in the cache.
+        :param key_name: Cache key name. If None, it's derived from the function and its arguments (see
+                         keys.get_call_key).
+        :return: The function result.
+        """
+        started_at = time.perf_counter()
+        kwargs = kwargs or {}
+
+        if key_name is None:
+            key_name = keys.get_call_key(function, args, kwargs, self.namespace)
 
-        # Uses the entire URL as key name
-        value_from_cache = self.redis_client.read(url)
+        value_from_cache = self.redis_client.read(key_name, _NOT_CACHED)
+        state = 'miss' if value_from_cache is _NOT_CACHED else 'hit'
+        metrics.increment('geo_lru_calls_total', state=state)
 
-        if value_from_cache:
-            # TODO renew the key expiration time in the cache
+        try:
+            if state == 'miss':
+                return self._single_flight.do(key_name, self._call_and_cache, key_name, function, args, kwargs,
+                                              cache_expiration)
+
+            if SlidingExpirationConfig.ENABLED:
+                self.redis_client.touch(key_name, cache_expiration)
             return value_from_cache
+        finally:
+            metrics.observe('geo_lru_call_seconds', time.perf_counter() - started_at, state=state)
 
-        request = urllib.request.Request(url, data, headers, origin_req_host, unverifiable, method)
-        response = urllib.request.urlopen(request)
-        response_data = response.read()
+    def _call_and_cache(self, key_name, function, args, kwargs, cache_expiration):
+        """
+        Call a function and add its result to the cache.
+        :param key_name: Cache key name.
+        :param function: Function to be called.
+        :param args: Call positional arguments.
+        :param kwargs: Call keyword arguments.
+        :param cache_expiration: Time to expire this key in the cache.
+        :return: The function result.
+        """
+        result = function(*args, **kwargs)
+        self._write_many({key_name: result}, cache_expiration, {})
+        return result
+
+    def prefetch(self, urls, headers={}, cache_expiration=None):
+        """
+        Execute many GET requests with cache (request_with_cache) concurrently, in background, e.g. to add to the
+        cache values that will be requested soon. At most "OriginConfig.PREFETCH_WORKERS" requests are executed at
+        a time.
+        :param urls: Requests URLs.
+        :param headers: Headers used in all requests.
+        :param cache_expiration: Time to expire the new keys in the cache.
+        :return: List with the futures (concurrent.futures.Future) of the requests results, in the same order of
+                 urls.
+        """
+        executor = self._get_prefetch_executor()
+        return [executor.submit(self.request_with_cache, url, headers=headers, cache_expiration=cache_expiration)
+                for url in urls]
+
+    @classmethod
+    def _get_prefetch_executor(cls):
+        """
+        Get the executor of the requests executed concurrently, shared by all instances.
+        :return: The executor.
+        """
+        with cls._prefetch_lock:
+            if cls._prefetch_executor is None:
+                cls._prefetch_executor = ThreadPoolExecutor(OriginConfig.PREFETCH_WORKERS,
+                                                            thread_name_prefix='geo-lru-prefetch')
+
+        return cls._prefetch_executor
+
+    def flush_writes(self, timeout_seconds=None):
+        """
+        Wait for the values written in background (see WriteBehindConfig) to reach the cache, e.g. before a
+        graceful shutdown. They are also flushed when the process exits normally.
+        :param timeout_seconds: Maximum time to wait. If None, waits until they are written.
+        :return: True: all values written | False: timeout.
+        """
+        return self.redis_client.flush_writes(timeout_seconds)
+
+    def get_quota_usage(self):
+        """
+        Get the usage of the namespaces with quota (see QuotaConfig), shared by all clients.
+        :return: Dictionary with the quota, bytes used and number of keys by namespace, or None if error.
+        """
+        return self.redis_client.get_quota_usage()
+
+    def _stream_and_cache(self, key_name, response, cache_expiration):
+        """
+        Read a response in chunks, writing them in the cache as they are read. If the response is not read until
+        its end, it's not added to the cache.
+        :param key_name: Cache key name.
+        :param response: Response to be read.
+        :param cache_expiration: Time to expire this key in the cache.
+        :return: Iterator over the response chunks.
+        """
+        stream_writer = self.redis_client.create_stream_writer(key_name, cache_expiration)
+
+        with response:
+            for chunk in iter(lambda: response.read(StreamConfig.CHUNK_SIZE_BYTES), b''):
+                stream_writer.write(chunk)
+                yield chunk
 
-        self.redis_client.write(url, response_data, cache_expiration)
+        stream_writer.close()
+
+    def _touch(self, key_name, cache_expiration):
+        """
+        Renew the expiration time of a key read from the cache, if sliding expiration is enabled. Keys expiring
+        according to HTTP caching headers are not renewed.
+        :param key_name: Cache key name.
+        :param cache_expiration: Time to expire this key in the cache.
+        """
+        if SlidingExpirationConfig.ENABLED and not HttpCacheConfig.ENABLED:
+            self.redis_client.touch(key_name, cache_expiration)
+
+    def _handle_expiring_value(self, key_name, value_from_cache, expires_at, validators, request, cache_expiration):
+        """
+        Get the value of a key written with its expiration time. While it's fresh, the value from the cache is
+        returned. After its expiration, it's returned stale while it's requested again in background
+        (stale-while-revalidate) or if the new request fails (stale-if-error). If it has HTTP validators, it's
+        revalidated with a conditional request.
+        :param key_name: Cache key name.
+        :param value_from_cache: Value read from the cache.
+        :param expires_at: Timestamp when the value expires.
+        :param validators: HTTP validators of the value.
+        :param request: Request to be executed.
+        :param cache_expiration: Time to expire this key in the cache.
+        :return: The request result.
+        """
+        stale_seconds = time.time() - expires_at
+
+        if stale_seconds < 0:
+            return value_from_cache
+
+        if stale_seconds < (StaleConfig.STALE_WHILE_REVALIDATE_SECONDS or 0):
+            self._revalidate_in_background(key_name, request, cache_expiration, value_from_cache, validators)
+            return value_from_cache
+
+        try:
+            return self._single_flight.do(key_name, self._request_and_cache, key_name, request, cache_expiration,
+                                          value_from_cache, validators)
+        except OSError as error:
+            if stale_seconds < (StaleConfig.STALE_IF_ERROR_SECONDS or 0) and self._is_origin_error(error):
+                return value_from_cache
+            raise
+
+    def _write(self, key_name, value, expiration_seconds, url):
+        """
+        Write a value in the cache, in background if write behind is enabled.
+        :param key_name: Cache key name.
+        :param value: Value to be written.
+        :param expiration_seconds: Time to expire this key in seconds.
+        :param url: Original URL of the key, written with it if "KeyConfig.STORE_ORIGINAL_URL" is enabled.
+        """
+        self._write_many({key_name: value}, expiration_seconds, {key_name: url})
+
+    def _write_many(self, values, expiration_seconds, urls):
+        """
+        Write many values in the cache, in background if write behind is enabled.
+        :param values: Dictionary with the values by key name.
+        :param expiration_seconds: Time to expire the keys in seconds.
+        :param urls: Dictionary with the original URLs by key name, written with the values if
+                     "KeyConfig.STORE_ORIGINAL_URL" is enabled.
+        """
+        values = keys.add_original_urls(values, urls)
+
+        if WriteBehindConfig.ENABLED:
+            for key_name, value in values.items():
+                self.redis_client.write_behind(key_name, value, expiration_seconds)
+        elif len(values) == 1:
+            self.redis_client.write(*values.popitem(), expiration_seconds)
+        else:
+            self.redis_client.write_many(values, expiration_seconds)
+
+    def _cache_error(self, key_name, status, url):
+        """
+        Write an origin error in the cache, if errors with its status are cached, so it's raised again without
+        requesting the origin until it expires.
+        :param key_name: Cache key name.
+        :param status: HTTP status of the error.
+        :param url: Request URL.
+        """
+        error_expiration = cache_entry.get_error_expiration(status)
+        if error_expiration is not None:
+            self._write(key_name, cache_entry.pack_error(status), error_expiration, url)
+
+    @staticmethod
+    def _raise_cached_error(url, value_from_cache):
+        """
+        Raise the origin error read from the cache.
+        :param url: Request URL.
+        :param value_from_cache: Error read from the cache.
+        """
+        status = cache_entry.get_error_status(value_from_cache)
+        raise urllib.error.HTTPError(url, status, http.client.responses.get(status, ''), email.message.Message(), None)
+
+    @staticmethod
+    def _is_origin_error(error):
+        """
+        Check if a request error is an origin failure, so a stale value can be returned instead: network errors,
+        timeouts and server errors. Client errors (HTTP status 4xx) are not.
+        :param error: Request error.
+        :return: True | False
+        """
+        return not isinstance(error, urllib.error.HTTPError) or error.code >= 500
+
+    def _revalidate_in_background(self, key_name, request, cache_expiration, stale_value, validators):
+        """
+        Execute a request and add its result to the cache in background, if it's not being executed yet.
+        :param key_name: Cache key name.
+        :param request: Request to be executed.
+        :param cache_expiration: Time to expire this key in the cache.
+        :param stale_value: Value in the cache.
+        :param validators: HTTP validators of the value in the cache.
+        """
+        cls = type(self)
+
+        with cls._revalidate_lock:
+            if key_name in cls._revalidating_keys:
+                return
+            cls._revalidating_keys.add(key_name)
+
+            if cls._revalidate_executor is None:
+                cls._revalidate_executor = ThreadPoolExecutor(StaleConfig.REVALIDATE_WORKERS,
+                                                              thread_name_prefix='geo-lru-revalidate')
+
+        cls._revalidate_executor.submit(self._revalidate, key_name, request, cache_expiration, stale_value,
+                                        validators)
+
+    def _revalidate(self, key_name, request, cache_expiration, stale_value, validators):
+        """
+        Execute a request of a stale key and add its result to the cache.
+        :param key_name: Cache key name.
+        :param request: Request to be executed.
+        :param cache_expiration: Time to expire this key in the cache.
+        :param stale_value: Value in the cache.
+        :param validators: HTTP validators of the value in the cache.
+        """
+        try:
+            self._single_flight.do(key_name, self._request_and_cache, key_name, request, cache_expiration,
+                                   stale_value, validators)
+        except Exception:
+            # The stale value is still in the cache, so it will be requested again on its next read
+            pass
+        finally:
+            with self._revalidate_lock:
+                self._revalidating_keys.discard(key_name)
+
+    @staticmethod
+    def _request(request):
+        """
+        Execute a request.
+        :param request: Request to be executed.
+        :return: The request result.
+        """
+        started_at = time.perf_counter()
+
+        try:
+            response = get_origin_client().urlopen(request)
+            response_data = response.read()
+        except OSError:
+            metrics.increment('geo_lru_origin_errors_total')
+            raise
+
+        metrics.observe('geo_lru_origin_request_seconds', time.perf_counter() - started_at)
         return response_data
+
+    def _request_and_cache(self, key_name, request, cache_expiration, stale_value=None, validators=None):
+        """
+        Execute a request and add its result to the cache. If the distributed lock is enabled and another client
+        is already executing the same request, wait for its result in the cache instead.
+        :param key_name: Cache key name.
+        :param request: Request to be executed.
+        :param cache_expiration: Time to expire this key in the cache.
+        :param stale_value: Expired value in the cache, if any.
+        :param validators: HTTP validators of the expired value, to revalidate it with a conditional request.
+        :return: The request result.
+        """
+        lock = None
+
+        if RequestCoalescingConfig.DISTRIBUTED_LOCK_ENABLED:
+            lock = self.redis_client.acquire_lock(key_name, RequestCoalescingConfig.LOCK_TIMEOUT_SECONDS)
+            if lock is None:
+                value_from_cache = self._wait_for_cache(key_name)
+                if cache_entry.get_error_status(value_from_cache) is not None:
+                    self._raise_cached_error(request.full_url, value_from_cache)
+                if value_from_cache is not None:
+                    return value_from_cache
+
+        try:
+            if HttpCacheConfig.ENABLED:
+                return self._request_http_and_cache(key_name, request, cache_expiration, stale_value, validators)
+
+            response_data = self._request(request)
+            self._write(key_name,
+                        cache_entry.pack(response_data, cache_expiration),
+                        cache_entry.get_storage_expiration(cache_expiration),
+                        request.full_url)
+            return response_data
+        except urllib.error.HTTPError as error:
+            # An error must not replace a stale value, which can still be returned
+            if stale_value is None:
+                self._cache_error(key_name, error.code, request.full_url)
+            raise
+        finally:
+            if lock is not None:
+                self.redis_client.release_lock(lock)
+
+    def _request_http_and_cache(self, key_name, request, cache_expiration, stale_value=None, validators=None):
+        """
+        Execute a request and add its result to the cache according to its HTTP caching headers. If there is an
+        expired value with validators, the request is conditional and, if the server answers 304 (not modified),
+        the expired value is renewed in the cache without downloading it again.
+        :param key_name: Cache key name.
+        :param request: Request to be executed.
+        :param cache_expiration: Time to expire this key if the response has no caching headers.
+        :param stale_value: Expired value in the cache, if any.
+        :param validators: HTTP validators of the expired value.
+        :return: The request result.
+        """
+        if stale_value is None:
+            validators = None
+
+        for name, value in http_cache.get_conditional_headers(validators).items():
+            request.add_header(name, value)
+
+        started_at = time.perf_counter()
+
+        try:
+            response = get_origin_client().urlopen(request)
+            response_data = response.read()
+            response_headers = response.headers
+            validators = None
+        except urllib.error.HTTPError as error:
+            if error.code != 304 or validators is None:
+                metrics.increment('geo_lru_origin_errors_total')
+                raise
+            response_data = stale_value
+            response_headers = error.headers
+        except OSError:
+            metrics.increment('geo_lru_origin_errors_total')
+            raise
+
+        metrics.observe('geo_lru_origin_request_seconds', time.perf_counter() - started_at)
+
+        if http_cache.is_storable(dict(request.header_items()), response_headers):
+            cache_expiration = http_cache.get_cache_expiration(response_headers, cache_expiration)
+            validators = http_cache.get_validators(response_headers, validators)
+            storage_expiration = cache_entry.get_storage_expiration(cache_expiration, validators)
+
+            if storage_expiration is None or storage_expiration > 0:
+                self._write(key_name,
+                            cache_entry.pack(response_data, cache_expiration, validators),
+                            storage_expiration,
+                            request.full_url)
+
+        return response_data
+
+    def _wait_for_cache(self, key_name):
+        """
+        Wait for another client to add a key to the cache.
+        :param key_name: Cache key name.
+        :return: The key value, or None if it wasn't added to the cache in time.
+        """
+        deadline = time.monotonic() + RequestCoalescingConfig.LOCK_WAIT_SECONDS
+
+        while time.monotonic() < deadline:
+            time.sleep(RequestCoalescingConfig.LOCK_POLL_INTERVAL_SECONDS)
+            value_from_cache, expires_at, _ = cache_entry.unpack(self.redis_client.read(key_name))
+            if value_from_cache is not None and (expires_at is None or expires_at > time.time()):
+                return value_from_cache
+
+        return None
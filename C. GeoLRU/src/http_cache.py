@@ -0,0 +1,196 @@
+import email.utils
+import hashlib
+import time
+import urllib.parse
+from src.settings import HttpCacheConfig
+
+
+def get_cache_key(url, method=None, data=None, headers=None):
+    """
+    Get the cache key of a request. GET requests without body and without the headers in
+    "HttpCacheConfig.VARY_HEADERS" use the URL itself, other requests add the method, the values of these headers
+    and the body hash to it.
+    :param url: Request URL.
+    :param method: Request method. If None, POST is used when there is data, otherwise GET.
+    :param data: Request data: bytes, string or dictionary (form).
+    :param headers: Request headers.
+    :return: The cache key.
+    """
+    method = (method or ('GET' if data is None else 'POST')).upper()
+    headers = _lower_names(headers)
+
+    parts = [method, url]
+    for name in sorted(name.lower() for name in HttpCacheConfig.VARY_HEADERS):
+        if name in headers:
+            parts.append('{}={}'.format(name, headers[name]))
+
+    if data is not None:
+        parts.append('body={}'.format(hashlib.sha256(_encode_data(data)).hexdigest()))
+
+    if len(parts) == 2 and method == 'GET':
+        return url
+
+    return ' '.join(parts)
+
+
+def is_storable(request_headers, response_headers):
+    """
+    Check if a response can be written in the cache, which is shared by all clients.
+    :param request_headers: Request headers.
+    :param response_headers: Response headers.
+    :return: True | False
+    """
+    request_headers = _lower_names(request_headers)
+    if 'no-store' in parse_cache_control(request_headers.get('cache-control')):
+        return False
+
+    cache_control = parse_cache_control(response_headers.get('Cache-Control'))
+    if 'no-store' in cache_control or 'private' in cache_control:
+        return False
+
+    # Authenticated responses are shared only if the origin allows it explicitly (RFC 7234, section 3.2), as the
+    # Authorization header is not part of the cache key
+    if 'authorization' in request_headers and not {'public', 's-maxage', 'must-revalidate'} & set(cache_control):
+        return False
+
+    # The response must not vary on request headers that are not part of the cache key
+    vary_headers = {name.lower() for name in HttpCacheConfig.VARY_HEADERS}
+    for name in _split_list(response_headers.get('Vary')):
+        if name == '*' or (name not in vary_headers and name in request_headers):
+            return False
+
+    return True
+
+
+def get_cache_expiration(response_headers, default=None):
+    """
+    Get the time to expire a response according to its Cache-Control (s-maxage, max-age or no-cache) or Expires
+    headers.
+    :param response_headers: Response headers.
+    :param default: Time to expire the response if it has none of these headers.
+    :return: Time to expire the response in seconds.
+    """
+    cache_control = parse_cache_control(response_headers.get('Cache-Control'))
+    if 'no-cache' in cache_control:
+        return 0
+
+    # The response may have been in other caches for a while
+    age = _parse_int(response_headers.get('Age')) or 0
+
+    # s-maxage is specific for shared caches, like this one
+    for directive in ('s-maxage', 'max-age'):
+        max_age = _parse_int(cache_control.get(directive))
+        if max_age is not None:
+            return max(0, max_age - age)
+
+    expires = response_headers.get('Expires')
+    if expires is not None:
+        expires_at = _parse_date(expires)
+        if expires_at is None:
+            # Invalid dates, like "0", mean already expired
+            return 0
+
+        date = _parse_date(response_headers.get('Date')) or time.time()
+        return max(0, int(expires_at - date) - age)
+
+    return default
+
+
+def get_validators(response_headers, validators=None):
+    """
+    Get the validators of a response, used to revalidate it with conditional requests.
+    :param response_headers: Response headers.
+    :param validators: Previous validators, updated with the ones in the response (for 304 responses).
+    :return: Dictionary with the ETag and the Last-Modified date, or None if the response has none of them.
+    """
+    validators = dict(validators or {})
+
+    for name, header in (('etag', 'ETag'), ('last_modified', 'Last-Modified')):
+        value = response_headers.get(header)
+        if value is not None:
+            validators[name] = value
+
+    return validators or None
+
+
+def get_conditional_headers(validators):
+    """
+    Get the headers of a conditional request, to which the server answers 304 if the value didn't change.
+    :param validators: Validators of the value in the cache.
+    :return: Dictionary with the conditional headers.
+    """
+    headers = {}
+
+    if validators:
+        if 'etag' in validators:
+            headers['If-None-Match'] = validators['etag']
+        if 'last_modified' in validators:
+            headers['If-Modified-Since'] = validators['last_modified']
+
+    return headers
+
+
+def parse_cache_control(value):
+    """
+    Parse a Cache-Control header.
+    :param value: Header value.
+    :return: Dictionary with the directives arguments by their lower case names (None for directives without
+             arguments).
+    """
+    directives = {}
+
+    for directive in _split_list(value):
+        name, _, argument = directive.partition('=')
+        directives[name.strip()] = argument.strip().strip('"') if argument else None
+
+    return directives
+
+
+def _split_list(value):
+    """
+    Split a comma separated header into its lower case items.
+    """
+    if not value:
+        return []
+
+    return [item.strip().lower() for item in value.split(',') if item.strip()]
+
+
+def _lower_names(headers):
+    """
+    Get a copy of headers with lower case names, so they can be found whatever their case.
+    """
+    return {name.lower(): value for name, value in (headers or {}).items()}
+
+
+def _encode_data(data):
+    """
+    Encode request data to be hashed.
+    """
+    if isinstance(data, dict):
+        return urllib.parse.urlencode(sorted(data.items())).encode()
+
+    if isinstance(data, str):
+        return data.encode()
+
+    return bytes(data)
+
+
+def _parse_int(value):
+    """
+    Parse an integer header value, returning None if it's invalid.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_date(value):
+    """
+    Parse an HTTP date, returning its timestamp or None if it's invalid.
+    """
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
@@ -0,0 +1,35 @@
+import json
+from src.settings import InvalidationConfig
+
+
+def add_publish_command(pipeline, client_id, key_names):
+    """
+    Add to a pipeline the command that broadcasts the invalidation of keys written or deleted, if enabled. It must
+    be added after the commands that change the keys, so the clients don't read their old values again.
+    :param pipeline: Pipeline of the master server.
+    :param client_id: Id of the client that changed the keys, which doesn't invalidate its own local cache.
+    :param key_names: Keys changed.
+    """
+    if InvalidationConfig.ENABLED:
+        pipeline.publish(InvalidationConfig.CHANNEL, json.dumps({'client_id': client_id, 'keys': list(key_names)}))
+
+
+def get_invalidated_keys(message, client_id):
+    """
+    Get the keys invalidated by a message received from the invalidations channel.
+    :param message: Message received.
+    :param client_id: Id of the client receiving it.
+    :return: Keys to remove from the local cache. Empty if the message was sent by the same client or is invalid.
+    """
+    if message is None or message.get('type') != 'message':
+        return []
+
+    try:
+        invalidation = json.loads(message['data'])
+    except ValueError:
+        return []
+
+    if invalidation.get('client_id') == client_id:
+        return []
+
+    return invalidation.get('keys', [])
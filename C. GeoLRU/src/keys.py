@@ -0,0 +1,154 @@
+import datetime
+import decimal
+import hashlib
+import inspect
+import json
+import urllib.parse
+import uuid
+from src import http_cache
+from src.settings import HttpCacheConfig, KeyConfig
+
+
+def normalize_url(url):
+    """
+    Normalize a URL, so equivalent URLs are equal: scheme and host in lower case, empty path replaced by "/", query
+    parameters sorted by name (keeping the order of repeated ones) and fragment removed.
+    :param url: URL to be normalized.
+    :return: The normalized URL.
+    """
+    parts = urllib.parse.urlsplit(url)
+    user_info, separator, host = parts.netloc.rpartition('@')
+    query_parameters = urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+
+    return urllib.parse.urlunsplit((parts.scheme.lower(),
+                                    user_info + separator + host.lower(),
+                                    parts.path or '/',
+                                    urllib.parse.urlencode(sorted(query_parameters, key=lambda item: item[0])),
+                                    ''))
+
+
+def get_cache_key(url, method=None, data=None, headers=None, namespace=None):
+    """
+    Get the cache key of a request according to "KeyConfig": the URL itself or, if HTTP caching is enabled, a key
+    that varies on the method, the body and the configured headers too, optionally normalized, hashed and
+    prefixed by the namespace.
+    :param url: Request URL.
+    :param method: Request method.
+    :param data: Request data.
+    :param headers: Request headers.
+    :param namespace: Namespace prefixed to the key. If None, "KeyConfig.NAMESPACE" is used.
+    :return: The cache key.
+    """
+    if KeyConfig.NORMALIZE_URLS:
+        url = normalize_url(url)
+
+    if HttpCacheConfig.ENABLED:
+        key_name = http_cache.get_cache_key(url, method, data, headers)
+    else:
+        # Uses the entire URL as key name
+        key_name = url
+
+    if KeyConfig.DIGEST is not None:
+        key_name = hashlib.new(KeyConfig.DIGEST, key_name.encode()).hexdigest()
+
+    namespace = namespace or KeyConfig.NAMESPACE
+    if namespace is not None:
+        key_name = '{}:{}'.format(namespace, key_name)
+
+    return key_name
+
+
+def get_call_key(function, args=(), kwargs=None, namespace=None, ignored_arguments=()):
+    """
+    Get the cache key of a function call: its module and qualified name followed by the digest of its arguments,
+    prefixed by the namespace. Arguments passed by position or by name, and default values omitted or not, give the
+    same key.
+    :param function: Function called.
+    :param args: Call positional arguments.
+    :param kwargs: Call keyword arguments.
+    :param namespace: Namespace prefixed to the key. If None, "KeyConfig.NAMESPACE" is used.
+    :param ignored_arguments: Names of the arguments that don't change the result, like "self".
+    :return: The cache key.
+    """
+    call_arguments = inspect.signature(function).bind(*args, **(kwargs or {}))
+    call_arguments.apply_defaults()
+
+    arguments = {name: value for name, value in call_arguments.arguments.items() if name not in ignored_arguments}
+    encoded_arguments = _dump_argument(arguments)
+
+    key_name = 'call:{}.{}:{}'.format(function.__module__,
+                                      function.__qualname__,
+                                      hashlib.sha256(encoded_arguments.encode()).hexdigest())
+
+    namespace = namespace or KeyConfig.NAMESPACE
+    if namespace is not None:
+        key_name = '{}:{}'.format(namespace, key_name)
+
+    return key_name
+
+
+def _dump_argument(value):
+    """
+    Dump a function argument as json, so equal arguments are always dumped the same way and different ones aren't.
+    :param value: Argument value.
+    :return: The json string.
+    """
+    return json.dumps(_encode_argument(value), sort_keys=True, separators=(',', ':'))
+
+
+def _encode_argument(value):
+    """
+    Encode a function argument with the types json supports. Json objects are used only for types json doesn't
+    have, tagged with the type name (e.g. {"__tuple__": [1, 2]}), so arguments of different types never share an
+    encoding, like a tuple and a list or bytes and their hexadecimal string.
+    :param value: Argument value.
+    :return: The encoded value.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+
+    if isinstance(value, list):
+        return [_encode_argument(item) for item in value]
+
+    if isinstance(value, tuple):
+        return {'__tuple__': [_encode_argument(item) for item in value]}
+
+    if isinstance(value, dict):
+        # Keys may be of any type, so the items are encoded as pairs
+        return {'__dict__': sorted(([_encode_argument(key), _encode_argument(item)] for key, item in value.items()),
+                                   key=lambda pair: _dump_argument(pair[0]))}
+
+    if isinstance(value, (set, frozenset)):
+        return {'__set__': sorted((_encode_argument(item) for item in value), key=_dump_argument)}
+
+    if isinstance(value, (bytes, bytearray)):
+        return {'__bytes__': value.hex()}
+
+    for value_type in (datetime.datetime, datetime.date, datetime.time, decimal.Decimal, uuid.UUID):
+        if isinstance(value, value_type):
+            return {'__{}__'.format(value_type.__name__): str(value)}
+
+    raise TypeError('Argument of type {} can\'t be used in a cache key, ignore it or give the key name'
+                    .format(type(value).__name__))
+
+
+def get_url_key_name(key_name):
+    """
+    Get the name of the key where the original URL of a cache key is written.
+    :param key_name: Cache key name.
+    :return: The original URL key name.
+    """
+    return 'url:{}'.format(key_name)
+
+
+def add_original_urls(values, urls):
+    """
+    Add the original URLs of the keys to the values to be written, if "KeyConfig.STORE_ORIGINAL_URL" is enabled.
+    :param values: Dictionary with the values by key name.
+    :param urls: Dictionary with the original URLs by key name.
+    :return: The values with the original URLs keys.
+    """
+    if KeyConfig.STORE_ORIGINAL_URL:
+        values.update((get_url_key_name(key_name), url) for key_name, url in urls.items())
+
+    return values
@@ -0,0 +1,143 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from src.settings import LocalCacheConfig
+
+# Types whose values can't be changed, so they are kept and returned without copies
+_IMMUTABLE_TYPES = (type(None), bool, int, float, complex, str, bytes)
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU cache with per-key expiration, used as a first tier in front of Redis. Mutable values
+    (lists, dictionaries...) are copied when they are stored and returned, so callers changing a value they read
+    don't change the value other callers read, like with the redis servers.
+    """
+
+    def __init__(self, max_items=1024, max_bytes=64 * 1024 * 1024, default_expiration_seconds=60):
+        """
+        Create an instance of the local cache.
+        :param max_items: Maximum number of keys kept in memory.
+        :param max_bytes: Maximum sum of the keys sizes kept in memory.
+        :param default_expiration_seconds: Expiration used when a key is stored without one. None: never expire.
+        """
+        assert max_items is None or max_items > 0, 'Max items must be greater than zero'
+        assert max_bytes is None or max_bytes > 0, 'Max bytes must be greater than zero'
+
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.default_expiration_seconds = default_expiration_seconds
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key_name, default=None):
+        """
+        Get a key value from the local cache, marking it as the most recently used one.
+        :param key_name: Name of the key to read.
+        :param default: Value returned if the key is not in cache or is expired.
+        :return: The key value or default.
+        """
+        with self._lock:
+            entry = self._entries.get(key_name)
+            if entry is None:
+                return default
+
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key_name)
+                return default
+
+            self._entries.move_to_end(key_name)
+
+        return _copy_value(value)
+
+    def set(self, key_name, value, size, expiration_seconds=None):
+        """
+        Add a key to the local cache, evicting the least recently used keys if any limit is exceeded.
+        :param key_name: Name of the key.
+        :param value: Value to be kept in memory.
+        :param size: Size in bytes of the value (usually the size of its encoded form).
+        :param expiration_seconds: Time to expire this key in seconds. If None, the default expiration is used.
+        :return: True: key stored | False: key is bigger than the cache itself.
+        """
+        if expiration_seconds is None:
+            expiration_seconds = self.default_expiration_seconds
+
+        value = _copy_value(value)
+
+        with self._lock:
+            self._remove(key_name)
+
+            if self.max_bytes is not None and size > self.max_bytes:
+                return False
+
+            expires_at = time.monotonic() + expiration_seconds if expiration_seconds is not None else None
+            self._entries[key_name] = (value, size, expires_at)
+            self.current_bytes += size
+            self._evict()
+
+        return True
+
+    def delete(self, key_name):
+        """
+        Remove a key from the local cache.
+        :param key_name: Key to be removed.
+        """
+        with self._lock:
+            self._remove(key_name)
+
+    def clear(self):
+        """
+        Remove all keys from the local cache.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _remove(self, key_name):
+        """
+        Remove a key without locking. The caller must hold the lock.
+        """
+        entry = self._entries.pop(key_name, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+
+    def _evict(self):
+        """
+        Evict the least recently used keys until the cache is inside its limits. The caller must hold the lock.
+        """
+        while self._entries and \
+                ((self.max_items is not None and len(self._entries) > self.max_items) or
+                 (self.max_bytes is not None and self.current_bytes > self.max_bytes)):
+            _, (_, size, _) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+
+
+def _copy_value(value):
+    """
+    Copy a value, if it's mutable.
+    :param value: Value to be copied.
+    :return: The value copy, or the value itself if it can't be changed.
+    """
+    if isinstance(value, _IMMUTABLE_TYPES):
+        return value
+
+    return copy.deepcopy(value)
+
+
+def create_local_cache():
+    """
+    Create a local cache according to the settings.
+    :return: A new local cache, or None if it's disabled.
+    """
+    if not LocalCacheConfig.ENABLED:
+        return None
+
+    return LocalCache(LocalCacheConfig.MAX_ITEMS,
+                      LocalCacheConfig.MAX_BYTES,
+                      LocalCacheConfig.EXPIRATION_SECONDS)
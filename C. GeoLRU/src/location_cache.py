@@ -0,0 +1,114 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from src.settings import LocationCacheConfig
+
+# Key used for the current instance location, whose IP is unknown
+MY_LOCATION_KEY = 'my_location'
+
+
+class LocationCache:
+    """
+    IP locations cache persisted in a json file, so the IP location service is not called again on every startup.
+    """
+
+    def __init__(self, file_path, expiration_seconds=7 * 24 * 60 * 60):
+        """
+        Create an instance of location cache.
+        :param file_path: Path of the json file where the locations are persisted.
+        :param expiration_seconds: Time to expire a location, so it's requested to the IP location service again.
+        """
+        self.file_path = file_path
+        self.expiration_seconds = expiration_seconds
+        self._locations = None
+        self._lock = threading.Lock()
+
+    def get(self, ip=None):
+        """
+        Get an IP location from the cache.
+        :param ip: IP to get coordinates. If None, the current instance location is returned.
+        :return: The IP coordinates (latitude, longitude), or None if not in cache or expired.
+        """
+        with self._lock:
+            location = self._load().get(ip or MY_LOCATION_KEY)
+
+        if location is None:
+            return None
+
+        latitude, longitude, saved_at = location
+        if time.time() - saved_at > self.expiration_seconds:
+            return None
+
+        return latitude, longitude
+
+    def set(self, ip, location):
+        """
+        Add an IP location to the cache and persist it.
+        :param ip: IP of the location. If None, it's the current instance location.
+        :param location: IP coordinates (latitude, longitude).
+        """
+        with self._lock:
+            locations = self._load()
+            locations[ip or MY_LOCATION_KEY] = (location[0], location[1], time.time())
+            self._save(locations)
+
+    def _load(self):
+        """
+        Load the locations from the file, if not loaded yet. The caller must hold the lock.
+        :return: The locations dictionary.
+        """
+        if self._locations is None:
+            try:
+                with open(self.file_path) as locations_file:
+                    self._locations = json.load(locations_file)
+            except (OSError, ValueError):
+                # There is no valid file yet
+                self._locations = {}
+
+        return self._locations
+
+    def _save(self, locations):
+        """
+        Save the locations in the file, replacing it at once so concurrent processes never read a partial file.
+        The caller must hold the lock.
+        :param locations: The locations dictionary.
+        """
+        directory = os.path.dirname(self.file_path) or '.'
+        temporary_path = None
+
+        try:
+            os.makedirs(directory, exist_ok=True)
+            file_descriptor, temporary_path = tempfile.mkstemp(dir=directory)
+            with os.fdopen(file_descriptor, 'w') as locations_file:
+                json.dump(locations, locations_file)
+            os.replace(temporary_path, self.file_path)
+        except (OSError, TypeError, ValueError):
+            # The cache is only an optimization, so the locations are kept only in memory
+            if temporary_path is not None:
+                try:
+                    os.remove(temporary_path)
+                except OSError:
+                    pass
+
+
+_location_caches = {}
+_location_caches_lock = threading.Lock()
+
+
+def create_location_cache():
+    """
+    Get the location cache according to the settings, shared by all clients using the same file.
+    :return: The location cache, or None if it's disabled.
+    """
+    if LocationCacheConfig.FILE_PATH is None:
+        return None
+
+    with _location_caches_lock:
+        location_cache = _location_caches.get(LocationCacheConfig.FILE_PATH)
+        if location_cache is None:
+            location_cache = LocationCache(LocationCacheConfig.FILE_PATH, LocationCacheConfig.EXPIRATION_SECONDS)
+            _location_caches[LocationCacheConfig.FILE_PATH] = location_cache
+
+    return location_cache
@@ -0,0 +1,190 @@
+import bisect
+import threading
+from src.settings import MetricsConfig
+
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+
+
+class MetricsRegistry:
+    """
+    Counters and latency histograms, identified by their names and labels. Each update costs a dictionary lookup
+    under a lock, so they can be left enabled in production. They can be exported by hooks, called on every update,
+    or rendered in the Prometheus text format.
+    """
+
+    def __init__(self, buckets=MetricsConfig.HISTOGRAM_BUCKETS):
+        """
+        Create an instance of metrics registry.
+        :param buckets: Upper bounds of the histograms buckets, in seconds.
+        """
+        self.buckets = tuple(sorted(buckets))
+        self._counters = {}
+        self._histograms = {}
+        self._hooks = []
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1, **labels):
+        """
+        Increment a counter.
+        :param name: Counter name.
+        :param value: Value to be added.
+        :param labels: Counter labels.
+        """
+        key = (name, tuple(sorted(labels.items())))
+
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+        for hook in self._hooks:
+            hook(COUNTER, name, value, labels)
+
+    def observe(self, name, value, **labels):
+        """
+        Add an observation to a histogram.
+        :param name: Histogram name.
+        :param value: Observed value, usually a latency in seconds.
+        :param labels: Histogram labels.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        bucket_index = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Count of each bucket (and the +Inf one), sum and count
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+
+            histogram[bucket_index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+        for hook in self._hooks:
+            hook(HISTOGRAM, name, value, labels)
+
+    def get_counter(self, name, **labels):
+        """
+        Get a counter value.
+        :param name: Counter name.
+        :param labels: Counter labels.
+        :return: The counter value, zero if it was never incremented.
+        """
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def get_histogram(self, name, **labels):
+        """
+        Get a histogram summary.
+        :param name: Histogram name.
+        :param labels: Histogram labels.
+        :return: The number of observations and their sum.
+        """
+        with self._lock:
+            histogram = self._histograms.get((name, tuple(sorted(labels.items()))))
+
+        if histogram is None:
+            return 0, 0.0
+
+        return histogram[-1], histogram[-2]
+
+    def add_hook(self, hook):
+        """
+        Add a function to be called on every update, to export the metrics to other systems.
+        :param hook: Function that receives the metric type (COUNTER or HISTOGRAM), its name, the value added or
+                     observed and the labels dictionary. It must be fast, since it's called in the hot path.
+        """
+        self._hooks = self._hooks + [hook]
+
+    def remove_hook(self, hook):
+        """
+        Remove a function added with add_hook.
+        :param hook: Function to be removed.
+        """
+        self._hooks = [added_hook for added_hook in self._hooks if added_hook is not hook]
+
+    def reset(self):
+        """
+        Remove all metrics values.
+        """
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render_prometheus(self):
+        """
+        Render the metrics in the Prometheus text exposition format.
+        :return: The metrics text.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(histogram)) for key, histogram in self._histograms.items())
+
+        lines = []
+        rendered_types = set()
+
+        for (name, labels), value in counters:
+            if name not in rendered_types:
+                rendered_types.add(name)
+                lines.append('# TYPE {} counter'.format(name))
+            lines.append('{}{} {}'.format(name, _render_labels(labels), _render_number(value)))
+
+        for (name, labels), histogram in histograms:
+            if name not in rendered_types:
+                rendered_types.add(name)
+                lines.append('# TYPE {} histogram'.format(name))
+
+            cumulative_count = 0
+            for upper_bound, count in zip(self.buckets + (float('inf'),), histogram):
+                cumulative_count += count
+                bucket_labels = labels + (('le', '+Inf' if upper_bound == float('inf') else repr(upper_bound)),)
+                lines.append('{}_bucket{} {}'.format(name, _render_labels(bucket_labels), cumulative_count))
+
+            lines.append('{}_sum{} {}'.format(name, _render_labels(labels), _render_number(histogram[-2])))
+            lines.append('{}_count{} {}'.format(name, _render_labels(labels), histogram[-1]))
+
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+def _render_labels(labels):
+    """
+    Render labels in the Prometheus format, escaping their values.
+    """
+    if not labels:
+        return ''
+
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"')
+                                           .replace('\n', '\\n'))
+                          for name, value in labels) + '}'
+
+
+def _render_number(value):
+    """
+    Render a number in the Prometheus format.
+    """
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Registry used by the clients
+registry = MetricsRegistry()
+
+
+def increment(name, value=1, **labels):
+    """
+    Increment a counter of the clients registry, if metrics are enabled.
+    :param name: Counter name.
+    :param value: Value to be added.
+    :param labels: Counter labels.
+    """
+    if MetricsConfig.ENABLED:
+        registry.increment(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    """
+    Add an observation to a histogram of the clients registry, if metrics are enabled.
+    :param name: Histogram name.
+    :param value: Observed value, usually a latency in seconds.
+    :param labels: Histogram labels.
+    """
+    if MetricsConfig.ENABLED:
+        registry.observe(name, value, **labels)
@@ -0,0 +1,137 @@
+import io
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+import urllib3
+from src.settings import OriginConfig
+
+# Statuses of the responses retried
+RETRY_STATUSES = (502, 503, 504)
+
+# Redirects followed by a request, the same limit of urllib
+MAX_REDIRECTS = urllib.request.HTTPRedirectHandler.max_redirections
+
+
+class OriginClient:
+    """
+    HTTP client of the origin servers, with a pool of keep-alive connections by host, so the requests don't pay a
+    TCP and TLS handshake each. Its responses and errors are the same of urllib.request.urlopen, and like it, the
+    requests go through the proxies configured in the environment (http_proxy, https_proxy and no_proxy).
+    """
+
+    def __init__(self, max_hosts=50, max_connections_per_host=10, connect_timeout_seconds=2.0,
+                 read_timeout_seconds=10.0, retries=2, backoff_factor=0.1):
+        """
+        Create an instance of origin client.
+        :param max_hosts: Maximum number of hosts whose connections are kept.
+        :param max_connections_per_host: Maximum number of connections with each host. More concurrent requests to
+                                         the same host wait for a free connection.
+        :param connect_timeout_seconds: Timeout to connect to the host.
+        :param read_timeout_seconds: Timeout to receive data from the host.
+        :param retries: Retries of idempotent requests that fail to connect, time out or answer RETRY_STATUSES.
+                        Redirects are not retries: up to MAX_REDIRECTS are followed anyway.
+        :param backoff_factor: Factor of the exponential time waited between retries.
+        """
+        self._pool_arguments = {
+            'num_pools': max_hosts,
+            'maxsize': max_connections_per_host,
+            'block': True,
+            'timeout': urllib3.Timeout(connect=connect_timeout_seconds, read=read_timeout_seconds),
+            # Without a total, each kind of retry has its own budget
+            'retries': urllib3.Retry(total=None,
+                                     connect=retries,
+                                     read=retries,
+                                     status=retries,
+                                     redirect=MAX_REDIRECTS,
+                                     backoff_factor=backoff_factor,
+                                     status_forcelist=RETRY_STATUSES,
+                                     raise_on_status=False,
+                                     raise_on_redirect=False),
+        }
+        self._pool_manager = urllib3.PoolManager(**self._pool_arguments)
+        self._proxies = urllib.request.getproxies()
+        self._proxy_managers = {}
+        self._proxy_managers_lock = threading.Lock()
+
+    def urlopen(self, request):
+        """
+        Execute a request, following redirects. Like urllib.request.urlopen, the request origin host and
+        unverifiability are ignored, as they are only used by cookie handlers. The connection is returned to the
+        pool when the response is read until its end, or closed if the response is closed before.
+        :param request: Request to be executed (urllib.request.Request).
+        :return: The response, read on demand with "read" like the responses of urllib.request.urlopen.
+        :raise urllib.error.HTTPError: If the final response status is not 2xx.
+        :raise urllib.error.URLError: If the request fails.
+        """
+        headers = dict(request.header_items())
+        if request.data is not None and not request.has_header('Content-type'):
+            # Same default of urllib
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        try:
+            response = self._get_pool_manager(request).request(request.get_method(),
+                                                               request.full_url,
+                                                               body=request.data,
+                                                               headers=headers,
+                                                               preload_content=False)
+        except urllib3.exceptions.HTTPError as error:
+            raise urllib.error.URLError(error)
+
+        if not 200 <= response.status < 300:
+            # Reading the error body returns the connection to the pool
+            body = response.read()
+            raise urllib.error.HTTPError(request.full_url, response.status, response.reason, response.headers,
+                                         io.BytesIO(body))
+
+        return response
+
+    def _get_pool_manager(self, request):
+        """
+        Get the pool manager of a request: the one of its proxy, if the environment sets a proxy for it.
+        :param request: Request to be executed (urllib.request.Request).
+        :return: The pool manager.
+        """
+        proxy = self._proxies.get(request.type)
+        if proxy is None or urllib.request.proxy_bypass(request.host):
+            return self._pool_manager
+
+        with self._proxy_managers_lock:
+            proxy_manager = self._proxy_managers.get(proxy)
+            if proxy_manager is None:
+                # Proxies without scheme are HTTP proxies, like in urllib
+                proxy_url = urllib.parse.urlsplit(proxy if '://' in proxy else 'http://' + proxy)
+                proxy_headers = None
+                if proxy_url.username is not None:
+                    proxy_headers = urllib3.make_headers(proxy_basic_auth='{}:{}'.format(
+                        urllib.parse.unquote(proxy_url.username), urllib.parse.unquote(proxy_url.password or '')))
+
+                proxy_manager = urllib3.ProxyManager(proxy_url.geturl(),
+                                                     proxy_headers=proxy_headers,
+                                                     **self._pool_arguments)
+                self._proxy_managers[proxy] = proxy_manager
+
+        return proxy_manager
+
+
+_origin_client = None
+_origin_client_lock = threading.Lock()
+
+
+def get_origin_client():
+    """
+    Get the origin client configured in the settings, shared by all clients of the process.
+    :return: The origin client.
+    """
+    global _origin_client
+
+    with _origin_client_lock:
+        if _origin_client is None:
+            _origin_client = OriginClient(OriginConfig.MAX_HOSTS,
+                                          OriginConfig.MAX_CONNECTIONS_PER_HOST,
+                                          OriginConfig.CONNECT_TIMEOUT_SECONDS,
+                                          OriginConfig.READ_TIMEOUT_SECONDS,
+                                          OriginConfig.RETRIES,
+                                          OriginConfig.BACKOFF_FACTOR)
+
+    return _origin_client
@@ -0,0 +1,228 @@
+import hashlib
+import time
+from src import metrics
+from src.settings import InvalidationConfig, QuotaConfig
+from src.touch_batcher import TouchBatcher
+
+LRU = 'lru'
+LFU = 'lfu'
+EVICTION_POLICIES = (LRU, LFU)
+
+# Record the size of a key written (or forget a deleted key, if the size is negative) and evict keys of the
+# namespace, by their rank, until its quota is not exceeded anymore. Keys expired by their TTL are forgotten first.
+# The keys evicted are returned and, if invalidation is enabled, published for the other clients to drop them.
+# Executed atomically in the master, so concurrent clients share the same usage.
+RECORD_WRITE_SCRIPT = """
+local sizes, ranks, expirations, used_bytes = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local key_name, size, now, quota = ARGV[1], tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local used = tonumber(redis.call('GET', used_bytes) or '0')
+
+local function forget(name)
+    used = used - tonumber(redis.call('HGET', sizes, name) or '0')
+    redis.call('HDEL', sizes, name)
+    redis.call('ZREM', ranks, name)
+    redis.call('ZREM', expirations, name)
+end
+
+for _, name in ipairs(redis.call('ZRANGEBYSCORE', expirations, '-inf', now, 'LIMIT', 0, 100)) do
+    forget(name)
+end
+
+local evicted = {}
+if size >= 0 then
+    local accesses = tonumber(redis.call('ZSCORE', ranks, key_name) or '0')
+    forget(key_name)
+    used = used + size
+    redis.call('HSET', sizes, key_name, size)
+    redis.call('ZADD', ranks, ARGV[5] == 'lfu' and accesses + 1 or now, key_name)
+    if ARGV[6] ~= '' then
+        redis.call('ZADD', expirations, ARGV[6], key_name)
+    end
+
+    local key_evicted = false
+    while used > quota do
+        -- The key written is evicted only if it alone exceeds the quota, and only once
+        local victim
+        if size > quota and not key_evicted then
+            victim = key_name
+            key_evicted = true
+        else
+            local victims = redis.call('ZRANGE', ranks, 0, 1)
+            victim = victims[1]
+            if victim == key_name then
+                victim = victims[2]
+            end
+        end
+        if not victim then
+            break
+        end
+        forget(victim)
+        redis.call('DEL', victim)
+        table.insert(evicted, victim)
+    end
+elseif key_name ~= '' then
+    forget(key_name)
+end
+
+redis.call('SET', used_bytes, used)
+if #evicted > 0 and ARGV[7] ~= '' then
+    redis.call('PUBLISH', ARGV[7], cjson.encode({client_id = ARGV[8], keys = evicted}))
+end
+return evicted
+"""
+# Sent with EVALSHA, so the script source isn't sent in every write (the clients load it on NOSCRIPT errors)
+RECORD_WRITE_SCRIPT_SHA = hashlib.sha1(RECORD_WRITE_SCRIPT.encode()).hexdigest()
+
+
+def get_namespace(key_name):
+    """
+    Get the namespace of a key, if it has a quota.
+    :param key_name: Key name.
+    :return: The key namespace, or None if it has no quota.
+    """
+    namespace = key_name.partition(':')[0]
+    return namespace if namespace in QuotaConfig.QUOTAS_BYTES else None
+
+
+def get_usage_keys(namespace):
+    """
+    Get the names of the keys where the usage of a namespace is recorded.
+    :param namespace: Namespace.
+    :return: Names of the keys with the size, rank and expiration time of each key, and with the bytes used.
+    """
+    return tuple('quota:{}:{}'.format(namespace, name) for name in ('sizes', 'ranks', 'expirations', 'bytes'))
+
+
+def _add_record_command(pipeline, namespace, key_name, size, expiration_seconds=None, client_id=''):
+    """
+    Add to a pipeline the command that records a key size and evicts keys exceeding its namespace quota.
+    :param pipeline: Pipeline of the master server.
+    :param namespace: Key namespace.
+    :param key_name: Key name, or an empty string to only forget the keys expired.
+    :param size: Key size in bytes, or -1 to forget the key.
+    :param expiration_seconds: Time to expire the key in seconds.
+    :param client_id: Id of the client writing the key, sent with the invalidation of the keys evicted.
+    """
+    assert QuotaConfig.EVICTION_POLICY in EVICTION_POLICIES, \
+        'Eviction policy must be one of: {}'.format(', '.join(EVICTION_POLICIES))
+
+    now = time.time()
+    expires_at = now + expiration_seconds if expiration_seconds is not None else ''
+    channel = InvalidationConfig.CHANNEL if InvalidationConfig.ENABLED else ''
+    pipeline.evalsha(RECORD_WRITE_SCRIPT_SHA, 4, *get_usage_keys(namespace), key_name, size, now,
+                     QuotaConfig.QUOTAS_BYTES[namespace], QuotaConfig.EVICTION_POLICY, expires_at, channel, client_id)
+
+
+def add_write_commands(pipeline, client_id, sizes, expiration_seconds=None):
+    """
+    Add to a pipeline the commands that record the sizes of the keys written in namespaces with quota, evicting
+    keys if their quotas are exceeded. Their results are the lists of keys evicted (see record_evictions), whose
+    invalidation is broadcast like the keys written.
+    :param pipeline: Pipeline of the master server.
+    :param client_id: Id of the client writing the keys, which must remove the keys evicted from its local cache.
+    :param sizes: Dictionary with the sizes in bytes of the values written by key name.
+    :param expiration_seconds: Time to expire the keys in seconds.
+    """
+    for key_name, size in sizes.items():
+        namespace = get_namespace(key_name)
+        if namespace is not None:
+            _add_record_command(pipeline, namespace, key_name, size, expiration_seconds, client_id)
+
+
+def add_delete_command(pipeline, key_name):
+    """
+    Add to a pipeline the command that forgets a key deleted, if its namespace has quota.
+    :param pipeline: Pipeline of the master server.
+    :param key_name: Key deleted.
+    """
+    namespace = get_namespace(key_name)
+    if namespace is not None:
+        _add_record_command(pipeline, namespace, key_name, -1)
+
+
+def add_expire_commands(pipeline, expirations):
+    """
+    Add to a pipeline the commands that record the new expiration times of keys in namespaces with quota.
+    :param pipeline: Pipeline of the master server.
+    :param expirations: Dictionary with the expiration time in seconds by key name.
+    """
+    now = time.time()
+    for key_name, expiration_seconds in expirations.items():
+        namespace = get_namespace(key_name)
+        if namespace is not None:
+            pipeline.zadd(get_usage_keys(namespace)[2], {key_name: now + expiration_seconds}, xx=True)
+
+
+def add_access_commands(pipeline, accesses):
+    """
+    Add to a pipeline the commands that update the ranks of the keys read, according to the eviction policy.
+    :param pipeline: Pipeline of the master server.
+    :param accesses: Dictionary with the number of reads by key name.
+    """
+    now = time.time()
+    for key_name, count in accesses.items():
+        ranks_key = get_usage_keys(get_namespace(key_name))[1]
+        if QuotaConfig.EVICTION_POLICY == LFU:
+            pipeline.zadd(ranks_key, {key_name: count}, xx=True, incr=True)
+        else:
+            pipeline.zadd(ranks_key, {key_name: now}, xx=True)
+
+
+def add_usage_commands(pipeline):
+    """
+    Add to a pipeline the commands that read the usage of all namespaces with quota (see get_usage).
+    :param pipeline: Pipeline of the master server.
+    """
+    for namespace in sorted(QuotaConfig.QUOTAS_BYTES):
+        sizes_key, _, _, used_bytes_key = get_usage_keys(namespace)
+        _add_record_command(pipeline, namespace, '', -1)
+        pipeline.get(used_bytes_key)
+        pipeline.hlen(sizes_key)
+
+
+def get_usage(results):
+    """
+    Get the usage of the namespaces with quota from the results of the commands added by add_usage_commands.
+    :param results: Results of the pipeline.
+    :return: Dictionary with the quota, bytes used and number of keys by namespace.
+    """
+    return {namespace: {'quota_bytes': QuotaConfig.QUOTAS_BYTES[namespace],
+                        'used_bytes': int(results[index * 3 + 1] or 0),
+                        'keys': results[index * 3 + 2]}
+            for index, namespace in enumerate(sorted(QuotaConfig.QUOTAS_BYTES))}
+
+
+def record_evictions(results):
+    """
+    Count the keys evicted by the commands added by add_write_commands.
+    :param results: Results of the pipeline with these commands, whose results are the lists of keys evicted.
+    :return: Names of the keys evicted.
+    """
+    evicted = [key_name.decode() if isinstance(key_name, bytes) else key_name
+               for keys_evicted in results if isinstance(keys_evicted, list) for key_name in keys_evicted]
+
+    for key_name in evicted:
+        metrics.increment('geo_lru_quota_evictions_total', namespace=get_namespace(key_name))
+
+    return evicted
+
+
+class AccessBatcher(TouchBatcher):
+    """
+    Coalesce the reads of keys in namespaces with quota, so their ranks are updated in the master in background,
+    all keys read in the interval together.
+    """
+
+    def record_access(self, key_name):
+        """
+        Add a read of a key, if its namespace has quota, to be sent in the next update.
+        :param key_name: Key read.
+        :return: True: read added | False: the key namespace has no quota.
+        """
+        if get_namespace(key_name) is None:
+            return False
+
+        with self._lock:
+            self._pending[key_name] = self._pending.get(key_name, 0) + 1
+
+        return True
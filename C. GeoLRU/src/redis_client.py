@@ -1,26 +1,76 @@
-import json
+import threading
+import time
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 import geopy.distance
 import redis
 from redis.sentinel import Sentinel
+from src import invalidation, metrics, quotas, serializers, streams
+from src.circuit_breaker import CircuitBreaker
+from src.connection_pools import get_connection_pool
 from src.ipinfo_client import get_ip_location as get_ip_location_ipinfo
+from src.location_cache import create_location_cache
+from src.settings import FailoverConfig, InvalidationConfig, QuotaConfig, RedisConfig, SlidingExpirationConfig, \
+    WriteBehindConfig
+from src.touch_batcher import TouchBatcher
+from src.write_behind import WriteBehindQueue
 
+# Position of the distance in km in the slaves list items: (IP, port, latitude, longitude, distance)
+SLAVE_DISTANCE_INDEX = 4
 
-class RedisCli:
-    def __init__(self, sentinels_addresses, master_name, master_password=None, sentinel_socket_timeout=1.0):
+# Weight of the last round trip time measured in the slaves round trip time moving average
+SLAVE_RTT_EWMA_ALPHA = 0.3
+
+# Marks a key not found in the local cache, since None is a valid cached value
+_NOT_CACHED = object()
+
+# Messages of the errors raised by the connection pools when they have no connection available (blocking pools,
+# after waiting) or when they reach their maximum number of connections (non blocking pools)
+_POOL_EXHAUSTED_MESSAGES = ('No connection available.', 'Too many connections')
+
+
+class BaseRedisCli:
+    """
+    Redis client logic that doesn't depend on how the servers are accessed, shared by the sync and async clients.
+    """
+
+    def __init__(self, sentinels_addresses, master_name, master_password=None, sentinel_socket_timeout=1.0,
+                 local_cache=None, serializer=None):
         """
         Create an instance of redis client.
         :param sentinels_addresses: redis sentinel addresses
         :param master_name: redis master name
         :param master_password: redis master password
         :param sentinel_socket_timeout: redis sentinel socket timeout
+        :param local_cache: optional in-process cache (local_cache.LocalCache) checked before the redis servers
+        :param serializer: serializer used to write values. If None, the one configured in the settings is used
         """
         self.sentinels_addresses = sentinels_addresses
         self._validate_sentinels_addresses()
         self.master_name = master_name
         self.master_password = master_password
         self.my_location = None
+        self.location_cache = create_location_cache()
         self.sentinel_socket_timeout = sentinel_socket_timeout
-        self._connect()
+        self.local_cache = local_cache
+        self.serializer = serializer or serializers.create_serializer()
+        self._raw_bytes_serializer = serializers.create_serializer('binary')
+        self.master = None
+        self.master_address = None
+        self.slaves = []
+        self.slaves_rtt = {}
+        self.nearest_cache = None
+        self.read_servers = []
+        self.server_socket_timeout = FailoverConfig.SERVER_SOCKET_TIMEOUT
+        self.server_socket_connect_timeout = FailoverConfig.SERVER_SOCKET_CONNECT_TIMEOUT
+        self.master_socket_timeout = FailoverConfig.MASTER_SOCKET_TIMEOUT
+        self._slave_connections = {}
+        self._circuit_breakers = {}
+        self._touch_batcher = TouchBatcher(SlidingExpirationConfig.TOUCH_INTERVAL_SECONDS)
+        self._write_behind_queue = None
+        self._access_batcher = quotas.AccessBatcher(QuotaConfig.ACCESS_FLUSH_INTERVAL_SECONDS)
+        self._client_id = uuid.uuid4().hex
 
     @staticmethod
     def _validate_sentinel_address(sentinel_address):
@@ -47,6 +97,368 @@ class RedisCli:
         for sentinel_address in self.sentinels_addresses:
             assert self._validate_sentinel_address(sentinel_address), sentinel_address_error_message
 
+    def _get_ip_location(self, ip=None):
+        """
+        Get an IP location coordinates: from the static locations in the settings, from the location cache or
+        from the IP location service.
+        :param ip: IP to get coordinates. If None, current instance location is returned.
+        :return: Null if fail or the coordinates if success.
+        """
+        static_location = RedisConfig.MY_LOCATION if ip is None else RedisConfig.SERVERS_LOCATIONS.get(ip)
+        if static_location is not None:
+            return tuple(static_location)
+
+        if self.location_cache is not None:
+            location = self.location_cache.get(ip)
+            if location is not None:
+                return location
+
+        try:
+            location = get_ip_location_ipinfo(ip)
+        except:
+            return None
+
+        if location is not None and self.location_cache is not None:
+            self.location_cache.set(ip, location)
+
+        return location
+
+    def calculate_distance_in_km(self, coordinates):
+        """
+        Calculate distance from the current IP location and oter coordinates.
+        :param coordinates: Coordinates do calculate distance from my location
+        :return: The distance between locations.
+        """
+        return geopy.distance.distance(self.my_location, coordinates).km
+
+    def _build_slave(self, slave, ip_location):
+        """
+        Build a slave list item: (IP, port, latitude, longitude, distance in km).
+        :param slave: Slave address (IP, port) received from the sentinel.
+        :param ip_location: Slave IP location coordinates, or None if unknown.
+        :return: The slave list item.
+        """
+        if ip_location is None or self.my_location is None:
+            return tuple(slave) + (None, None, None)
+
+        return tuple(slave) + tuple(ip_location) + (self.calculate_distance_in_km(ip_location),)
+
+    def _update_slave_rtt(self, address, rtt_seconds):
+        """
+        Update the moving average (EWMA) of a slave round trip time.
+        :param address: Slave address (IP, port).
+        :param rtt_seconds: Last round trip time measured.
+        """
+        average_rtt = self.slaves_rtt.get(address)
+        if average_rtt is not None:
+            rtt_seconds = SLAVE_RTT_EWMA_ALPHA * rtt_seconds + (1 - SLAVE_RTT_EWMA_ALPHA) * average_rtt
+
+        self.slaves_rtt[address] = rtt_seconds
+
+    def _get_slave_rank(self, slave):
+        """
+        Get a slave rank, used to sort slaves from the nearest to the farthest. Slaves with measured round trip
+        time are the nearest ones, sorted by it, followed by the ones with known distance, sorted by it.
+        :param slave: Slave list item.
+        :return: The slave rank.
+        """
+        rtt = self.slaves_rtt.get(slave[:2])
+        if rtt is not None:
+            return 0, rtt
+
+        distance = slave[SLAVE_DISTANCE_INDEX]
+        if distance is not None:
+            return 1, distance
+
+        return 2, 0
+
+    def _get_ranked_slaves(self):
+        """
+        Get the list of slaves sorted from the nearest to the farthest.
+        :return: The sorted list of slaves.
+        """
+        return sorted(self.slaves, key=self._get_slave_rank)
+
+    def _get_nearest_slave(self):
+        """
+        Get the nearest slave, according to the list of slaves.
+        :return: The nearest slave list item, or None if there are no slaves.
+        """
+        return next(iter(self._get_ranked_slaves()), None)
+
+    def _get_slave_connection(self, address):
+        """
+        Get the connection with a slave, reusing it if it was already created.
+        :param address: Slave address (IP, port).
+        :return: The slave connection.
+        """
+        connection = self._slave_connections.get(address)
+        if connection is None:
+            connection = self._redis_server_connection(*address)
+            self._slave_connections[address] = connection
+
+        return connection
+
+    def _load_nearest_cache(self):
+        """
+        Load the nearest cache server according to the list of slaves, and the list of servers used for reading:
+        the slaves, from the nearest to the farthest, followed by the master.
+        """
+        read_servers = [(slave[:2], self._get_slave_connection(slave[:2])) for slave in self._get_ranked_slaves()]
+        nearest_cache = read_servers[0][1] if read_servers else None
+
+        if self.master is not None:
+            read_servers.append((self.master_address, self.master))
+
+        self.read_servers = read_servers
+        self.nearest_cache = nearest_cache
+
+    @staticmethod
+    def _is_pool_exhausted(error):
+        """
+        Check if a redis error was raised because the local connection pool has no connection available, which
+        says nothing about the server health.
+        :param error: Redis error.
+        :return: True | False
+        """
+        return isinstance(error, redis.ConnectionError) and str(error) in _POOL_EXHAUSTED_MESSAGES
+
+    def _get_circuit_breaker(self, address):
+        """
+        Get the circuit breaker of a server, creating it if needed.
+        :param address: Server address (IP, port).
+        :return: The server circuit breaker.
+        """
+        circuit_breaker = self._circuit_breakers.get(address)
+        if circuit_breaker is None:
+            circuit_breaker = self._circuit_breakers.setdefault(
+                address,
+                CircuitBreaker(FailoverConfig.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+                               FailoverConfig.CIRCUIT_BREAKER_RESET_TIMEOUT_SECONDS))
+
+        return circuit_breaker
+
+    def _get_object_to_write(self, value):
+        """
+        Get an object ready to be written in database, serialized by the configured serializer, or by the binary
+        serializer if it's serializers.RawBytes.
+        :param value: Valus do be saved in database.
+        :return: an object ready to be written in database.
+        :raise serializers.SerializationError: If the value can't be serialized.
+        """
+        started_at = time.perf_counter()
+        try:
+            serializer = self._raw_bytes_serializer if isinstance(value, serializers.RawBytes) else self.serializer
+            object_to_write = serializer.dumps(value)
+        except Exception as error:
+            # Each serializer fails in its own way (TypeError, ValueError, pickle.PicklingError...)
+            metrics.increment('geo_lru_serialization_errors_total')
+            raise serializers.SerializationError('Value of type {} can\'t be serialized: {}'
+                                                 .format(type(value).__name__, error)) from error
+
+        metrics.observe('geo_lru_serialization_seconds', time.perf_counter() - started_at, operation='dumps')
+        return object_to_write
+
+    def _get_objects_to_write(self, values):
+        """
+        Get many objects ready to be written in database. Values that can't be serialized are skipped, so they
+        don't prevent the others from being written.
+        :param values: Dictionary with the values by key name.
+        :return: Dictionary with the objects ready to be written by key name.
+        """
+        objects_to_write = {}
+
+        for key_name, value in values.items():
+            try:
+                objects_to_write[key_name] = self._get_object_to_write(value)
+            except serializers.SerializationError:
+                pass
+
+        return objects_to_write
+
+    @staticmethod
+    def _decode_writen_value(writen_value):
+        """
+        Decode a value received from database, restoring it status according to its original data type. Values
+        written by any serializer (including the json envelopes written by previous versions) are decoded.
+        :param writen_value: Raw value received from database.
+        :return: The value converted to its original status.
+        """
+        if writen_value is None:
+            return None
+
+        started_at = time.perf_counter()
+        value = serializers.loads(writen_value)
+        metrics.observe('geo_lru_serialization_seconds', time.perf_counter() - started_at, operation='loads')
+        return value
+
+    @staticmethod
+    def _record_command(address, command_name, started_at, failed=False):
+        """
+        Record a command latency, or its failure, in the metrics labeled by server.
+        :param address: Server address (IP, port).
+        :param command_name: Command name.
+        :param started_at: Time when the command started, from time.perf_counter.
+        :param failed: True if the command failed.
+        """
+        node = '{}:{}'.format(*address) if address is not None else 'unknown'
+
+        if failed:
+            metrics.increment('geo_lru_redis_errors_total', node=node, command=command_name)
+        else:
+            metrics.observe('geo_lru_redis_command_seconds', time.perf_counter() - started_at, node=node,
+                            command=command_name)
+
+    @staticmethod
+    def _record_reads(source, hits, misses=0):
+        """
+        Record reads results in the metrics.
+        :param source: Where the keys were read: local or redis.
+        :param hits: Number of keys found.
+        :param misses: Number of keys not found.
+        """
+        if hits:
+            metrics.increment('geo_lru_reads_total', hits, source=source, result='hit')
+        if misses:
+            metrics.increment('geo_lru_reads_total', misses, source=source, result='miss')
+
+    def _read_from_local_cache(self, key_name):
+        """
+        Read a value waiting to be written in background, or from the local cache, if enabled.
+        :param key_name: Name of the key to read.
+        :return: The key value, or _NOT_CACHED if it isn't in the local cache.
+        """
+        if self._write_behind_queue is not None:
+            value = self._write_behind_queue.get(key_name, _NOT_CACHED)
+            if value is not _NOT_CACHED:
+                return value
+
+        if self.local_cache is None:
+            return _NOT_CACHED
+
+        return self.local_cache.get(key_name, _NOT_CACHED)
+
+    def _add_read_to_local_cache(self, key_name, value, writen_value, ttl_milliseconds=None):
+        """
+        Add a value read from the server to the local cache, if enabled. It expires in the local cache after its
+        default expiration, or when it expires in the server, if before.
+        :param key_name: Name of the key.
+        :param value: Decoded value.
+        :param writen_value: Raw value received from the server, or None if the key doesn't exist.
+        :param ttl_milliseconds: Key remaining time to live in the server (PTTL), negative if it doesn't expire,
+                                 or None if unknown.
+        """
+        if self.local_cache is None or writen_value is None:
+            return
+
+        expiration_seconds = None
+        if ttl_milliseconds is not None and ttl_milliseconds >= 0:
+            expiration_seconds = ttl_milliseconds / 1000
+            if self.local_cache.default_expiration_seconds is not None:
+                expiration_seconds = min(expiration_seconds, self.local_cache.default_expiration_seconds)
+
+        self.local_cache.set(key_name, value, len(writen_value), expiration_seconds)
+
+    @staticmethod
+    def _add_read_commands(pipeline, key_names):
+        """
+        Add to a pipeline the commands to read keys and their remaining time to live: a MGET command followed by
+        a PTTL command by key.
+        :param pipeline: Pipeline of the server.
+        :param key_names: Names of the keys to read.
+        """
+        pipeline.mget(key_names)
+        for key_name in key_names:
+            pipeline.pttl(key_name)
+
+    @staticmethod
+    def _split_read_results(results, key_names):
+        """
+        Split the results of the commands added by _add_read_commands.
+        :param results: Pipeline results, or None if the read failed.
+        :param key_names: Names of the keys read.
+        :return: Lists with the raw values (None for keys not found) and the remaining times to live in
+                 milliseconds, in the same order of key_names.
+        """
+        if results is None:
+            return [None] * len(key_names), [None] * len(key_names)
+
+        return results[0], results[1:]
+
+    def _get_invalidations_server(self):
+        """
+        Get the server used to receive invalidations: the nearest one, where invalidations are replicated in the
+        same order of the writes, so a key invalidated is read again with its new value.
+        :return: The server connection.
+        """
+        if not self.read_servers:
+            raise redis.ConnectionError('There is no server to receive invalidations')
+
+        return self.read_servers[0][1]
+
+    def _invalidate_local_cache(self, message):
+        """
+        Remove from the local cache the keys invalidated by a message of another client.
+        :param message: Message received from the invalidations channel, or None.
+        """
+        for key_name in invalidation.get_invalidated_keys(message, self._client_id):
+            self.local_cache.delete(key_name)
+
+    def _remove_evicted_from_local_cache(self, key_names):
+        """
+        Remove from the local cache the keys evicted by the quotas in a write of this client (the other clients
+        receive their invalidation from the quota script).
+        :param key_names: Keys evicted.
+        """
+        if self.local_cache is not None:
+            for key_name in key_names:
+                self.local_cache.delete(key_name)
+
+    def _add_write_to_local_cache(self, key_name, object_to_write, expiration_seconds):
+        """
+        Add a value written in the master server to the local cache, if enabled.
+        :param key_name: Name of the key.
+        :param object_to_write: Object written in the server, or None if the writing failed.
+        :param expiration_seconds: Time to expire this key in seconds.
+        """
+        if self.local_cache is None:
+            return
+
+        if object_to_write is None:
+            # The value in the server is unknown now, so the local copy can't be trusted
+            self.local_cache.delete(key_name)
+            return
+
+        # Keep in memory the same value a read from the server would return
+        self.local_cache.set(key_name,
+                             self._decode_writen_value(object_to_write),
+                             len(object_to_write),
+                             expiration_seconds)
+
+
+class RedisCli(BaseRedisCli):
+    def __init__(self, sentinels_addresses, master_name, master_password=None, sentinel_socket_timeout=1.0,
+                 local_cache=None, serializer=None):
+        """
+        Create an instance of redis client, connected to the sentinel and to the master and nearest slave servers.
+        :param sentinels_addresses: redis sentinel addresses
+        :param master_name: redis master name
+        :param master_password: redis master password
+        :param sentinel_socket_timeout: redis sentinel socket timeout
+        :param local_cache: optional in-process cache (local_cache.LocalCache) checked before the redis servers
+        :param serializer: serializer used to write values. If None, the one configured in the settings is used
+        """
+        super().__init__(sentinels_addresses, master_name, master_password, sentinel_socket_timeout, local_cache,
+                         serializer)
+        self._refresh_stop = None
+        self._refresh_thread = None
+        self._invalidations_thread = None
+        self._write_behind_lock = threading.Lock()
+        self._connect()
+
+        if InvalidationConfig.ENABLED and self.local_cache is not None:
+            self._start_invalidations_listener()
+
     def _connect(self):
         """
         Connect to the sentinel and load masters and slaves list.
@@ -57,17 +469,19 @@ class RedisCli:
         self._load_slaves()
         self._load_nearest_cache()
 
-    def _redis_server_connection(self, ip, port):
+    def _redis_server_connection(self, ip, port, socket_timeout=None):
         """
-        Return a new instance os redis server connection.
+        Return a new instance os redis server connection, using the server connection pool shared by all clients.
         :param ip: Server IP.
         :param port: Server port.
+        :param socket_timeout: Server socket timeout. If None, the servers socket timeout is used.
         :return: A new instance of redis server connection.
         """
-        return redis.Redis(
-                host=ip,
-                port=port,
-                password=self.master_password)
+        return redis.Redis(connection_pool=get_connection_pool(ip,
+                                                               port,
+                                                               self.master_password,
+                                                               socket_timeout or self.server_socket_timeout,
+                                                               self.server_socket_connect_timeout))
 
     def _load_master(self):
         """
@@ -82,43 +496,35 @@ class RedisCli:
 
         if master_info is not None:
             master_ip, master_port = master_info
-            self.master = self._redis_server_connection(master_ip, master_port)
-
-    @staticmethod
-    def _get_ip_location(ip=None):
-        """
-        Get an IP location coordinates.
-        :param ip: IP to get coordinates.
-        :return: Null if fail or the coordinates if success.
-        """
-        try:
-            return get_ip_location_ipinfo(ip)
-        except:
-            return None
+            self.master = self._redis_server_connection(master_ip, master_port, self.master_socket_timeout)
+            self.master_address = master_info
 
     def _load_slaves(self):
         """
-        Load the slaves list.
+        Load the slaves list, getting my location and the slaves locations concurrently.
         """
         self.slaves = []
 
         if self.master is None:
             return
 
-        # Load my IP location before loading slaves, so it will be possible to calculate distance
+        sentinel_slaves = self.sentinel.discover_slaves(self.master_name)
+        # TODO remove
+        sentinel_slaves = [slave for slave in sentinel_slaves if slave[0] != '127.0.0.1']
+
+        # My location (IP None) is loaded with the slaves locations, so it will be possible to calculate distance
+        ips = [None] + [slave[0] for slave in sentinel_slaves]
+        with ThreadPoolExecutor(max_workers=len(ips)) as executor:
+            my_location, *ip_locations = executor.map(self._get_ip_location, ips)
+
         if self.my_location is None:
-            if not self._get_my_location():
+            self.my_location = my_location
+            if self.my_location is None:
                 # If my location is unknown, it will not be possible to calculate the nearest slave
                 return
 
-        sentinel_slaves = self.sentinel.discover_slaves(self.master_name)
-        for slave in sentinel_slaves:
-            slave_ip = slave[0]
-            # TODO remove
-            if slave_ip != '127.0.0.1':
-                ip_location = self._get_ip_location(slave[0])
-                distance = self.calculate_distance_in_km(ip_location) if ip_location is not None else None
-                self.slaves.append(slave + ip_location + (distance,))
+        self.slaves = [self._build_slave(slave, ip_location)
+                       for slave, ip_location in zip(sentinel_slaves, ip_locations)]
 
     def _get_my_location(self):
         """
@@ -127,113 +533,298 @@ class RedisCli:
         self.my_location = self._get_ip_location()
         return self.my_location is not None
 
-    def calculate_distance_in_km(self, coordinates):
+    def _ping_slave(self, address):
         """
-        Calculate distance from the current IP location and oter coordinates.
-        :param coordinates: Coordinates do calculate distance from my location
-        :return: The distance between locations.
+        Measure the round trip time of a PING command to a slave.
+        :param address: Slave address (IP, port).
+        :return: The round trip time in seconds, or None if the slave didn't answer.
         """
-        return geopy.distance.distance(self.my_location, coordinates).km
+        try:
+            start_time = time.perf_counter()
+            self._get_slave_connection(address).ping()
+            return time.perf_counter() - start_time
+        except redis.RedisError:
+            return None
 
-    def _load_nearest_cache(self):
+    def refresh_topology(self):
         """
-        Load the nearest cache server according to the list of slaves.
+        Discover the master and the slaves again, measure the slaves round trip time and load the nearest cache
+        server again, according to it. New slaves start to be used and slaves that don't answer are dropped.
+        The new topology replaces the current one at once, so readers are never blocked.
         """
-        self.nearest_cache = None
+        try:
+            master_info = self.sentinel.discover_master(self.master_name)
+        except redis.sentinel.MasterNotFoundError:
+            # The sentinels are unavailable, so keep the current topology
+            return
+
+        if master_info != self.master_address:
+            master_ip, master_port = master_info
+            self.master = self._redis_server_connection(master_ip, master_port, self.master_socket_timeout)
+            self.master_address = master_info
+
+        if self.my_location is None:
+            self._get_my_location()
+
+        sentinel_slaves = self.sentinel.discover_slaves(self.master_name)
+        if not sentinel_slaves and self.slaves:
+            # The sentinels are probably unavailable, so keep the current topology
+            return
+
+        current_slaves = {slave[:2]: slave for slave in self.slaves}
+        slaves = []
+
+        for address in sentinel_slaves:
+            address = tuple(address)
+            # TODO remove
+            if address[0] == '127.0.0.1':
+                continue
+
+            rtt = self._ping_slave(address)
+            if rtt is None:
+                continue
+
+            self._update_slave_rtt(address, rtt)
+            slave = current_slaves.get(address)
+            if slave is None:
+                slave = self._build_slave(address, self._get_ip_location(address[0]))
+            slaves.append(slave)
+
+        # Forget the slaves dropped
+        addresses = {slave[:2] for slave in slaves}
+        self.slaves_rtt = {address: rtt for address, rtt in self.slaves_rtt.items() if address in addresses}
+        self._slave_connections = {address: connection for address, connection in self._slave_connections.items()
+                                   if address in addresses}
+
+        self.slaves = slaves
+        self._load_nearest_cache()
+
+    def start_topology_refresh(self, interval_seconds):
+        """
+        Start refreshing the topology (refresh_topology) periodically in background.
+        :param interval_seconds: Interval between refreshes.
+        """
+        if self._refresh_thread is not None:
+            return
 
-        # starts with first slave
-        nearest_slave = next(iter(self.slaves), None)
+        self._refresh_stop = threading.Event()
+        # The thread keeps only a weak reference, so it doesn't prevent the client from being garbage collected
+        self._refresh_thread = threading.Thread(target=self._refresh_topology_periodically,
+                                                args=(weakref.ref(self), interval_seconds, self._refresh_stop),
+                                                name='geo-lru-topology-refresh',
+                                                daemon=True)
+        self._refresh_thread.start()
 
-        for slave in self.slaves[1:]:
-            current_slave_distance = slave[3]
-            nearest_slave_distance = nearest_slave[3]
-            if nearest_slave_distance is not None and\
-                current_slave_distance is not None and\
-                nearest_slave_distance > current_slave_distance:
-                nearest_slave = slave
+    def stop_topology_refresh(self):
+        """
+        Stop refreshing the topology in background.
+        """
+        if self._refresh_thread is None:
+            return
 
-        if nearest_slave is not None:
-            ip, port = (nearest_slave[0], nearest_slave[1])
-            self.nearest_cache = self._redis_server_connection(ip, port)
+        self._refresh_stop.set()
+        self._refresh_thread.join()
+        self._refresh_thread = None
 
     @staticmethod
-    def _prepare_data_to_write(data):
+    def _refresh_topology_periodically(client_reference, interval_seconds, stop):
         """
-        Prepara data to write in the server, according to each data type.
-        :param data: Data to be prepared
-        :return: The data prepared and its type.
+        Refresh the topology until stopped or until the client is garbage collected.
+        :param client_reference: Weak reference to the client.
+        :param interval_seconds: Interval between refreshes.
+        :param stop: Event set to stop refreshing.
         """
-        if data is None:
-            return data, "none"
+        while not stop.wait(interval_seconds):
+            client = client_reference()
+            if client is None:
+                return
 
-        if isinstance(data, bytes):
-            return data.decode(), bytes.__name__
+            try:
+                client.refresh_topology()
+            except Exception:
+                # Keep the current topology until the next refresh
+                pass
+            finally:
+                del client
 
-        if isinstance(data, bytearray):
-            return data.decode('utf8'), bytes.__name__
+    def _start_invalidations_listener(self):
+        """
+        Start removing from the local cache, in background, the keys invalidated by other clients.
+        """
+        # The thread keeps only a weak reference, so it doesn't prevent the client from being garbage collected
+        self._invalidations_thread = threading.Thread(target=self._listen_invalidations,
+                                                      args=(weakref.ref(self),),
+                                                      name='geo-lru-invalidations',
+                                                      daemon=True)
+        self._invalidations_thread.start()
 
-        return data, data.__class__.__name__
+    def _subscribe_invalidations(self):
+        """
+        Subscribe to the invalidations channel, clearing the local cache, since invalidations may have been lost
+        while not subscribed.
+        :return: The subscription.
+        """
+        pubsub = self._get_invalidations_server().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(InvalidationConfig.CHANNEL)
+        self.local_cache.clear()
+        return pubsub
 
     @staticmethod
-    def _decode_writen_data(data, data_type):
+    def _listen_invalidations(client_reference):
         """
-        Decode data received from the server during a reding.
-        :param data: Data received from the server.
-        :param data_type: Original data type of this data before saving in the server.
-        :return:
+        Receive the invalidations until the client is garbage collected, subscribing again after errors.
+        :param client_reference: Weak reference to the client.
         """
-        # Check types that have to be treated in a special way
-        if data_type == 'none':
-            return None
-        if data_type == tuple.__name__:
-            return tuple(data)
-        if data_type == bytes.__name__:
-            return data.encode()
-        if data_type == bytearray.__name__:
-            return bytearray(data, 'utf8')
+        pubsub = None
 
-        return data
+        while True:
+            client = client_reference()
+            if client is None:
+                break
 
-    def _get_object_to_write(self, value):
+            try:
+                if pubsub is None:
+                    pubsub = client._subscribe_invalidations()
+                client._invalidate_local_cache(pubsub.get_message(timeout=1.0))
+            except (redis.RedisError, OSError):
+                if pubsub is not None:
+                    pubsub.close()
+                    pubsub = None
+                time.sleep(InvalidationConfig.RETRY_INTERVAL_SECONDS)
+            finally:
+                del client
+
+        if pubsub is not None:
+            pubsub.close()
+
+    def _read_with_failover(self, command, command_name='get'):
         """
-        Get an object ready to be written in database, composed by two fields: the value itself and its type.
-        :param value: Valus do be saved in database.
-        :return: an object ready to be written in database, composed by two fields: the value itself and its type.
+        Execute a read command in the nearest available server. Servers that fail are skipped, trying the next
+        nearest slave and finally the master, and are not used again until their circuit breaker allows it.
+        :param command: Function that receives a server connection and executes the command.
+        :param command_name: Command name, for the metrics.
+        :return: The command result, or None if all servers failed.
         """
-        encoded_data, type = self._prepare_data_to_write(value)
-        return json.dumps(dict(value=encoded_data, type=type))
+        for address, server in self.read_servers:
+            circuit_breaker = self._get_circuit_breaker(address)
+            if not circuit_breaker.allow_request():
+                continue
+
+            started_at = time.perf_counter()
+            try:
+                result = command(server)
+            except redis.RedisError as error:
+                if self._is_pool_exhausted(error):
+                    circuit_breaker.release()
+                else:
+                    circuit_breaker.record_failure()
+                self._record_command(address, command_name, started_at, failed=True)
+                continue
+
+            circuit_breaker.record_success()
+            self._record_command(address, command_name, started_at)
+            return result
+
+        return None
 
-    def _decode_writen_value(self, writen_value):
+    def _read_writen_values(self, key_names, command_name):
         """
-        Decode a value received from database, restoring it status according to its original data type.
-        :param writen_value: Raw value received from database.
-        :return: The value converted to its original status.
+        Read raw values from the nearest available server. If the local cache is enabled, the keys remaining time
+        to live is read in the same request, so they don't stay in the local cache after expiring in the servers.
+        :param key_names: Names of the keys to read.
+        :param command_name: Command name, for the metrics.
+        :return: Lists with the raw values (None for keys not found or error) and the remaining times to live in
+                 milliseconds (None if not read), in the same order of key_names.
         """
-        if writen_value is None:
-            return None
+        if self.local_cache is None:
+            if len(key_names) == 1:
+                writen_values = [self._read_with_failover(lambda server: server.get(key_names[0]), command_name)]
+            else:
+                writen_values = self._read_with_failover(lambda server: server.mget(key_names), command_name)
 
-        decoded_value = writen_value.decode()
-        try:
-            parsed_value = json.loads(decoded_value)
-        except ValueError:
-            # This value was not added to cache in the expected json encoded format
-            return decoded_value
+            return writen_values or [None] * len(key_names), [None] * len(key_names)
+
+        def command(server):
+            pipeline = server.pipeline(transaction=False)
+            self._add_read_commands(pipeline, key_names)
+            return pipeline.execute()
 
-        return self._decode_writen_data(parsed_value.get('value'), parsed_value.get('type'))
+        return self._split_read_results(self._read_with_failover(command, command_name), key_names)
 
-    def read(self, key_name):
+    def read(self, key_name, default=None):
         """
         Read a value from the nearest cache server, restoring it data type to the original ones.
         :param key_name: Name of the key to read from server.
-        :return: The key value obtained from server, or null if error
+        :param default: Value returned if the key is not found, to tell it from keys whose value is None.
+        :return: The key value obtained from server, or default if not found or error
         """
-        value = None
+        value = self._read_from_local_cache(key_name)
+        if value is not _NOT_CACHED:
+            self._record_reads('local', 1)
+            self._record_accesses([key_name])
+            return value
+
+        (writen_value,), (ttl_milliseconds,) = self._read_writen_values([key_name], 'get')
+        self._record_reads('redis', int(writen_value is not None), int(writen_value is None))
+        if writen_value is None:
+            return default
 
-        if self.nearest_cache is not None:
-            value = self._decode_writen_value(self.nearest_cache.get(key_name))
+        self._record_accesses([key_name])
+
+        value = self._decode_writen_value(writen_value)
+        self._add_read_to_local_cache(key_name, value, writen_value, ttl_milliseconds)
 
         return value
 
+    def read_many(self, key_names, default=None):
+        """
+        Read many values from the nearest cache server in a single request (MGET), restoring their data types to
+        the original ones.
+        :param key_names: Names of the keys to read from server.
+        :param default: Value returned for keys not found, to tell them from keys whose value is None.
+        :return: List with the keys values, in the same order of key_names. Default for keys not found.
+        """
+        values = [self._read_from_local_cache(key_name) for key_name in key_names]
+        missing_indexes = [index for index, value in enumerate(values) if value is _NOT_CACHED]
+
+        self._record_reads('local', len(key_names) - len(missing_indexes))
+        for index in missing_indexes:
+            values[index] = default
+
+        if missing_indexes:
+            missing_key_names = [key_names[index] for index in missing_indexes]
+            writen_values, ttls_milliseconds = self._read_writen_values(missing_key_names, 'mget')
+
+            hits = sum(writen_value is not None for writen_value in writen_values)
+            self._record_reads('redis', hits, len(missing_key_names) - hits)
+
+            for index, key_name, writen_value, ttl_milliseconds in zip(missing_indexes, missing_key_names,
+                                                                       writen_values, ttls_milliseconds):
+                if writen_value is not None:
+                    values[index] = self._decode_writen_value(writen_value)
+                    self._add_read_to_local_cache(key_name, values[index], writen_value, ttl_milliseconds)
+
+        self._record_accesses([key_name for key_name, value in zip(key_names, values) if value is not default])
+        return values
+
+    def _execute_in_master(self, add_commands):
+        """
+        Execute commands in the master database in a single request. If the quota script isn't loaded in the master
+        (first write, failover or restart), load it and execute the commands again.
+        :param add_commands: Function that adds the commands to a pipeline.
+        :return: Results of the commands.
+        """
+        try:
+            pipeline = self.master.pipeline(transaction=False)
+            add_commands(pipeline)
+            return pipeline.execute()
+        except redis.exceptions.NoScriptError:
+            self.master.script_load(quotas.RECORD_WRITE_SCRIPT)
+
+        pipeline = self.master.pipeline(transaction=False)
+        add_commands(pipeline)
+        return pipeline.execute()
+
     def write(self, key_name, value, expiration_seconds=None):
         """
         Write a value in the master database to be replicated to all others.
@@ -242,26 +833,311 @@ class RedisCli:
         :param expiration_seconds: Time to expire this key in seconds.
         :return: True: key/value were written | False: error.
         """
+        object_to_write = None
+        evicted = []
+        self._discard_write_behind(key_name)
+
+        def add_commands(pipeline):
+            # Record its size and broadcast its invalidation in the same request
+            pipeline.set(key_name, object_to_write, ex=expiration_seconds)
+            quotas.add_write_commands(pipeline, self._client_id, {key_name: len(object_to_write)}, expiration_seconds)
+            invalidation.add_publish_command(pipeline, self._client_id, [key_name])
+
         if self.master is not None:
             try:
-                self.master.set(key_name, self._get_object_to_write(value), ex=expiration_seconds)
+                object_to_write = self._get_object_to_write(value)
+                started_at = time.perf_counter()
+                evicted = quotas.record_evictions(self._execute_in_master(add_commands))
+                self._record_command(self.master_address, 'set', started_at)
+            except redis.RedisError:
+                self._record_command(self.master_address, 'set', None, failed=True)
+                object_to_write = None
+            except serializers.SerializationError:
+                object_to_write = None
+
+        self._add_write_to_local_cache(key_name, object_to_write, expiration_seconds)
+        self._remove_evicted_from_local_cache(evicted)
+        return object_to_write is not None
+
+    def write_many(self, values, expiration_seconds=None):
+        """
+        Write many values in the master database in a single request (pipelined SET commands).
+        :param values: Dictionary with the values by key name.
+        :param expiration_seconds: Time to expire the keys in seconds.
+        :return: True: keys/values were written | False: error, or some values can't be serialized (the others
+                 are written).
+        """
+        objects_to_write = {}
+        evicted = []
+        written = False
+
+        def add_commands(pipeline):
+            for key_name, object_to_write in objects_to_write.items():
+                pipeline.set(key_name, object_to_write, ex=expiration_seconds)
+            quotas.add_write_commands(pipeline,
+                                      self._client_id,
+                                      {key_name: len(object_to_write)
+                                       for key_name, object_to_write in objects_to_write.items()},
+                                      expiration_seconds)
+            invalidation.add_publish_command(pipeline, self._client_id, objects_to_write)
+
+        if self.master is not None:
+            objects_to_write = self._get_objects_to_write(values)
+            try:
+                started_at = time.perf_counter()
+                evicted = quotas.record_evictions(self._execute_in_master(add_commands))
+                self._record_command(self.master_address, 'set_many', started_at)
+                written = True
+            except redis.RedisError:
+                self._record_command(self.master_address, 'set_many', None, failed=True)
+                objects_to_write = {}
+
+        for key_name in values:
+            self._add_write_to_local_cache(key_name, objects_to_write.get(key_name), expiration_seconds)
+        self._remove_evicted_from_local_cache(evicted)
+
+        return written and len(objects_to_write) == len(values)
+
+    def write_behind(self, key_name, value, expiration_seconds=None):
+        """
+        Queue a value to be written in the master database in background, in batches, so the caller doesn't wait
+        for the master (see WriteBehindConfig). Reads of this client return the value while it's queued.
+        :param key_name: Name of the key to be written.
+        :param value: Value.
+        :param expiration_seconds: Time to expire this key in seconds.
+        :return: True: key/value were queued | False: dropped, because the queue is full.
+        """
+        write_behind_queue = self._get_write_behind_queue()
+        queued = write_behind_queue.put(key_name, value, expiration_seconds)
+        write_behind_queue.start(self.write_many)
+        return queued
+
+    def flush_writes(self, timeout_seconds=None):
+        """
+        Wait for the values queued by write_behind to be written.
+        :param timeout_seconds: Maximum time to wait. If None, waits until they are written.
+        :return: True: all values written | False: timeout.
+        """
+        if self._write_behind_queue is None:
+            return True
+
+        return self._write_behind_queue.flush(timeout_seconds)
+
+    def _get_write_behind_queue(self):
+        """
+        Get the queue of the values written in background, creating it on the first write behind, so clients that
+        don't write behind never check it on their reads and writes.
+        :return: The write behind queue.
+        """
+        with self._write_behind_lock:
+            if self._write_behind_queue is None:
+                self._write_behind_queue = WriteBehindQueue(WriteBehindConfig.MAX_PENDING_WRITES,
+                                                            WriteBehindConfig.BATCH_SIZE,
+                                                            WriteBehindConfig.FLUSH_INTERVAL_SECONDS,
+                                                            WriteBehindConfig.OVERFLOW_POLICY,
+                                                            WriteBehindConfig.BLOCK_TIMEOUT_SECONDS,
+                                                            WriteBehindConfig.SHUTDOWN_TIMEOUT_SECONDS)
+
+        return self._write_behind_queue
+
+    def _discard_write_behind(self, key_name):
+        """
+        Discard the write behind of a key that is being written or deleted, so the older value doesn't override it.
+        :param key_name: Name of the key.
+        """
+        if self._write_behind_queue is not None:
+            self._write_behind_queue.discard(key_name)
+
+    def read_stream(self, key_name):
+        """
+        Read a value written in chunks (see create_stream_writer) from the nearest cache server. Only one chunk is
+        in memory at a time.
+        :param key_name: Name of the key to read from server.
+        :return: Iterator over the value chunks, or None if the key was not found or error. If a chunk is not in
+                 the server anymore, the iterator raises streams.IncompleteStreamError.
+        """
+        manifest_key = streams.get_manifest_key(key_name)
+        result = self._read_with_failover(lambda server: (server, server.get(manifest_key)))
+        if result is None or result[1] is None:
+            return None
+
+        server, writen_manifest = result
+        return self._iterate_stream(server, key_name, self._decode_writen_value(writen_manifest))
+
+    @staticmethod
+    def _iterate_stream(server, key_name, manifest):
+        """
+        Read the chunks of a value from the server where its manifest was read. The manifest is written after the
+        chunks, so a server that has the manifest has the chunks too.
+        :param server: Server connection.
+        :param key_name: Name of the key being read.
+        :param manifest: Value manifest.
+        :return: Iterator over the value chunks.
+        """
+        for index in range(manifest['chunks']):
+            chunk = server.get(streams.get_chunk_key(key_name, manifest['id'], index))
+            if chunk is None:
+                raise streams.IncompleteStreamError('Chunk {} of key {} is not in the cache'.format(index, key_name))
+            yield chunk
+
+    def create_stream_writer(self, key_name, expiration_seconds=None):
+        """
+        Create a writer to write a value in the master database in chunks, so it's never entirely in memory. The
+        value can be read with read_stream after the writer is closed.
+        :param key_name: Name of the key to be written.
+        :param expiration_seconds: Time to expire this key in seconds.
+        :return: The stream writer.
+        """
+        return streams.StreamWriter(self, key_name, expiration_seconds)
+
+    def touch(self, key_name, expiration_seconds):
+        """
+        Renew a key expiration time in the master database (sliding expiration). The slaves are read only, so
+        touches are coalesced and sent to the master in background, at most once per key per interval.
+        :param key_name: Key to be renewed.
+        :param expiration_seconds: New time to expire the key in seconds. If None, nothing is done.
+        """
+        if expiration_seconds is None:
+            return
+
+        self._touch_batcher.touch(key_name, expiration_seconds)
+        self._touch_batcher.start(self.expire_many)
+
+    def exists_many(self, key_names):
+        """
+        Check if many keys exist in the master database in a single request (pipelined EXISTS commands).
+        :param key_names: Names of the keys to check.
+        :return: List with True for each key that exists, in the same order of key_names, or None if error.
+        """
+        if self.master is not None:
+            try:
+                pipeline = self.master.pipeline(transaction=False)
+                for key_name in key_names:
+                    pipeline.exists(key_name)
+                started_at = time.perf_counter()
+                results = pipeline.execute()
+                self._record_command(self.master_address, 'exists_many', started_at)
+                return [bool(result) for result in results]
+            except redis.RedisError:
+                self._record_command(self.master_address, 'exists_many', None, failed=True)
+
+        return None
+
+    def expire_many(self, expirations):
+        """
+        Set many keys expiration time in the master database in a single request (pipelined EXPIRE commands).
+        Keys that don't exist anymore are ignored.
+        :param expirations: Dictionary with the expiration time in seconds by key name.
+        :return: True: expiration times were set | False: error.
+        """
+        if self.master is not None:
+            try:
+                pipeline = self.master.pipeline(transaction=False)
+                for key_name, expiration_seconds in expirations.items():
+                    pipeline.expire(key_name, expiration_seconds)
+                quotas.add_expire_commands(pipeline, expirations)
+                started_at = time.perf_counter()
+                pipeline.execute()
+                self._record_command(self.master_address, 'expire_many', started_at)
                 return True
             except redis.RedisError:
-                pass
+                self._record_command(self.master_address, 'expire_many', None, failed=True)
 
         return False
 
+    def _record_accesses(self, key_names):
+        """
+        Record the reads of keys in namespaces with quota, updating their ranks in the master in background.
+        :param key_names: Keys read.
+        """
+        if QuotaConfig.QUOTAS_BYTES and any([self._access_batcher.record_access(key_name) for key_name in key_names]):
+            self._access_batcher.start(self.rank_accesses)
+
+    def rank_accesses(self, accesses):
+        """
+        Update the ranks of keys read in namespaces with quota in the master database in a single request, so the
+        least recently or frequently used keys are evicted first (see QuotaConfig).
+        :param accesses: Dictionary with the number of reads by key name.
+        :return: True: ranks updated | False: error.
+        """
+        if self.master is not None:
+            try:
+                pipeline = self.master.pipeline(transaction=False)
+                quotas.add_access_commands(pipeline, accesses)
+                started_at = time.perf_counter()
+                pipeline.execute()
+                self._record_command(self.master_address, 'rank_accesses', started_at)
+                return True
+            except redis.RedisError:
+                self._record_command(self.master_address, 'rank_accesses', None, failed=True)
+
+        return False
+
+    def get_quota_usage(self):
+        """
+        Get the usage of the namespaces with quota, recorded in the master database by all clients.
+        :return: Dictionary with the quota, bytes used and number of keys by namespace, or None if error.
+        """
+        if self.master is not None:
+            try:
+                return quotas.get_usage(self._execute_in_master(quotas.add_usage_commands))
+            except redis.RedisError:
+                pass
+
+        return None
+
     def delete(self, key_name):
         """
         Delete a key from the master database.
         :param key_name: Key to be deleted.
         :return: True: key deleted | False: error.
         """
+        self._discard_write_behind(key_name)
+        if self.local_cache is not None:
+            self.local_cache.delete(key_name)
+
+        def add_commands(pipeline):
+            pipeline.delete(key_name)
+            quotas.add_delete_command(pipeline, key_name)
+            invalidation.add_publish_command(pipeline, self._client_id, [key_name])
+
         if self.master is not None:
+            started_at = time.perf_counter()
             try:
-                self.master.delete(key_name)
+                self._execute_in_master(add_commands)
+                self._record_command(self.master_address, 'delete', started_at)
                 return True
             except redis.RedisError:
-                pass
+                self._record_command(self.master_address, 'delete', None, failed=True)
 
         return False
+
+    def acquire_lock(self, key_name, timeout_seconds):
+        """
+        Try to acquire, without blocking, a lock for a key in the master database, shared by all clients.
+        :param key_name: Key to be locked.
+        :param timeout_seconds: Time to release the lock automatically, if its owner doesn't release it.
+        :return: The lock if acquired | None: lock owned by another client or error.
+        """
+        if self.master is not None:
+            try:
+                lock = self.master.lock('lock:{}'.format(key_name), timeout=timeout_seconds, thread_local=False)
+                if lock.acquire(blocking=False):
+                    return lock
+            except redis.RedisError:
+                pass
+
+        return None
+
+    @staticmethod
+    def release_lock(lock):
+        """
+        Release a lock acquired with acquire_lock.
+        :param lock: Lock to be released.
+        :return: True: lock released | False: error, like a lock already expired.
+        """
+        try:
+            lock.release()
+            return True
+        except redis.RedisError:
+            return False
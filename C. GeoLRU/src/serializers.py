@@ -0,0 +1,444 @@
+import base64
+import json
+import pickle
+import struct
+from src import compression
+from src.settings import CompressionConfig, SerializerConfig
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Serializers markers are written in the first byte of the values. They are UTF-8 continuation bytes, so they can't
+# be the first byte of values written by older versions (JSON envelopes) or plain texts written by other clients.
+BINARY_MARKER = 0xB1
+PICKLE_MARKER = 0xB2
+MSGPACK_MARKER = 0xB3
+COMPRESSED_MARKER = 0xB4
+
+# Type of the bytes that are not valid UTF-8 in json envelopes, written in base64
+JSON_BASE64_BYTES_TYPE = 'bytes_base64'
+
+
+class RawBytes(bytes):
+    """
+    Bytes with their own binary framing, like cache entries with expiration time (cache_entry.pack). They are
+    always written by the binary serializer, as they are, whatever the serializer configured, so serializers that
+    would have to encode them (json) are not used.
+    """
+
+
+class SerializationError(Exception):
+    """
+    Raised when a value can't be serialized, like values of types the serializer doesn't support, or when a value
+    read is not allowed to be deserialized, like pickled values when pickle is not allowed.
+    """
+
+
+class JsonSerializer:
+    """
+    Serialize values in a JSON envelope composed by two fields: the value itself and its type. It's the format
+    used by previous versions, so it can be used to write values that they will be able to read. Bytes that are
+    not valid UTF-8 are written in base64, with their own type, so they are not lost (previous versions read them
+    as the base64 string).
+    """
+
+    @staticmethod
+    def _prepare_data_to_write(data):
+        """
+        Prepara data to write in the server, according to each data type.
+        :param data: Data to be prepared
+        :return: The data prepared and its type.
+        """
+        if data is None:
+            return data, "none"
+
+        if isinstance(data, (bytes, bytearray)):
+            try:
+                return data.decode('utf8'), bytes.__name__
+            except UnicodeDecodeError:
+                return base64.b64encode(data).decode(), JSON_BASE64_BYTES_TYPE
+
+        return data, data.__class__.__name__
+
+    @staticmethod
+    def _decode_writen_data(data, data_type):
+        """
+        Decode data received from the server during a reding.
+        :param data: Data received from the server.
+        :param data_type: Original data type of this data before saving in the server.
+        :return:
+        """
+        # Check types that have to be treated in a special way
+        if data_type == 'none':
+            return None
+        if data_type == tuple.__name__:
+            return tuple(data)
+        if data_type == bytes.__name__:
+            return data.encode()
+        if data_type == JSON_BASE64_BYTES_TYPE:
+            return base64.b64decode(data)
+        if data_type == bytearray.__name__:
+            return bytearray(data, 'utf8')
+
+        return data
+
+    def dumps(self, value):
+        """
+        Serialize a value.
+        :param value: Value to be serialized.
+        :return: The value serialized.
+        """
+        encoded_data, type = self._prepare_data_to_write(value)
+        return json.dumps(dict(value=encoded_data, type=type)).encode()
+
+    def loads(self, writen_value):
+        """
+        Deserialize a value.
+        :param writen_value: Value serialized.
+        :return: The value converted to its original status.
+        """
+        decoded_value = bytes(writen_value).decode()
+        try:
+            parsed_value = json.loads(decoded_value)
+        except ValueError:
+            # This value was not added to cache in the expected json encoded format
+            return decoded_value
+
+        if not isinstance(parsed_value, dict):
+            return parsed_value
+
+        return self._decode_writen_data(parsed_value.get('value'), parsed_value.get('type'))
+
+
+class BinarySerializer:
+    """
+    Serialize values in a compact binary framing: the serializer marker, one byte with the value type tag and the
+    value payload. Bytes payloads are written as they are, without any encoding, and containers (lists, tuples and
+    dictionaries) have their items serialized recursively, each one prefixed by its type tag and length.
+    """
+    marker = BINARY_MARKER
+
+    _NONE = b'N'
+    _TRUE = b'T'
+    _FALSE = b'F'
+    _INT = b'i'
+    _FLOAT = b'f'
+    _STR = b's'
+    _BYTES = b'b'
+    _BYTEARRAY = b'a'
+    _LIST = b'l'
+    _TUPLE = b't'
+    _DICT = b'd'
+
+    _LENGTH = struct.Struct('>I')
+    _FLOAT_VALUE = struct.Struct('>d')
+
+    def dumps(self, value):
+        """
+        Serialize a value.
+        :param value: Value to be serialized.
+        :return: The value serialized.
+        """
+        tag, payload = self._encode(value)
+        return b''.join((bytes((self.marker,)), tag, payload))
+
+    def loads(self, writen_value):
+        """
+        Deserialize a value.
+        :param writen_value: Value serialized, including the serializer marker.
+        :return: The value converted to its original status.
+        """
+        writen_value = memoryview(writen_value)
+        return self._decode(writen_value[1:2].tobytes(), writen_value[2:])
+
+    def _encode(self, value):
+        """
+        Encode a value according to its type.
+        :param value: Value to be encoded.
+        :return: The value type tag and payload.
+        """
+        if value is None:
+            return self._NONE, b''
+        if value is True:
+            return self._TRUE, b''
+        if value is False:
+            return self._FALSE, b''
+        if isinstance(value, int):
+            return self._INT, str(value).encode()
+        if isinstance(value, float):
+            return self._FLOAT, self._FLOAT_VALUE.pack(value)
+        if isinstance(value, str):
+            return self._STR, value.encode()
+        if isinstance(value, bytes):
+            return self._BYTES, value
+        if isinstance(value, bytearray):
+            return self._BYTEARRAY, value
+        if isinstance(value, list):
+            return self._LIST, self._encode_items(value)
+        if isinstance(value, tuple):
+            return self._TUPLE, self._encode_items(value)
+        if isinstance(value, dict):
+            return self._DICT, self._encode_items(item for key_value in value.items() for item in key_value)
+
+        raise TypeError('Type {} is not supported by the binary serializer'.format(type(value).__name__))
+
+    def _encode_items(self, items):
+        """
+        Encode the items of a container, each one prefixed by its type tag and length.
+        :param items: Items to be encoded.
+        :return: The items payload.
+        """
+        parts = []
+        for item in items:
+            tag, payload = self._encode(item)
+            parts.extend((tag, self._LENGTH.pack(len(payload)), payload))
+
+        return b''.join(parts)
+
+    def _decode(self, tag, payload):
+        """
+        Decode a value according to its type tag.
+        :param tag: Value type tag.
+        :param payload: Value payload.
+        :return: The value converted to its original status.
+        """
+        if tag == self._NONE:
+            return None
+        if tag == self._TRUE:
+            return True
+        if tag == self._FALSE:
+            return False
+        if tag == self._INT:
+            return int(bytes(payload))
+        if tag == self._FLOAT:
+            return self._FLOAT_VALUE.unpack(payload)[0]
+        if tag == self._STR:
+            return str(payload, 'utf8')
+        if tag == self._BYTES:
+            return payload.tobytes()
+        if tag == self._BYTEARRAY:
+            return bytearray(payload)
+        if tag == self._LIST:
+            return list(self._decode_items(payload))
+        if tag == self._TUPLE:
+            return tuple(self._decode_items(payload))
+        if tag == self._DICT:
+            items = self._decode_items(payload)
+            return dict(zip(items, items))
+
+        raise ValueError('Unknown binary serializer type tag {!r}'.format(tag))
+
+    def _decode_items(self, payload):
+        """
+        Decode the items of a container.
+        :param payload: Container payload.
+        :return: Iterator over the container items.
+        """
+        offset = 0
+        while offset < len(payload):
+            tag = payload[offset:offset + 1].tobytes()
+            length, = self._LENGTH.unpack_from(payload, offset + 1)
+            offset += 1 + self._LENGTH.size
+            yield self._decode(tag, payload[offset:offset + length])
+            offset += length
+
+
+class PickleSerializer:
+    """
+    Serialize values with pickle protocol 5, supporting any picklable type. Reading a pickled value can execute
+    arbitrary code, so use it only if all clients writing in the redis servers are trusted. Pickled values are read
+    only if pickle is the serializer configured or if it's explicitly allowed (see SerializerConfig).
+    """
+    marker = PICKLE_MARKER
+
+    def dumps(self, value):
+        """
+        Serialize a value.
+        :param value: Value to be serialized.
+        :return: The value serialized.
+        """
+        return bytes((self.marker,)) + pickle.dumps(value, protocol=5)
+
+    def loads(self, writen_value):
+        """
+        Deserialize a value.
+        :param writen_value: Value serialized, including the serializer marker.
+        :return: The value converted to its original status.
+        :raise SerializationError: If pickle is not allowed.
+        """
+        if SerializerConfig.SERIALIZER != 'pickle' and not SerializerConfig.ALLOW_PICKLE:
+            raise SerializationError('Pickled values are not allowed, see SerializerConfig.ALLOW_PICKLE')
+
+        return pickle.loads(memoryview(writen_value)[1:])
+
+
+class MsgpackSerializer:
+    """
+    Serialize values with msgpack (https://msgpack.org/). It requires the msgpack package. Bytearrays are read as
+    bytes, as msgpack packs both types in the same way.
+    """
+    marker = MSGPACK_MARKER
+
+    # msgpack extension types used to keep the python types that msgpack doesn't distinguish
+    _TUPLE_EXT_TYPE = 1
+    _BIG_INT_EXT_TYPE = 2
+
+    def __init__(self):
+        assert msgpack is not None, 'The msgpack serializer requires the msgpack package'
+
+    def dumps(self, value):
+        """
+        Serialize a value.
+        :param value: Value to be serialized.
+        :return: The value serialized.
+        """
+        return bytes((self.marker,)) + self._pack(value)
+
+    def loads(self, writen_value):
+        """
+        Deserialize a value.
+        :param writen_value: Value serialized, including the serializer marker.
+        :return: The value converted to its original status.
+        """
+        return self._unpack(memoryview(writen_value)[1:])
+
+    def _pack(self, value):
+        """
+        Pack a value with msgpack, without the serializer marker.
+        """
+        return msgpack.packb(value, default=self._default, strict_types=True)
+
+    def _unpack(self, data):
+        """
+        Unpack a value packed by _pack.
+        """
+        return msgpack.unpackb(data, ext_hook=self._ext_hook, strict_map_key=False)
+
+    def _default(self, value):
+        """
+        Convert the types not supported by msgpack to extension types.
+        """
+        if isinstance(value, tuple):
+            return msgpack.ExtType(self._TUPLE_EXT_TYPE, self._pack(list(value)))
+        if isinstance(value, int):
+            # Integers bigger than 64 bits
+            return msgpack.ExtType(self._BIG_INT_EXT_TYPE, str(value).encode())
+
+        raise TypeError('Type {} is not supported by the msgpack serializer'.format(type(value).__name__))
+
+    def _ext_hook(self, code, data):
+        """
+        Convert the extension types back to their original types.
+        """
+        if code == self._TUPLE_EXT_TYPE:
+            return tuple(self._unpack(data))
+        if code == self._BIG_INT_EXT_TYPE:
+            return int(data)
+
+        return msgpack.ExtType(code, data)
+
+
+class CompressedSerializer:
+    """
+    Wrap a serializer, compressing the values bigger than a minimum size. Compressed values are written with the
+    compressed marker, the compressor id and the value serialized and compressed.
+    """
+    marker = COMPRESSED_MARKER
+
+    def __init__(self, serializer, compressor, min_size_bytes=1024):
+        """
+        Create an instance of compressed serializer.
+        :param serializer: Serializer used before the compression.
+        :param compressor: Compressor (compression.get_compressor).
+        :param min_size_bytes: Serialized values smaller than this size are not compressed.
+        """
+        self.serializer = serializer
+        self.compressor = compressor
+        self.min_size_bytes = min_size_bytes
+
+    def dumps(self, value):
+        """
+        Serialize a value, compressing it if it's big enough.
+        :param value: Value to be serialized.
+        :return: The value serialized.
+        """
+        serialized_value = self.serializer.dumps(value)
+        if len(serialized_value) < self.min_size_bytes:
+            return serialized_value
+
+        compressed_value = self.compressor.compress(serialized_value)
+        if len(compressed_value) + 2 >= len(serialized_value):
+            # Not compressible, like already compressed images
+            return serialized_value
+
+        return b''.join((bytes((self.marker, self.compressor.id)), compressed_value))
+
+    def loads(self, writen_value):
+        """
+        Deserialize a value.
+        :param writen_value: Value serialized, compressed or not.
+        :return: The value converted to its original status.
+        """
+        return loads(writen_value)
+
+
+SERIALIZERS = {
+    'json': JsonSerializer,
+    'binary': BinarySerializer,
+    'pickle': PickleSerializer,
+    'msgpack': MsgpackSerializer,
+}
+
+_SERIALIZERS_BY_MARKER = {serializer.marker: serializer for serializer in SERIALIZERS.values()
+                          if hasattr(serializer, 'marker')}
+
+_json_serializer = JsonSerializer()
+
+
+def get_serializer(name):
+    """
+    Create a serializer by its name.
+    :param name: Serializer name: json, binary, pickle or msgpack.
+    :return: A new serializer.
+    """
+    assert name in SERIALIZERS, 'Serializer must be one of: {}'.format(', '.join(SERIALIZERS))
+    return SERIALIZERS[name]()
+
+
+def create_serializer(name=None):
+    """
+    Create a serializer according to the settings.
+    :param name: Serializer name. If None, the one configured in "SerializerConfig.SERIALIZER" is used.
+    :return: The serializer, wrapped by a compressed serializer if compression is enabled.
+    """
+    serializer = get_serializer(name or SerializerConfig.SERIALIZER)
+
+    if CompressionConfig.COMPRESSOR is not None:
+        serializer = CompressedSerializer(serializer,
+                                          compression.get_compressor(CompressionConfig.COMPRESSOR),
+                                          CompressionConfig.MIN_SIZE_BYTES)
+
+    return serializer
+
+
+def loads(writen_value):
+    """
+    Deserialize a value written by any serializer, compressed or not, identifying it by the value first byte.
+    :param writen_value: Value serialized.
+    :return: The value converted to its original status.
+    :raise SerializationError: If the value was pickled and pickle is not allowed.
+    """
+    marker = writen_value[0] if writen_value else None
+
+    if marker == COMPRESSED_MARKER:
+        writen_value = memoryview(writen_value)
+        return loads(compression.decompress(writen_value[1], writen_value[2:]))
+
+    serializer = _SERIALIZERS_BY_MARKER.get(marker)
+    if serializer is None:
+        # Values written by previous versions, in json envelopes, or by other clients
+        return _json_serializer.loads(writen_value)
+
+    return serializer().loads(writen_value)
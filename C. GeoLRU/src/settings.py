@@ -1,3 +1,5 @@
+import os
+
 # IP info service token (https://ipinfo.io/)
 IP_INFO_TOKEN = None
 
@@ -16,3 +18,255 @@ class RedisConfig:
 
     # Sentinel socket timeout
     SENTINEL_SOCKET_TIMEOUT = 1.0
+
+    # Static coordinates (latitude, longitude) of this client, used instead of its IP location
+    MY_LOCATION = None
+
+    # Static coordinates (latitude, longitude) of the redis servers by IP, used instead of their IP locations
+    SERVERS_LOCATIONS = {}
+
+
+class LocalCacheConfig:
+    # Keep the most read keys in process memory, in front of the redis servers
+    ENABLED = False
+
+    # Maximum number of keys kept in memory
+    MAX_ITEMS = 1024
+
+    # Maximum size in bytes of the values kept in memory
+    MAX_BYTES = 64 * 1024 * 1024
+
+    # Expiration of keys loaded from the redis servers. Keys expiring before in the servers expire with them.
+    EXPIRATION_SECONDS = 60
+
+
+class RequestCoalescingConfig:
+    # Besides deduplicating requests inside the process, use a lock in the master server to deduplicate the
+    # requests among all clients
+    DISTRIBUTED_LOCK_ENABLED = False
+
+    # Time to release the lock automatically, if its owner doesn't release it
+    LOCK_TIMEOUT_SECONDS = 10
+
+    # Time to wait for the lock owner to add the key to the cache, before requesting it anyway
+    LOCK_WAIT_SECONDS = 5
+
+    # Interval between cache reads while waiting for the lock owner
+    LOCK_POLL_INTERVAL_SECONDS = 0.05
+
+
+class SerializerConfig:
+    # Serializer used to write values: "binary", "json" (format used by previous versions), "pickle" (only if all
+    # clients writing in the redis servers are trusted) or "msgpack" (requires the msgpack package). Values written
+    # by any serializer can be read, whatever the serializer configured, except pickled values (see ALLOW_PICKLE).
+    SERIALIZER = 'binary'
+
+    # Read pickled values even if the serializer configured is not "pickle", e.g. while migrating from it. Reading a
+    # pickled value can execute arbitrary code, so when it's not allowed, they are rejected and anyone who can write
+    # in the redis servers can't run code in the clients reading.
+    ALLOW_PICKLE = False
+
+
+class CompressionConfig:
+    # Compressor used for values bigger than MIN_SIZE_BYTES: None (disabled), "zlib", "lz4" (requires the lz4
+    # package) or "zstd" (requires the zstandard package). Compressed values are read whatever the compressor
+    # configured.
+    COMPRESSOR = None
+
+    # Values smaller than this size are not compressed
+    MIN_SIZE_BYTES = 1024
+
+
+class TopologyConfig:
+    # Interval to discover the master and slaves again, measuring the slaves round trip time to choose the nearest
+    # one. None: the topology is loaded only once, choosing the nearest slave by its geographical distance.
+    REFRESH_INTERVAL_SECONDS = None
+
+
+class FailoverConfig:
+    # Redis servers socket timeouts, so a server down costs a fast failure
+    SERVER_SOCKET_TIMEOUT = 0.5
+    SERVER_SOCKET_CONNECT_TIMEOUT = 0.5
+
+    # Master socket timeout. The writes are sent to the master and may be much bigger than the reads (e.g. stream
+    # chunks), so its connections have their own timeout, and their own connection pool.
+    MASTER_SOCKET_TIMEOUT = 5.0
+
+    # Number of consecutive failures to stop reading from a server, trying the next nearest one
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD = 1
+
+    # Time to wait before trying to read from a failing server again
+    CIRCUIT_BREAKER_RESET_TIMEOUT_SECONDS = 10
+
+
+class LocationCacheConfig:
+    # File where the IP locations are persisted, so the IP location service is not called on every startup.
+    # None: disabled.
+    FILE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'geo_lru', 'locations.json')
+
+    # Time to request a location to the IP location service again
+    EXPIRATION_SECONDS = 7 * 24 * 60 * 60
+
+
+class ConnectionPoolConfig:
+    # Maximum number of connections to each redis server, shared by all clients in the process
+    MAX_CONNECTIONS = 50
+
+    # Time to wait for a free connection when all of them are in use
+    TIMEOUT_SECONDS = 1.0
+
+    # Interval to check if an idle connection is still alive before using it
+    HEALTH_CHECK_INTERVAL_SECONDS = 30
+
+
+class SlidingExpirationConfig:
+    # Renew the keys expiration time when they are read from the cache by LruClient, so frequently requested keys
+    # don't expire. Disabled by default: the keys expire cache_expiration seconds after being written, however
+    # often they are read.
+    ENABLED = False
+
+    # Interval between renewals. However many times a key is read in an interval, it's renewed only once.
+    TOUCH_INTERVAL_SECONDS = 1.0
+
+
+class StaleConfig:
+    # Time after a key expiration during which LruClient still returns its stale value, while it's requested again
+    # in background. None: disabled.
+    STALE_WHILE_REVALIDATE_SECONDS = None
+
+    # Time after a key expiration during which LruClient returns its stale value if the request fails. None: disabled.
+    STALE_IF_ERROR_SECONDS = None
+
+    # Maximum number of requests executed in background at the same time
+    REVALIDATE_WORKERS = 4
+
+
+class HttpCacheConfig:
+    # Honor the HTTP caching headers of the responses in LruClient: the keys expire according to their
+    # Cache-Control or Expires headers (the request cache_expiration is used only if there are none of them) and
+    # expired keys with ETag or Last-Modified are revalidated with conditional requests.
+    ENABLED = False
+
+    # Request headers whose values are part of the cache keys, together with the method and the body. Responses that
+    # vary (Vary header) on other request headers sent are not cached.
+    VARY_HEADERS = ()
+
+    # Time to keep expired keys with ETag or Last-Modified in the cache, so they can be revalidated
+    REVALIDATION_SECONDS = 24 * 60 * 60
+
+
+class StreamConfig:
+    # Size of the chunks in which streamed values are read from the origin and written in the cache
+    CHUNK_SIZE_BYTES = 1024 * 1024
+
+    # Time to expire the chunks of a value while it's being written. If the writing is interrupted, they expire.
+    PENDING_EXPIRATION_SECONDS = 10 * 60
+
+    # Time to keep the chunks of a value after it's replaced or expires, so readers that already started to read it
+    # can finish
+    GRACE_SECONDS = 60
+
+
+class MetricsConfig:
+    # Record counters and latency histograms of the cache operations (see src/metrics.py)
+    ENABLED = True
+
+    # Upper bounds of the latency histograms buckets, in seconds
+    HISTOGRAM_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class NegativeCacheConfig:
+    # Time to cache the origin client errors (HTTP status 4xx) in LruClient, so the same error is raised again
+    # without requesting the origin. None: disabled.
+    CLIENT_ERROR_EXPIRATION_SECONDS = None
+
+    # Time to cache the origin server errors (HTTP status 5xx). None: disabled.
+    SERVER_ERROR_EXPIRATION_SECONDS = None
+
+
+class WriteBehindConfig:
+    # Write the results of LruClient requests in the master in background, in batches, instead of during the
+    # requests. Queued values are returned by the reads of the same process until they are written.
+    ENABLED = False
+
+    # Maximum number of writes waiting in the queue
+    MAX_PENDING_WRITES = 10000
+
+    # Maximum number of writes sent to the master in a single request
+    BATCH_SIZE = 100
+
+    # Time to wait for a full batch before sending the writes queued
+    FLUSH_INTERVAL_SECONDS = 0.05
+
+    # What to do when the queue is full: "block" waits up to BLOCK_TIMEOUT_SECONDS for space and then drops the
+    # new write, "drop_newest" drops the new write and "drop_oldest" drops the oldest write queued
+    OVERFLOW_POLICY = 'drop_oldest'
+    BLOCK_TIMEOUT_SECONDS = 1.0
+
+    # Time to wait for the writes queued to be sent when the process exits
+    SHUTDOWN_TIMEOUT_SECONDS = 5.0
+
+
+class KeyConfig:
+    # Prefix added to the cache keys, e.g. "api" for keys like "api:<URL>", so many applications can share the
+    # same servers. If None, the keys are not prefixed.
+    NAMESPACE = None
+
+    # Normalize the URLs before using them as keys, so equivalent URLs share the same key: scheme and host in lower
+    # case, query parameters sorted by name and fragment removed
+    NORMALIZE_URLS = False
+
+    # hashlib algorithm used to replace the keys by their fixed length digest (e.g. "sha256"), so long URLs don't
+    # use memory and replication traffic in all servers. If None, the keys are not hashed.
+    DIGEST = None
+
+    # Write the original URL of each key in key "url:<key>", with the same expiration time, for debugging
+    STORE_ORIGINAL_URL = False
+
+
+class QuotaConfig:
+    # Maximum bytes used by the keys of each namespace in the redis servers, e.g. {'api': 64 * 1024 * 1024}. The
+    # namespace of a key is its prefix before ":" (see KeyConfig.NAMESPACE and LruClient namespace). Keys of other
+    # namespaces have no quota.
+    QUOTAS_BYTES = {}
+
+    # Keys evicted first when a namespace exceeds its quota: "lru" (least recently used) or "lfu" (least
+    # frequently used)
+    EVICTION_POLICY = 'lru'
+
+    # Interval between the updates of the keys ranks with their reads, sent to the master in background
+    ACCESS_FLUSH_INTERVAL_SECONDS = 1.0
+
+
+class InvalidationConfig:
+    # Broadcast the keys written or deleted to all clients through redis pub/sub, so they remove them from their
+    # local caches. Use it with LocalCacheConfig, to keep the local caches consistent with the redis servers.
+    ENABLED = False
+
+    # Pub/sub channel of the invalidations
+    CHANNEL = 'geo_lru:invalidations'
+
+    # Time to wait before subscribing again after a connection error. The local cache is cleared when subscribing,
+    # since invalidations may have been lost.
+    RETRY_INTERVAL_SECONDS = 1.0
+
+
+class OriginConfig:
+    # Connections with the origin servers are kept alive and reused by the requests. Maximum number of hosts whose
+    # connections are kept, and maximum number of connections with each host: more concurrent requests to the same
+    # host wait for a free connection.
+    MAX_HOSTS = 50
+    MAX_CONNECTIONS_PER_HOST = 10
+
+    # Timeouts of the origin requests
+    CONNECT_TIMEOUT_SECONDS = 2.0
+    READ_TIMEOUT_SECONDS = 10.0
+
+    # Retries of idempotent requests that fail to connect, time out or answer 502, 503 or 504, waiting
+    # BACKOFF_FACTOR * 2 ** (retry - 1) seconds between them
+    RETRIES = 2
+    BACKOFF_FACTOR = 0.1
+
+    # Number of threads executing requests concurrently, in LruClient.prefetch and for the misses of
+    # LruClient.request_with_cache_many
+    PREFETCH_WORKERS = 8
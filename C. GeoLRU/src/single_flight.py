@@ -0,0 +1,104 @@
+import asyncio
+import threading
+
+
+class _Call:
+    """
+    Represents a function call in progress, shared by all threads requesting the same key.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+
+
+class SingleFlight:
+    """
+    Deduplicate concurrent calls by key: only one call per key is executed at a time and the other callers
+    wait for its result.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key_name, function, *args, **kwargs):
+        """
+        Execute a function, unless there is already a call in progress for the same key. In this case, wait for
+        the call in progress and return its result (or raise its exception).
+        :param key_name: Key used to deduplicate calls.
+        :param function: Function to be executed.
+        :param args: Function positional arguments.
+        :param kwargs: Function keyword arguments.
+        :return: The function result.
+        """
+        with self._lock:
+            call = self._calls.get(key_name)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self._calls[key_name] = call
+
+        if not is_leader:
+            call.done.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+
+        try:
+            call.result = function(*args, **kwargs)
+            return call.result
+        except BaseException as exception:
+            call.exception = exception
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key_name]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """
+    Asyncio version of SingleFlight: only one coroutine per key is awaited at a time and the other callers
+    wait for its result.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key_name, function, *args, **kwargs):
+        """
+        Await a coroutine function, unless there is already a call in progress for the same key. In this case,
+        wait for the call in progress and return its result (or raise its exception).
+        :param key_name: Key used to deduplicate calls.
+        :param function: Coroutine function to be awaited.
+        :param args: Function positional arguments.
+        :param kwargs: Function keyword arguments.
+        :return: The function result.
+        """
+        loop = asyncio.get_running_loop()
+        # Futures can't be shared among event loops
+        call_key = (loop, key_name)
+
+        call = self._calls.get(call_key)
+        if call is not None:
+            return await asyncio.shield(call)
+
+        call = loop.create_future()
+        self._calls[call_key] = call
+
+        try:
+            result = await function(*args, **kwargs)
+            call.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            call.cancel()
+            raise
+        except BaseException as exception:
+            call.set_exception(exception)
+            # Mark the exception as retrieved, even if nobody else is waiting for this call
+            call.exception()
+            raise
+        finally:
+            del self._calls[call_key]
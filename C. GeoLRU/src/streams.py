@@ -0,0 +1,161 @@
+import uuid
+import redis
+from src.settings import StreamConfig
+
+
+class IncompleteStreamError(Exception):
+    """
+    Raised when a chunk of a value being read is not in the cache anymore.
+    """
+
+
+def get_manifest_key(key_name):
+    """
+    Get the key of a streamed value manifest: its id and number of chunks.
+    :param key_name: Name of the streamed value key.
+    :return: The manifest key name.
+    """
+    return 'stream:{}'.format(key_name)
+
+
+def get_chunk_key(key_name, stream_id, index):
+    """
+    Get the key of a streamed value chunk. Each writing has its own id, so writing a value again doesn't affect
+    readers of the previous one.
+    :param key_name: Name of the streamed value key.
+    :param stream_id: Id of the writing.
+    :param index: Chunk index.
+    :return: The chunk key name.
+    """
+    return 'stream:{}:{}:{}'.format(key_name, stream_id, index)
+
+
+def get_chunks_expiration(expiration_seconds):
+    """
+    Get the time to expire the chunks of a value, a bit after its manifest so readers can finish reading it.
+    :param expiration_seconds: Time to expire the value in seconds, or None if it never expires.
+    :return: Time to expire its chunks in seconds, or None if they never expire.
+    """
+    if expiration_seconds is None:
+        return None
+
+    return expiration_seconds + StreamConfig.GRACE_SECONDS
+
+
+class StreamWriter:
+    """
+    Write a value in the master database in chunks, each one in its own key, so it's never entirely in memory.
+    The value can be read only after the writer is closed, when its manifest is written.
+    """
+
+    def __init__(self, redis_client, key_name, expiration_seconds=None):
+        """
+        Create an instance of stream writer.
+        :param redis_client: Redis client connected to the master.
+        :param key_name: Name of the key to be written.
+        :param expiration_seconds: Time to expire this key in seconds.
+        """
+        self.redis_client = redis_client
+        self.key_name = key_name
+        self.expiration_seconds = expiration_seconds
+        self.stream_id = uuid.uuid4().hex
+        self.chunks = 0
+        self.size = 0
+        self.failed = redis_client.master is None
+
+    def write(self, chunk):
+        """
+        Write a chunk. If the writing fails, the next chunks are ignored and the value is not written.
+        :param chunk: Chunk bytes.
+        """
+        if self.failed or not chunk:
+            return
+
+        try:
+            self.redis_client.master.set(get_chunk_key(self.key_name, self.stream_id, self.chunks), chunk,
+                                         ex=StreamConfig.PENDING_EXPIRATION_SECONDS)
+            self.chunks += 1
+            self.size += len(chunk)
+        except redis.RedisError:
+            self.failed = True
+
+    def close(self):
+        """
+        Finish the writing, writing the value manifest. The chunks of the value replaced expire after a while.
+        :return: True: value written | False: error.
+        """
+        if self.failed:
+            return False
+
+        try:
+            writen_manifest = self.redis_client.master.get(get_manifest_key(self.key_name))
+            pipeline = self.redis_client.master.pipeline(transaction=False)
+            self._add_close_commands(pipeline, self.redis_client._decode_writen_value(writen_manifest))
+            pipeline.execute()
+            return True
+        except redis.RedisError:
+            return False
+
+    def _add_close_commands(self, pipeline, replaced_manifest):
+        """
+        Add the commands to finish the writing to a pipeline: set the chunks expiration time, write the manifest and
+        expire the chunks of the value replaced.
+        :param pipeline: Pipeline of the master connection.
+        :param replaced_manifest: Manifest of the value replaced, or None if there is no value.
+        """
+        chunks_expiration = get_chunks_expiration(self.expiration_seconds)
+
+        for index in range(self.chunks):
+            chunk_key = get_chunk_key(self.key_name, self.stream_id, index)
+            if chunks_expiration is None:
+                pipeline.persist(chunk_key)
+            else:
+                pipeline.expire(chunk_key, chunks_expiration)
+
+        manifest = dict(id=self.stream_id, chunks=self.chunks, size=self.size)
+        pipeline.set(get_manifest_key(self.key_name), self.redis_client._get_object_to_write(manifest),
+                     ex=self.expiration_seconds)
+
+        if replaced_manifest:
+            for index in range(replaced_manifest['chunks']):
+                pipeline.expire(get_chunk_key(self.key_name, replaced_manifest['id'], index),
+                                StreamConfig.GRACE_SECONDS)
+
+
+class AsyncStreamWriter(StreamWriter):
+    """
+    Asyncio version of StreamWriter.
+    """
+
+    async def write(self, chunk):
+        """
+        Write a chunk. If the writing fails, the next chunks are ignored and the value is not written.
+        :param chunk: Chunk bytes.
+        """
+        if self.failed or not chunk:
+            return
+
+        try:
+            await self.redis_client.master.set(get_chunk_key(self.key_name, self.stream_id, self.chunks), chunk,
+                                               ex=StreamConfig.PENDING_EXPIRATION_SECONDS)
+            self.chunks += 1
+            self.size += len(chunk)
+        except redis.RedisError:
+            self.failed = True
+
+    async def close(self):
+        """
+        Finish the writing, writing the value manifest. The chunks of the value replaced expire after a while.
+        :return: True: value written | False: error.
+        """
+        if self.failed:
+            return False
+
+        try:
+            writen_manifest = await self.redis_client.master.get(get_manifest_key(self.key_name))
+            pipeline = self.redis_client.master.pipeline(transaction=False)
+            self._add_close_commands(pipeline, self.redis_client._decode_writen_value(writen_manifest))
+            await pipeline.execute()
+            return True
+        except redis.RedisError:
+            return False
@@ -0,0 +1,76 @@
+import threading
+import time
+import weakref
+
+
+class TouchBatcher:
+    """
+    Coalesce keys expiration renewals ("touches"), so however many times a key is read during an interval, its
+    expiration is renewed only once, and all keys touched in the interval are renewed together.
+    """
+
+    def __init__(self, interval_seconds=1.0):
+        """
+        Create an instance of touch batcher.
+        :param interval_seconds: Interval between renewals.
+        """
+        self.interval_seconds = interval_seconds
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def touch(self, key_name, expiration_seconds):
+        """
+        Add a key to be renewed in the next renewal.
+        :param key_name: Key to renew.
+        :param expiration_seconds: New time to expire the key in seconds.
+        """
+        with self._lock:
+            self._pending[key_name] = expiration_seconds
+
+    def pop_pending(self):
+        """
+        Get and clear the keys waiting for renewal.
+        :return: Dictionary with the new expiration in seconds by key name.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        return pending
+
+    def start(self, expire_many):
+        """
+        Start renewing the pending keys periodically in a background thread, if not started yet.
+        :param expire_many: Method that receives the pending keys and renews them. The thread keeps only a weak
+                            reference to it, so it doesn't prevent its object from being garbage collected.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            self._thread = threading.Thread(target=self._renew_periodically,
+                                            args=(weakref.WeakMethod(expire_many),),
+                                            name='geo-lru-touch-batcher',
+                                            daemon=True)
+            self._thread.start()
+
+    def _renew_periodically(self, expire_many_reference):
+        """
+        Renew the pending keys until the renewal method is garbage collected.
+        :param expire_many_reference: Weak reference to the renewal method.
+        """
+        while True:
+            time.sleep(self.interval_seconds)
+            expire_many = expire_many_reference()
+            if expire_many is None:
+                return
+
+            pending = self.pop_pending()
+            if pending:
+                try:
+                    expire_many(pending)
+                except Exception:
+                    # Touches are best effort, the keys will be touched again on their next reads
+                    pass
+
+            del expire_many
@@ -0,0 +1,131 @@
+import itertools
+import time
+import begin
+from concurrent.futures import ThreadPoolExecutor
+from src import keys
+from src.geo_lru import LruClient
+
+
+def read_manifest(file_path):
+    """
+    Read a warming manifest: a text file with one URL per line, optionally followed by its cache expiration in
+    seconds. Empty lines and lines starting with "#" are ignored.
+    :param file_path: Path of the manifest file.
+    :return: Iterator over the (URL, cache expiration) pairs. The expiration is None if not given.
+    """
+    with open(file_path) as manifest_file:
+        for line in manifest_file:
+            fields = line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+
+            yield fields[0], int(fields[1]) if len(fields) > 1 else None
+
+
+class WarmingProgress:
+    """
+    Progress of a cache warming.
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.urls = 0
+        self.skipped = 0
+        self.warmed = 0
+        self.failed = 0
+
+    @property
+    def elapsed_seconds(self):
+        """
+        Time since the warming started.
+        """
+        return time.monotonic() - self.started_at
+
+    @property
+    def throughput(self):
+        """
+        URLs processed (requested or skipped) per second.
+        """
+        return self.urls / max(self.elapsed_seconds, 1e-9)
+
+    def __str__(self):
+        return '{} URLs: {} warmed, {} already cached, {} failed in {:.1f}s ({:.1f} URLs/s)'.format(
+            self.urls, self.warmed, self.skipped, self.failed, self.elapsed_seconds, self.throughput)
+
+
+class CacheWarmer:
+    """
+    Preload the cache with the responses of a list of URLs, e.g. after a deploy or when a new replica comes online,
+    so the first requests don't wait for the origin.
+    """
+
+    def __init__(self, lru_client=None, workers=8, batch_size=100):
+        """
+        Create an instance of cache warmer.
+        :param lru_client: Client used to request the URLs. If None, a new one is created.
+        :param workers: Maximum number of concurrent requests.
+        :param batch_size: Number of URLs checked in the cache in a single request before requesting the missing
+                           ones.
+        """
+        assert workers > 0, 'Workers must be greater than zero'
+        assert batch_size > 0, 'Batch size must be greater than zero'
+
+        self.lru_client = lru_client or LruClient()
+        self.workers = workers
+        self.batch_size = batch_size
+
+    def warm(self, manifest, progress_callback=None):
+        """
+        Request the URLs missing in the cache, adding them to it. The URLs already in the cache are not requested.
+        :param manifest: Iterable of URLs or of (URL, cache expiration) pairs, e.g. from read_manifest.
+        :param progress_callback: Function called with the progress (WarmingProgress) after each batch.
+        :return: The final progress.
+        """
+        progress = WarmingProgress()
+        entries = (entry if isinstance(entry, tuple) else (entry, None) for entry in manifest)
+
+        with ThreadPoolExecutor(self.workers, thread_name_prefix='geo-lru-warmer') as executor:
+            for batch in iter(lambda: list(itertools.islice(entries, self.batch_size)), []):
+                self._warm_batch(executor, batch, progress)
+                if progress_callback is not None:
+                    progress_callback(progress)
+
+        # Values written in background must reach the cache before the warming ends
+        self.lru_client.flush_writes()
+        return progress
+
+    def _warm_batch(self, executor, batch, progress):
+        """
+        Request the URLs of a batch missing in the cache.
+        :param executor: Executor of the requests.
+        :param batch: List of (URL, cache expiration) pairs.
+        :param progress: Progress updated with the batch results.
+        """
+        key_names = [keys.get_cache_key(url, namespace=self.lru_client.namespace) for url, _ in batch]
+
+        # If the master can't be checked, all URLs are requested
+        exists = self.lru_client.redis_client.exists_many(key_names) or [False] * len(batch)
+
+        missing = [entry for entry, key_exists in zip(batch, exists) if not key_exists]
+        futures = [executor.submit(self.lru_client.request_with_cache, url, cache_expiration=cache_expiration)
+                   for url, cache_expiration in missing]
+
+        progress.urls += len(batch)
+        progress.skipped += len(batch) - len(missing)
+
+        for future in futures:
+            try:
+                future.result()
+                progress.warmed += 1
+            except (OSError, ValueError):
+                progress.failed += 1
+
+
+@begin.start(auto_convert=True)
+def main(manifest: 'File with one URL per line, optionally followed by its expiration',
+         workers: 'Maximum number of concurrent requests' = 8,
+         batch_size: 'Number of URLs checked in the cache at once' = 100,
+         namespace: 'Namespace of the cache keys' = ''):
+    """ Preload the cache with the responses of the URLs of a manifest, printing the progress """
+    cache_warmer = CacheWarmer(LruClient(namespace or None), workers, batch_size)
+    cache_warmer.warm(read_manifest(manifest), print)
@@ -0,0 +1,209 @@
+import atexit
+import threading
+import weakref
+from collections import OrderedDict
+from src import metrics
+
+BLOCK = 'block'
+DROP_NEWEST = 'drop_newest'
+DROP_OLDEST = 'drop_oldest'
+OVERFLOW_POLICIES = (BLOCK, DROP_NEWEST, DROP_OLDEST)
+
+
+class WriteBehindQueue:
+    """
+    Bounded queue of writes sent to the master in background, in batches, so the callers don't wait for them. Writes
+    of a key still queued are replaced by its new writes.
+    """
+
+    def __init__(self, max_pending=10000, batch_size=100, flush_interval_seconds=0.05, overflow_policy=DROP_OLDEST,
+                 block_timeout_seconds=1.0, shutdown_timeout_seconds=5.0):
+        """
+        Create an instance of write behind queue.
+        :param max_pending: Maximum number of writes waiting in the queue.
+        :param batch_size: Maximum number of writes sent in a single request.
+        :param flush_interval_seconds: Time to wait for a full batch before sending the writes queued.
+        :param overflow_policy: What to do when the queue is full: BLOCK, DROP_NEWEST or DROP_OLDEST.
+        :param block_timeout_seconds: Time to wait for space in the queue with the BLOCK policy.
+        :param shutdown_timeout_seconds: Time to wait for the writes queued to be sent when the process exits.
+        """
+        assert max_pending > 0, 'Maximum pending writes must be greater than zero'
+        assert batch_size > 0, 'Batch size must be greater than zero'
+        assert overflow_policy in OVERFLOW_POLICIES, \
+            'Overflow policy must be one of: {}'.format(', '.join(OVERFLOW_POLICIES))
+
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.overflow_policy = overflow_policy
+        self.block_timeout_seconds = block_timeout_seconds
+        self.shutdown_timeout_seconds = shutdown_timeout_seconds
+        self.dropped = 0
+        self._pending = OrderedDict()
+        self._in_flight = {}
+        self._sending = set()
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def put(self, key_name, value, expiration_seconds=None):
+        """
+        Queue a write.
+        :param key_name: Name of the key to be written.
+        :param value: Value.
+        :param expiration_seconds: Time to expire this key in seconds.
+        :return: True: write queued | False: write dropped, because the queue is full or closed.
+        """
+        with self._condition:
+            if self._closed:
+                return False
+
+            if key_name not in self._pending and len(self._pending) >= self.max_pending:
+                if self.overflow_policy == DROP_OLDEST:
+                    self._pending.popitem(last=False)
+                    self._record_drop()
+                elif self.overflow_policy == DROP_NEWEST or not self._condition.wait_for(
+                        lambda: len(self._pending) < self.max_pending or self._closed, self.block_timeout_seconds) \
+                        or self._closed:
+                    self._record_drop()
+                    return False
+
+            self._pending.pop(key_name, None)
+            self._pending[key_name] = (value, expiration_seconds)
+            self._condition.notify_all()
+
+        return True
+
+    def get(self, key_name, default=None):
+        """
+        Get a value queued, or being written, for a key.
+        :param key_name: Name of the key.
+        :param default: Value returned if there is no write of the key queued.
+        :return: The value queued, or default.
+        """
+        with self._condition:
+            item = self._pending.get(key_name) or self._in_flight.get(key_name)
+
+        return item[0] if item is not None else default
+
+    def discard(self, key_name):
+        """
+        Remove a write queued, or taken in a batch but not sent yet, so it doesn't override a newer write or
+        deletion of the key. If the key is being sent, wait for it to be written, so the newer write or deletion
+        comes after it.
+        :param key_name: Name of the key.
+        """
+        with self._condition:
+            removed = self._pending.pop(key_name, None) is not None
+            removed = self._in_flight.pop(key_name, None) is not None or removed
+            self._condition.wait_for(lambda: key_name not in self._sending)
+
+            if removed:
+                self._condition.notify_all()
+
+    def start(self, write_many):
+        """
+        Start sending the writes queued in a background thread, if not started yet.
+        :param write_many: Method that receives a dictionary with the values by key name and their expiration time,
+                           and writes them. The thread keeps only a weak reference to it, so it doesn't prevent its
+                           object from being garbage collected.
+        """
+        with self._condition:
+            if self._thread is not None:
+                return
+
+            self._thread = threading.Thread(target=self._write_periodically,
+                                            args=(weakref.WeakMethod(write_many),),
+                                            name='geo-lru-write-behind',
+                                            daemon=True)
+            self._thread.start()
+
+        atexit.register(self.close, self.shutdown_timeout_seconds)
+
+    def flush(self, timeout_seconds=None):
+        """
+        Wait for the writes queued to be sent.
+        :param timeout_seconds: Maximum time to wait. If None, waits until they are sent.
+        :return: True: all writes sent | False: timeout.
+        """
+        with self._condition:
+            if self._thread is None:
+                return not self._pending
+
+            return self._condition.wait_for(lambda: not self._pending and not self._in_flight, timeout_seconds)
+
+    def close(self, timeout_seconds=None):
+        """
+        Stop accepting writes and wait for the writes queued to be sent.
+        :param timeout_seconds: Maximum time to wait. If None, waits until they are sent.
+        :return: True: all writes sent | False: timeout.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+        return self.flush(timeout_seconds)
+
+    def _record_drop(self):
+        """
+        Count a dropped write. The caller must hold the lock.
+        """
+        self.dropped += 1
+        metrics.increment('geo_lru_write_behind_dropped_total')
+
+    def _take_batch(self):
+        """
+        Wait for writes to be queued and take a batch of them, waiting a while for a full batch.
+        :return: Dictionary with the values and their expiration times by key name, empty if the queue is closed.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._pending or self._closed)
+            self._condition.wait_for(lambda: len(self._pending) >= self.batch_size or self._closed,
+                                     self.flush_interval_seconds)
+
+            self._in_flight = OrderedDict(self._pending.popitem(last=False)
+                                          for _ in range(min(self.batch_size, len(self._pending))))
+
+            # There is space for blocked writers now
+            self._condition.notify_all()
+            return OrderedDict(self._in_flight)
+
+    def _write_periodically(self, write_many_reference):
+        """
+        Send the writes queued in batches until the queue is closed and empty or the writing method is garbage
+        collected.
+        :param write_many_reference: Weak reference to the writing method.
+        """
+        while True:
+            batch = self._take_batch()
+            write_many = write_many_reference()
+            if not batch or write_many is None:
+                return
+
+            # Keys written with the same expiration time are written together
+            values_by_expiration = {}
+            for key_name, (value, expiration_seconds) in batch.items():
+                values_by_expiration.setdefault(expiration_seconds, {})[key_name] = value
+
+            for expiration_seconds, values in values_by_expiration.items():
+                with self._condition:
+                    # Keys discarded after the batch was taken have newer writes or deletions
+                    values = {key_name: value for key_name, value in values.items() if key_name in self._in_flight}
+                    self._sending = set(values)
+
+                try:
+                    if values:
+                        write_many(values, expiration_seconds)
+                except Exception:
+                    # The values are lost, they will be requested again on their next reads
+                    pass
+                finally:
+                    with self._condition:
+                        self._sending = set()
+                        self._condition.notify_all()
+
+            del write_many
+
+            with self._condition:
+                self._in_flight = {}
+                self._condition.notify_all()
@@ -0,0 +1,88 @@
+import unittest
+import unittest.mock
+from src import cache_entry, keys, streams
+from src.async_geo_lru import AsyncLruClient
+from src.settings import StreamConfig
+
+try:
+    from benchmarks import stand_ins
+except ImportError:
+    stand_ins = None
+
+
+@unittest.skipIf(stand_ins is None, 'fakeredis is not installed')
+class TestAsyncLruClientStandIns(unittest.IsolatedAsyncioTestCase):
+    """
+    Tests with in-process stand-ins of the sentinel and servers (benchmarks.stand_ins) and a local HTTP origin, so
+    they don't need them.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.origin_url, cls.origin = stand_ins.start_origin()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.origin.shutdown()
+        cls.origin.server_close()
+
+    async def asyncSetUp(self):
+        installed = stand_ins.installed()
+        self.server = installed.__enter__()
+        self.addCleanup(installed.__exit__, None, None, None)
+
+        patcher = unittest.mock.patch.object(StreamConfig, 'CHUNK_SIZE_BYTES', 4)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.lru_client = AsyncLruClient()
+        await self.lru_client.connect()
+        self.addAsyncCleanup(self.lru_client.close)
+        self.redis_client = self.lru_client.redis_client
+
+    async def test_request_miss_and_hit(self):
+        """
+        Test if a response is requested from the origin and written in the cache, and then read from the cache
+        """
+        url = self.origin_url + '/10/request'
+        key_name = keys.get_cache_key(url, 'GET', namespace=self.lru_client.namespace)
+
+        self.assertEqual(await self.lru_client.request_with_cache(url, cache_expiration=60), b'x' * 10)
+        self.assertEqual(cache_entry.unpack(await self.redis_client.read(key_name))[0], b'x' * 10)
+
+        with unittest.mock.patch.object(self.lru_client.http_session, 'request', side_effect=AssertionError):
+            self.assertEqual(await self.lru_client.request_with_cache(url, cache_expiration=60), b'x' * 10)
+
+    async def test_request_stream_miss_and_hit(self):
+        """
+        Test if a response is streamed from the origin and written in chunks, and then streamed from the cache
+        """
+        url = self.origin_url + '/10/stream'
+        key_name = keys.get_cache_key(url, namespace=self.lru_client.namespace)
+
+        chunks = await self.lru_client.request_with_cache_stream(url, cache_expiration=60)
+        self.assertEqual([chunk async for chunk in chunks], [b'xxxx', b'xxxx', b'xx'])
+
+        manifest = await self.redis_client.read(streams.get_manifest_key(key_name))
+        self.assertEqual((manifest['chunks'], manifest['size']), (3, 10))
+
+        with unittest.mock.patch.object(self.lru_client.http_session, 'get', side_effect=AssertionError):
+            chunks = await self.lru_client.request_with_cache_stream(url, cache_expiration=60)
+            self.assertEqual([chunk async for chunk in chunks], [b'xxxx', b'xxxx', b'xx'])
+
+    async def test_interrupted_stream_not_cached(self):
+        """
+        Test if a response not read until its end is not cached
+        """
+        url = self.origin_url + '/10/interrupted'
+        key_name = keys.get_cache_key(url, namespace=self.lru_client.namespace)
+
+        chunks = await self.lru_client.request_with_cache_stream(url, cache_expiration=60)
+        self.assertEqual(await chunks.__anext__(), b'xxxx')
+        await chunks.aclose()
+
+        self.assertIsNone(await self.redis_client.read_stream(key_name))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+import unittest
+from src import serializers
+from src.async_redis_client import AsyncRedisCli
+from src.circuit_breaker import CircuitBreaker
+from src.settings import RedisConfig
+
+try:
+    import fakeredis
+    from benchmarks import stand_ins
+except ImportError:
+    stand_ins = None
+
+
+class TestAsyncRedisClientNotConnected(unittest.IsolatedAsyncioTestCase):
+    """
+    Tests of a client that was not connected, so they don't need the servers.
+    """
+
+    def setUp(self):
+        self.redis_cli = AsyncRedisCli(RedisConfig.SENTINEL_SERVERS,
+                                       RedisConfig.SENTINEL_MASTER_NAME,
+                                       RedisConfig.SERVERS_PASSWORD,
+                                       RedisConfig.SENTINEL_SOCKET_TIMEOUT)
+
+    async def test_close_before_connect(self):
+        """
+        Test if closing a client that was not connected does nothing
+        """
+        await self.redis_cli.close()
+        await self.redis_cli.close()
+        self.assertIsNone(self.redis_cli.master)
+
+    async def test_touch_before_connect(self):
+        """
+        Test if touching a key before connecting keeps the touch until the client is connected
+        """
+        self.redis_cli.touch('key_async_touch', 10)
+
+        self.assertIsNone(self.redis_cli._touch_task)
+        self.assertEqual(self.redis_cli._touch_batcher.pop_pending(), {'key_async_touch': 10})
+        await self.redis_cli.close()
+
+    async def test_connect_without_master(self):
+        """
+        Test if connecting when the sentinel doesn't answer leaves the client without master, like the sync client
+        """
+        redis_cli = AsyncRedisCli([('127.0.0.1', 1)], RedisConfig.SENTINEL_MASTER_NAME)
+        await redis_cli.connect()
+        self.addAsyncCleanup(redis_cli.close)
+
+        self.assertIsNone(redis_cli.master)
+        self.assertEqual(redis_cli.read_servers, [])
+        self.assertIsNone(await redis_cli.read('key_async_no_master'))
+        self.assertFalse(await redis_cli.write('key_async_no_master', 'value'))
+
+
+@unittest.skipIf(stand_ins is None, 'fakeredis is not installed')
+class TestAsyncRedisClientStandIns(unittest.IsolatedAsyncioTestCase):
+    """
+    Tests with in-process stand-ins of the sentinel and servers (benchmarks.stand_ins), so they don't need them.
+    """
+
+    async def asyncSetUp(self):
+        installed = stand_ins.installed()
+        self.server = installed.__enter__()
+        self.addCleanup(installed.__exit__, None, None, None)
+        self.redis_cli = AsyncRedisCli(RedisConfig.SENTINEL_SERVERS,
+                                       RedisConfig.SENTINEL_MASTER_NAME,
+                                       RedisConfig.SERVERS_PASSWORD,
+                                       RedisConfig.SENTINEL_SOCKET_TIMEOUT)
+        await self.redis_cli.connect()
+        self.addAsyncCleanup(self.redis_cli.close)
+
+    async def test_write_and_read(self):
+        """
+        Test if the values written in the master are read from the slaves
+        """
+        self.assertEqual(self.redis_cli.master_address, stand_ins.MASTER_ADDRESS)
+        self.assertTrue(await self.redis_cli.write('key_async_str', 'value_key_1'))
+        self.assertTrue(await self.redis_cli.write_many({'key_async_tuple': (12, 13), 'key_async_bytes': b'123'}))
+
+        self.assertEqual(await self.redis_cli.read('key_async_str'), 'value_key_1')
+        self.assertEqual(await self.redis_cli.read_many(['key_async_tuple', 'key_async_bytes', 'key_async_missing'],
+                                                        'default'),
+                         [(12, 13), b'123', 'default'])
+
+    async def test_delete(self):
+        """
+        Test if a deleted key is not read anymore
+        """
+        await self.redis_cli.write('key_async_delete_test', 'value_delete_test')
+
+        self.assertTrue(await self.redis_cli.delete('key_async_delete_test'))
+        self.assertIsNone(await self.redis_cli.read('key_async_delete_test'))
+
+    async def set_read_servers(self):
+        """
+        Make each slave of the client a separate server, with the key "key" set to its city, and the master too.
+        :return: Dictionary with the fakeredis server of each slave and of the master by city.
+        """
+        servers = {'paris': fakeredis.FakeServer(), 'toronto': fakeredis.FakeServer(), 'new_york': self.server}
+        read_servers = []
+
+        for city, address in zip(servers, stand_ins.SLAVES_ADDRESSES + [stand_ins.MASTER_ADDRESS]):
+            server = fakeredis.FakeAsyncRedis(server=servers[city])
+            await server.set('key', serializers.get_serializer('binary').dumps(city))
+            read_servers.append((address, server))
+
+        self.redis_cli.read_servers = read_servers
+        return servers
+
+    async def test_read_failover(self):
+        """
+        Test if reads fall over to the next nearest slave and then to the master when servers fail
+        """
+        paris, toronto = stand_ins.SLAVES_ADDRESSES
+        servers = await self.set_read_servers()
+        self.assertEqual(await self.redis_cli.read('key'), 'paris')
+
+        servers['paris'].connected = False
+        self.assertEqual(await self.redis_cli.read('key'), 'toronto')
+        self.assertEqual(await self.redis_cli.read_many(['key']), ['toronto'])
+
+        servers['toronto'].connected = False
+        self.assertEqual(await self.redis_cli.read('key'), 'new_york')
+        self.assertEqual(self.redis_cli._get_circuit_breaker(paris).state, CircuitBreaker.OPEN)
+        self.assertEqual(self.redis_cli._get_circuit_breaker(toronto).state, CircuitBreaker.OPEN)
+
+        servers['new_york'].connected = False
+        self.assertIsNone(await self.redis_cli.read('key'))
+
+
+class TestAsyncRedisClient(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.redis_cli = AsyncRedisCli(RedisConfig.SENTINEL_SERVERS,
+                                       RedisConfig.SENTINEL_MASTER_NAME,
+                                       RedisConfig.SERVERS_PASSWORD,
+                                       RedisConfig.SENTINEL_SOCKET_TIMEOUT)
+        await self.redis_cli.connect()
+
+    async def asyncTearDown(self):
+        await self.redis_cli.close()
+
+    async def save_and_check_key(self, key_name, value):
+        """
+        Test the saving and reading of a key
+        """
+        await self.redis_cli.write(key_name, value)
+        value_from_server = await self.redis_cli.read(key_name)
+
+        self.assertEqual(value, value_from_server)
+
+    async def test_cli_string_input(self):
+        """
+        Test string input
+        """
+        await self.save_and_check_key('key_async_str', 'value_key_1')
+
+    async def test_cli_tuple_input(self):
+        """
+        Test tuple input
+        """
+        await self.save_and_check_key('key_async_tuple', (12, 13))
+
+    async def test_cli_bytes_input(self):
+        """
+        Test bytes input
+        """
+        await self.save_and_check_key('key_async_bytes', b'123lkdfuh')
+
+    async def test_delete(self):
+        """
+        Test if delete is working
+        """
+        key_name = 'key_async_delete_test'
+        value = 'value_delete_test'
+
+        # save key without expiration time
+        await self.redis_cli.write(key_name, value)
+        self.assertEqual(value, await self.redis_cli.read(key_name))
+
+        # Delete the key
+        self.assertTrue(await self.redis_cli.delete(key_name))
+
+        # Check if value is now None
+        self.assertIsNone(await self.redis_cli.read(key_name))
+
+
+if __name__ == '__main__':
+    unittest.main()
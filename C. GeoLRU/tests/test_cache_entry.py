@@ -0,0 +1,97 @@
+import time
+import unittest
+from src import cache_entry
+from src.settings import HttpCacheConfig, NegativeCacheConfig, StaleConfig
+
+
+class TestCacheEntry(unittest.TestCase):
+    def setUp(self):
+        self.stale_while_revalidate = StaleConfig.STALE_WHILE_REVALIDATE_SECONDS
+        self.stale_if_error = StaleConfig.STALE_IF_ERROR_SECONDS
+        StaleConfig.STALE_WHILE_REVALIDATE_SECONDS = 10
+        StaleConfig.STALE_IF_ERROR_SECONDS = 60
+
+    def tearDown(self):
+        StaleConfig.STALE_WHILE_REVALIDATE_SECONDS = self.stale_while_revalidate
+        StaleConfig.STALE_IF_ERROR_SECONDS = self.stale_if_error
+
+    def test_pack_and_unpack(self):
+        """
+        Test if a value is read back with its expiration time
+        """
+        value, expires_at, validators = cache_entry.unpack(cache_entry.pack(b'value', 30))
+
+        self.assertEqual(value, b'value')
+        self.assertAlmostEqual(expires_at, time.time() + 30, delta=1)
+        self.assertIsNone(validators)
+
+    def test_pack_and_unpack_validators(self):
+        """
+        Test if a value is read back with its HTTP validators, even if stale values are disabled
+        """
+        StaleConfig.STALE_WHILE_REVALIDATE_SECONDS = None
+        StaleConfig.STALE_IF_ERROR_SECONDS = None
+        validators = {'etag': '"v1"', 'last_modified': 'Wed, 21 Oct 2015 07:28:00 GMT'}
+
+        value, expires_at, validators_read = cache_entry.unpack(cache_entry.pack(b'value', 30, validators))
+
+        self.assertEqual(value, b'value')
+        self.assertAlmostEqual(expires_at, time.time() + 30, delta=1)
+        self.assertEqual(validators_read, validators)
+        self.assertEqual(cache_entry.get_storage_expiration(30, validators), 30 + HttpCacheConfig.REVALIDATION_SECONDS)
+
+    def test_unpack_plain_value(self):
+        """
+        Test if values written without expiration time are read as they are
+        """
+        self.assertEqual(cache_entry.unpack(b'value'), (b'value', None, None))
+        self.assertEqual(cache_entry.unpack(None), (None, None, None))
+
+    def test_disabled(self):
+        """
+        Test if values are written as they are when stale values are disabled or they never expire
+        """
+        self.assertEqual(cache_entry.pack(b'value', None), b'value')
+
+        StaleConfig.STALE_WHILE_REVALIDATE_SECONDS = None
+        StaleConfig.STALE_IF_ERROR_SECONDS = None
+        self.assertEqual(cache_entry.pack(b'value', 30), b'value')
+        self.assertEqual(cache_entry.get_storage_expiration(30), 30)
+
+    def test_storage_expiration(self):
+        """
+        Test if values are kept in the cache while they can be returned stale
+        """
+        self.assertEqual(cache_entry.get_storage_expiration(30), 90)
+        self.assertIsNone(cache_entry.get_storage_expiration(None))
+
+
+    def test_state(self):
+        """
+        Test the state of values read from the cache, with empty values as hits
+        """
+        self.assertEqual(cache_entry.get_state(None, None), 'miss')
+        self.assertEqual(cache_entry.get_state(b'', None), 'hit')
+        self.assertEqual(cache_entry.get_state(b'value', time.time() + 30), 'hit')
+        self.assertEqual(cache_entry.get_state(b'value', time.time() - 1), 'stale')
+
+    def test_errors(self):
+        """
+        Test if origin errors are read back with their status and expire by status class
+        """
+        NegativeCacheConfig.CLIENT_ERROR_EXPIRATION_SECONDS = 30
+        try:
+            error = cache_entry.pack_error(404)
+
+            self.assertEqual(cache_entry.get_error_status(error), 404)
+            self.assertIsNone(cache_entry.get_error_status(b'value'))
+            self.assertEqual(cache_entry.get_state(error, None), 'error')
+            self.assertEqual(cache_entry.get_state(error, time.time() - 1), 'miss')
+            self.assertEqual(cache_entry.get_error_expiration(404), 30)
+            self.assertIsNone(cache_entry.get_error_expiration(503))
+        finally:
+            NegativeCacheConfig.CLIENT_ERROR_EXPIRATION_SECONDS = None
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import time
+import unittest
+from src.circuit_breaker import CircuitBreaker
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_open_after_failures(self):
+        """
+        Test if requests are not allowed after the failure threshold is reached
+        """
+        circuit_breaker = CircuitBreaker(failure_threshold=2)
+
+        circuit_breaker.record_failure()
+        self.assertTrue(circuit_breaker.allow_request())
+
+        circuit_breaker.record_failure()
+        self.assertFalse(circuit_breaker.allow_request())
+        self.assertEqual(circuit_breaker.state, CircuitBreaker.OPEN)
+
+    def test_success_resets_failures(self):
+        """
+        Test if a success resets the consecutive failures count
+        """
+        circuit_breaker = CircuitBreaker(failure_threshold=2)
+
+        circuit_breaker.record_failure()
+        circuit_breaker.record_success()
+        circuit_breaker.record_failure()
+
+        self.assertTrue(circuit_breaker.allow_request())
+
+    def test_half_open_after_reset_timeout(self):
+        """
+        Test if only one request is allowed after the reset timeout, closing the circuit if it succeeds
+        """
+        circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout_seconds=0.1)
+        circuit_breaker.record_failure()
+        self.assertFalse(circuit_breaker.allow_request())
+
+        time.sleep(0.2)
+
+        self.assertTrue(circuit_breaker.allow_request())
+        self.assertFalse(circuit_breaker.allow_request())
+
+        circuit_breaker.record_success()
+        self.assertTrue(circuit_breaker.allow_request())
+        self.assertEqual(circuit_breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_failure(self):
+        """
+        Test if the circuit is opened again if the request allowed after the reset timeout fails
+        """
+        circuit_breaker = CircuitBreaker(failure_threshold=3, reset_timeout_seconds=0.1)
+        for _ in range(3):
+            circuit_breaker.record_failure()
+
+        time.sleep(0.2)
+
+        self.assertTrue(circuit_breaker.allow_request())
+        circuit_breaker.record_failure()
+        self.assertFalse(circuit_breaker.allow_request())
+
+    def test_half_open_release(self):
+        """
+        Test if another request is allowed after the request allowed after the reset timeout is released
+        """
+        circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout_seconds=0.1)
+        circuit_breaker.record_failure()
+
+        time.sleep(0.2)
+
+        self.assertTrue(circuit_breaker.allow_request())
+        circuit_breaker.release()
+        self.assertTrue(circuit_breaker.allow_request())
+        self.assertEqual(circuit_breaker.state, CircuitBreaker.HALF_OPEN)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,20 @@
+import email.utils
+import http.server
+import threading
+import time
 import unittest
+import unittest.mock
+import urllib.error
+from src import cache_entry, serializers
+from src.cached import cached
 from src.geo_lru import LruClient
 from src.redis_client import RedisCli
-from src.settings import RedisConfig
+from src.settings import HttpCacheConfig, NegativeCacheConfig, RedisConfig, SerializerConfig, StaleConfig
+
+try:
+    from benchmarks import stand_ins
+except ImportError:
+    stand_ins = None
 
 
 class TestLruClient(unittest.TestCase):
@@ -46,6 +59,323 @@ class TestLruClient(unittest.TestCase):
         # Deleting key from redis
         self.assertTrue(redis_client.delete(url))
 
+    def test_redis_client_is_shared(self):
+        """
+        Test if all instances share the same redis client
+        """
+        self.assertIs(LruClient().redis_client, LruClient().redis_client)
+
+    def test_is_caching_many(self):
+        """
+        Test if many requests are being added to the cache
+        """
+        lru_client = LruClient()
+        redis_client = self.get_redis_cli_connection()
+
+        urls = ['https://ipinfo.io/json', 'https://ipinfo.io/ip']
+
+        # Start by deleting keys from redis (the keys will be the entire URLs)
+        for url in urls:
+            self.assertTrue(redis_client.delete(url))
+
+        # Execute requests and check if they were saved in cache
+        request_results = lru_client.request_with_cache_many(urls)
+        self.assertEqual(len(request_results), len(urls))
+        self.assertEqual(redis_client.read_many(urls), request_results)
+
+        # Execute requests again, and now they should be returned from cache
+        self.assertEqual(lru_client.request_with_cache_many(urls), request_results)
+
+        for url in urls:
+            self.assertTrue(redis_client.delete(url))
+
+    def test_cached(self):
+        """
+        Test if the results of a decorated function are cached, including None
+        """
+        calls = []
+
+        @cached(cache_expiration=60)
+        def add(a, b=0):
+            calls.append((a, b))
+            return a + b if a is not None else None
+
+        add.invalidate(1, 2)
+        add.invalidate(None)
+
+        self.assertEqual(add(1, 2), 3)
+        self.assertEqual(add(1, b=2), 3)
+        self.assertIsNone(add(None))
+        self.assertIsNone(add(None))
+        self.assertEqual(calls, [(1, 2), (None, 0)])
+
+
+class OriginHandler(http.server.BaseHTTPRequestHandler):
+    """
+    HTTP origin answering with the request path and the number of requests received, so each response is new, or
+    with the status set in the class (by path in statuses, or for all paths). The response headers set in the
+    class are sent too and, if they have an ETag, conditional requests with it are answered 304 (not modified).
+    """
+    protocol_version = 'HTTP/1.1'
+    status = 200
+    statuses = {}
+    headers = {}
+    requests = []
+    conditional_requests = []
+
+    def do_GET(self):
+        OriginHandler.requests.append(self.path)
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            OriginHandler.conditional_requests.append(if_none_match)
+
+        if if_none_match is not None and if_none_match == OriginHandler.headers.get('ETag'):
+            self.send_response(304)
+            for name, value in OriginHandler.headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            return
+
+        body = '{}:{}'.format(self.path, len(self.requests)).encode()
+
+        self.send_response(OriginHandler.statuses.get(self.path, OriginHandler.status))
+        for name, value in OriginHandler.headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@unittest.skipIf(stand_ins is None, 'fakeredis is not installed')
+class TestLruClientStandIns(unittest.TestCase):
+    """
+    Tests with in-process stand-ins of the sentinel and servers (benchmarks.stand_ins), so they don't need them.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.origin = http.server.ThreadingHTTPServer(('127.0.0.1', 0), OriginHandler)
+        threading.Thread(target=cls.origin.serve_forever, daemon=True).start()
+        cls.origin_url = 'http://127.0.0.1:{}'.format(cls.origin.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.origin.shutdown()
+        cls.origin.server_close()
+
+    def setUp(self):
+        installed = stand_ins.installed()
+        self.server = installed.__enter__()
+        self.addCleanup(installed.__exit__, None, None, None)
+        OriginHandler.status = 200
+        OriginHandler.statuses = {}
+        OriginHandler.headers = {}
+        OriginHandler.requests = []
+        OriginHandler.conditional_requests = []
+
+    def patch_settings(self, settings, **values):
+        """
+        Change settings until the end of the test.
+        """
+        for name, value in values.items():
+            patcher = unittest.mock.patch.object(settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write_stale_value(self, lru_client, url, value):
+        """
+        Write a value in the cache that expired a second ago, but is still kept in the cache.
+        """
+        lru_client.redis_client.write(url, cache_entry.pack(value, -1), 60)
+
+    def test_stale_while_revalidate(self):
+        """
+        Test if a stale value is returned while it's requested again in background
+        """
+        self.patch_settings(StaleConfig, STALE_WHILE_REVALIDATE_SECONDS=60)
+        lru_client = LruClient()
+        url = self.origin_url + '/stale'
+        self.write_stale_value(lru_client, url, b'stale value')
+
+        self.assertEqual(lru_client.request_with_cache(url, cache_expiration=60), b'stale value')
+
+        deadline = time.monotonic() + 5
+        while cache_entry.unpack(lru_client.redis_client.read(url))[0] == b'stale value':
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+        self.assertEqual(lru_client.request_with_cache(url, cache_expiration=60), b'/stale:1')
+        self.assertEqual(OriginHandler.requests, ['/stale'])
+
+    def test_stale_if_error(self):
+        """
+        Test if a stale value is returned when the origin fails with a server error, but not with a client error
+        """
+        self.patch_settings(StaleConfig, STALE_IF_ERROR_SECONDS=60)
+        lru_client = LruClient()
+        url = self.origin_url + '/error'
+        self.write_stale_value(lru_client, url, b'stale value')
+
+        OriginHandler.status = 500
+        self.assertEqual(lru_client.request_with_cache(url, cache_expiration=60), b'stale value')
+
+        OriginHandler.status = 404
+        with self.assertRaises(urllib.error.HTTPError):
+            lru_client.request_with_cache(url, cache_expiration=60)
+
+        OriginHandler.status = 200
+        self.assertEqual(lru_client.request_with_cache(url, cache_expiration=60), b'/error:3')
+
+    def test_request_many_with_error(self):
+        """
+        Test if the values requested with a failing one, or with an error in the cache, are cached before the error
+        is raised
+        """
+        self.patch_settings(NegativeCacheConfig, CLIENT_ERROR_EXPIRATION_SECONDS=60)
+        OriginHandler.statuses = {'/missing': 404}
+        lru_client = LruClient()
+        urls = [self.origin_url + path for path in ('/first', '/missing', '/last')]
+
+        with self.assertRaises(urllib.error.HTTPError) as raised:
+            lru_client.request_with_cache_many(urls, cache_expiration=60)
+        self.assertEqual(raised.exception.code, 404)
+        self.assertEqual(sorted(OriginHandler.requests), ['/first', '/last', '/missing'])
+
+        # The error is raised again from the cache, without requesting any URL
+        with self.assertRaises(urllib.error.HTTPError) as raised:
+            lru_client.request_with_cache_many(urls, cache_expiration=60)
+        self.assertEqual(raised.exception.code, 404)
+        self.assertEqual(len(OriginHandler.requests), 3)
+
+        values = lru_client.request_with_cache_many([urls[0], urls[2]], cache_expiration=60)
+        self.assertEqual(sorted(values), sorted(cache_entry.unpack(lru_client.redis_client.read(url))[0]
+                                                for url in (urls[0], urls[2])))
+        self.assertEqual(len(OriginHandler.requests), 3)
+
+    def test_http_revalidation(self):
+        """
+        Test if a response expires according to its Cache-Control header and, when expired, is revalidated with its
+        ETag and renewed without being downloaded again when the origin answers 304
+        """
+        self.patch_settings(HttpCacheConfig, ENABLED=True)
+        OriginHandler.headers = {'ETag': '"v1"', 'Cache-Control': 'max-age=1'}
+        lru_client = LruClient()
+        url = self.origin_url + '/etag'
+
+        self.assertEqual(lru_client.request_with_cache(url, cache_expiration=60), b'/etag:1')
+        self.assertEqual(lru_client.request_with_cache(url, cache_expiration=60), b'/etag:1')
+        _, expires_at, validators = cache_entry.unpack(lru_client.redis_client.read(url))
+        self.assertLessEqual(expires_at - time.time(), 1)
+        self.assertEqual(validators, {'etag': '"v1"'})
+        # Kept in the cache after expiring, so it can be revalidated
+        self.assertGreater(lru_client.redis_client.master.ttl(url), 60)
+        self.assertEqual(OriginHandler.conditional_requests, [])
+
+        time.sleep(1.1)
+        self.assertEqual(lru_client.request_with_cache(url, cache_expiration=60), b'/etag:1')
+        self.assertEqual(OriginHandler.requests, ['/etag', '/etag'])
+        self.assertEqual(OriginHandler.conditional_requests, ['"v1"'])
+
+        # Renewed by the 304 response for another max-age
+        _, expires_at, _ = cache_entry.unpack(lru_client.redis_client.read(url))
+        self.assertGreater(expires_at, time.time())
+        self.assertEqual(lru_client.request_with_cache(url, cache_expiration=60), b'/etag:1')
+        self.assertEqual(len(OriginHandler.requests), 2)
+
+        # A new version is downloaded
+        OriginHandler.headers = {'ETag': '"v2"', 'Cache-Control': 'max-age=0'}
+        lru_client.redis_client.write(url, cache_entry.pack(b'/etag:1', -1, {'etag': '"v1"'}), 60)
+        self.assertEqual(lru_client.request_with_cache(url, cache_expiration=60), b'/etag:3')
+        self.assertEqual(cache_entry.unpack(lru_client.redis_client.read(url))[2], {'etag': '"v2"'})
+
+    def test_http_expires(self):
+        """
+        Test if a response expires according to its Expires header, and is not cached with Cache-Control no-store
+        """
+        self.patch_settings(HttpCacheConfig, ENABLED=True)
+        now = time.time()
+        OriginHandler.headers = {'Expires': email.utils.formatdate(now + 30, usegmt=True)}
+        lru_client = LruClient()
+        url = self.origin_url + '/expires'
+
+        self.assertEqual(lru_client.request_with_cache(url, cache_expiration=60), b'/expires:1')
+        self.assertAlmostEqual(lru_client.redis_client.master.ttl(url), 30, delta=2)
+        self.assertEqual(lru_client.request_with_cache(url, cache_expiration=60), b'/expires:1')
+
+        OriginHandler.headers = {'Cache-Control': 'no-store'}
+        url = self.origin_url + '/no_store'
+        self.assertEqual(lru_client.request_with_cache(url, cache_expiration=60), b'/no_store:2')
+        self.assertIsNone(lru_client.redis_client.read(url))
+        self.assertEqual(lru_client.request_with_cache(url, cache_expiration=60), b'/no_store:3')
+
+    def test_stale_entries_with_json_serializer(self):
+        """
+        Test if values written with their expiration time are cached with the json serializer
+        """
+        self.patch_settings(StaleConfig, STALE_IF_ERROR_SECONDS=60)
+        self.patch_settings(SerializerConfig, SERIALIZER='json')
+        lru_client = LruClient()
+        url = self.origin_url + '/json'
+
+        self.assertEqual(lru_client.request_with_cache(url, cache_expiration=60), b'/json:1')
+        self.assertEqual(lru_client.request_with_cache(url, cache_expiration=60), b'/json:1')
+        self.assertEqual(OriginHandler.requests, ['/json'])
+
+        # Written as it is, without the json envelope
+        self.assertEqual(lru_client.redis_client.master.get(url)[0], serializers.BINARY_MARKER)
+
+    def test_cached(self):
+        """
+        Test if the results of a decorated function are cached, including None, and invalidated
+        """
+        calls = []
+
+        @cached(cache_expiration=60)
+        def add(a, b=0):
+            calls.append((a, b))
+            return a + b if a is not None else None
+
+        self.assertEqual(add(1, 2), 3)
+        self.assertEqual(add(1, b=2), 3)
+        self.assertIsNone(add(None))
+        self.assertIsNone(add(None))
+        self.assertEqual(calls, [(1, 2), (None, 0)])
+
+        self.assertTrue(add.invalidate(1, 2))
+        self.assertEqual(add(1, 2), 3)
+        self.assertEqual(len(calls), 3)
+
+    def test_cached_arguments_types(self):
+        """
+        Test if calls with arguments of different types don't share their results
+        """
+        @cached(cache_expiration=60)
+        def get_type(value):
+            return type(value).__name__
+
+        self.assertEqual(get_type((1, 2)), 'tuple')
+        self.assertEqual(get_type([1, 2]), 'list')
+        self.assertEqual(get_type(b'ab'), 'bytes')
+        self.assertEqual(get_type('6162'), 'str')
+
+    def test_cached_not_serializable(self):
+        """
+        Test if results the serializer doesn't support are returned without being cached
+        """
+        calls = []
+
+        @cached(cache_expiration=60)
+        def get_set(value):
+            calls.append(value)
+            return {value}
+
+        self.assertEqual(get_set(1), {1})
+        self.assertEqual(get_set(1), {1})
+        self.assertEqual(calls, [1, 1])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+from src import http_cache
+from src.settings import HttpCacheConfig
+
+
+class TestHttpCache(unittest.TestCase):
+    def setUp(self):
+        self.vary_headers = HttpCacheConfig.VARY_HEADERS
+        HttpCacheConfig.VARY_HEADERS = ('Accept-Language',)
+
+    def tearDown(self):
+        HttpCacheConfig.VARY_HEADERS = self.vary_headers
+
+    def test_cache_key(self):
+        """
+        Test if cache keys vary on the method, the configured headers and the body
+        """
+        url = 'http://example.com/a'
+
+        self.assertEqual(http_cache.get_cache_key(url), url)
+        self.assertEqual(http_cache.get_cache_key(url, headers={'User-Agent': 'test'}), url)
+        self.assertEqual(http_cache.get_cache_key(url, headers={'accept-language': 'pt'}),
+                         'GET http://example.com/a accept-language=pt')
+        self.assertEqual(http_cache.get_cache_key(url, method='HEAD'), 'HEAD http://example.com/a')
+        self.assertNotEqual(http_cache.get_cache_key(url, data=b'a'), http_cache.get_cache_key(url, data=b'b'))
+        self.assertEqual(http_cache.get_cache_key(url, data={'a': 1, 'b': 2}),
+                         http_cache.get_cache_key(url, data='a=1&b=2'))
+
+    def test_cache_expiration(self):
+        """
+        Test if the expiration time is read from Cache-Control and Expires headers
+        """
+        self.assertEqual(http_cache.get_cache_expiration({'Cache-Control': 'public, max-age=60'}), 60)
+        self.assertEqual(http_cache.get_cache_expiration({'Cache-Control': 'max-age=60, s-maxage=30'}), 30)
+        self.assertEqual(http_cache.get_cache_expiration({'Cache-Control': 'max-age=60', 'Age': '10'}), 50)
+        self.assertEqual(http_cache.get_cache_expiration({'Cache-Control': 'no-cache, max-age=60'}), 0)
+        self.assertEqual(http_cache.get_cache_expiration({'Date': 'Wed, 21 Oct 2015 07:28:00 GMT',
+                                                          'Expires': 'Wed, 21 Oct 2015 08:28:00 GMT'}), 3600)
+        self.assertEqual(http_cache.get_cache_expiration({'Expires': '0'}), 0)
+        self.assertEqual(http_cache.get_cache_expiration({}, 120), 120)
+
+    def test_is_storable(self):
+        """
+        Test if private, no-store and responses varying on headers out of the cache key are not cached
+        """
+        self.assertTrue(http_cache.is_storable({}, {'Cache-Control': 'max-age=60'}))
+        self.assertFalse(http_cache.is_storable({}, {'Cache-Control': 'no-store'}))
+        self.assertFalse(http_cache.is_storable({}, {'Cache-Control': 'private, max-age=60'}))
+        self.assertFalse(http_cache.is_storable({'Cache-Control': 'no-store'}, {}))
+        self.assertFalse(http_cache.is_storable({}, {'Vary': '*'}))
+        self.assertTrue(http_cache.is_storable({'Accept-Language': 'pt'}, {'Vary': 'Accept-Language'}))
+        self.assertTrue(http_cache.is_storable({}, {'Vary': 'Accept-Encoding'}))
+        self.assertFalse(http_cache.is_storable({'Accept-Encoding': 'gzip'}, {'Vary': 'Accept-Encoding'}))
+
+    def test_is_storable_authorization(self):
+        """
+        Test if responses to requests with Authorization are cached only if the response allows it explicitly
+        """
+        request_headers = {'Authorization': 'Bearer token'}
+
+        self.assertFalse(http_cache.is_storable(request_headers, {}))
+        self.assertFalse(http_cache.is_storable(request_headers, {'Cache-Control': 'max-age=60'}))
+        self.assertTrue(http_cache.is_storable(request_headers, {'Cache-Control': 'public, max-age=60'}))
+        self.assertTrue(http_cache.is_storable(request_headers, {'Cache-Control': 's-maxage=60'}))
+        self.assertTrue(http_cache.is_storable(request_headers, {'Cache-Control': 'must-revalidate, max-age=60'}))
+
+    def test_validators(self):
+        """
+        Test if validators are read from the responses and sent in conditional requests
+        """
+        validators = http_cache.get_validators({'ETag': '"v1"', 'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+
+        self.assertEqual(http_cache.get_conditional_headers(validators),
+                         {'If-None-Match': '"v1"', 'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+        self.assertEqual(http_cache.get_validators({'ETag': '"v2"'}, validators)['etag'], '"v2"')
+        self.assertIsNone(http_cache.get_validators({}))
+        self.assertEqual(http_cache.get_conditional_headers(None), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import json
+import unittest
+import unittest.mock
+from src import invalidation
+from src.settings import InvalidationConfig
+
+
+class Pipeline:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+
+
+class TestInvalidation(unittest.TestCase):
+    def test_add_publish_command(self):
+        """
+        Test if the invalidations are published only if enabled
+        """
+        pipeline = Pipeline()
+        with unittest.mock.patch.object(InvalidationConfig, 'ENABLED', False):
+            invalidation.add_publish_command(pipeline, 'client1', ['key1'])
+        self.assertEqual(pipeline.published, [])
+
+        with unittest.mock.patch.object(InvalidationConfig, 'ENABLED', True):
+            invalidation.add_publish_command(pipeline, 'client1', {'key1': b'value1', 'key2': b'value2'})
+
+        channel, message = pipeline.published[0]
+        self.assertEqual(channel, InvalidationConfig.CHANNEL)
+        self.assertEqual(json.loads(message), {'client_id': 'client1', 'keys': ['key1', 'key2']})
+
+    def test_get_invalidated_keys(self):
+        """
+        Test if only the keys invalidated by other clients are removed
+        """
+        message = {'type': 'message', 'data': json.dumps({'client_id': 'client1', 'keys': ['key1']}).encode()}
+
+        self.assertEqual(invalidation.get_invalidated_keys(message, 'client2'), ['key1'])
+        self.assertEqual(invalidation.get_invalidated_keys(message, 'client1'), [])
+        self.assertEqual(invalidation.get_invalidated_keys(None, 'client2'), [])
+        self.assertEqual(invalidation.get_invalidated_keys({'type': 'message', 'data': b'invalid'}, 'client2'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import time
+import unittest
+from src.local_cache import LocalCache
+
+
+class TestLocalCache(unittest.TestCase):
+    def test_set_and_get(self):
+        """
+        Test the saving and reading of a key
+        """
+        cache = LocalCache()
+        cache.set('key_str', 'value_key_1', 11)
+
+        self.assertEqual(cache.get('key_str'), 'value_key_1')
+        self.assertEqual(cache.current_bytes, 11)
+
+    def test_cached_none(self):
+        """
+        Test if a None value is distinguished from a missing key
+        """
+        cache = LocalCache()
+        missing = object()
+        cache.set('key_none', None, 1)
+
+        self.assertIsNone(cache.get('key_none', missing))
+        self.assertIs(cache.get('key_missing', missing), missing)
+
+    def test_expiration(self):
+        """
+        Test if the expiration time is working
+        """
+        cache = LocalCache()
+        cache.set('key_expiration_test', 'value_expiration', 16, 0.1)
+        self.assertEqual(cache.get('key_expiration_test'), 'value_expiration')
+
+        time.sleep(0.2)
+
+        self.assertIsNone(cache.get('key_expiration_test'))
+        self.assertEqual(cache.current_bytes, 0)
+
+    def test_max_items_eviction(self):
+        """
+        Test if the least recently used key is evicted when there are too many keys
+        """
+        cache = LocalCache(max_items=2)
+        cache.set('key_1', 1, 1)
+        cache.set('key_2', 2, 1)
+
+        # Reading key_1 makes key_2 the least recently used one
+        cache.get('key_1')
+        cache.set('key_3', 3, 1)
+
+        self.assertEqual(cache.get('key_1'), 1)
+        self.assertIsNone(cache.get('key_2'))
+        self.assertEqual(cache.get('key_3'), 3)
+
+    def test_max_bytes_eviction(self):
+        """
+        Test if keys are evicted when the byte limit is exceeded
+        """
+        cache = LocalCache(max_bytes=10)
+        cache.set('key_1', 'a', 6)
+        cache.set('key_2', 'b', 6)
+
+        self.assertIsNone(cache.get('key_1'))
+        self.assertEqual(cache.get('key_2'), 'b')
+        self.assertEqual(cache.current_bytes, 6)
+
+        # A value bigger than the whole cache is not stored
+        self.assertFalse(cache.set('key_3', 'c', 11))
+        self.assertIsNone(cache.get('key_3'))
+
+    def test_delete(self):
+        """
+        Test if delete is working
+        """
+        cache = LocalCache()
+        cache.set('key_delete_test', 'value_delete_test', 17)
+        cache.delete('key_delete_test')
+
+        self.assertIsNone(cache.get('key_delete_test'))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.current_bytes, 0)
+
+    def test_mutable_values_are_copied(self):
+        """
+        Test if changing a value stored or read doesn't change the cached value
+        """
+        cache = LocalCache()
+        value = dict(items=[1, 2])
+        cache.set('key_dict', value, 10)
+        value['items'].append(3)
+
+        value_read = cache.get('key_dict')
+        value_read['items'].append(4)
+
+        self.assertEqual(cache.get('key_dict'), dict(items=[1, 2]))
+
+        value = b'immutable'
+        cache.set('key_bytes', value, 9)
+        self.assertIs(cache.get('key_bytes'), value)
+
+
+if __name__ == '__main__':
+    unittest.main()
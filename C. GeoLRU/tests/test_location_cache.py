@@ -0,0 +1,72 @@
+import os
+import tempfile
+import time
+import unittest
+import unittest.mock
+from src.location_cache import LocationCache
+
+
+class TestLocationCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, 'cache', 'locations.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_persisted_locations(self):
+        """
+        Test if the locations are persisted and loaded by a new cache instance
+        """
+        LocationCache(self.file_path).set('10.0.0.1', (45.5, -73.5))
+        LocationCache(self.file_path).set(None, (48.8, 2.3))
+
+        location_cache = LocationCache(self.file_path)
+        self.assertEqual(location_cache.get('10.0.0.1'), (45.5, -73.5))
+        self.assertEqual(location_cache.get(), (48.8, 2.3))
+        self.assertIsNone(location_cache.get('10.0.0.2'))
+
+    def test_expiration(self):
+        """
+        Test if the expiration time is working
+        """
+        location_cache = LocationCache(self.file_path, expiration_seconds=0.1)
+        location_cache.set('10.0.0.1', (45.5, -73.5))
+        self.assertEqual(location_cache.get('10.0.0.1'), (45.5, -73.5))
+
+        time.sleep(0.2)
+
+        self.assertIsNone(location_cache.get('10.0.0.1'))
+
+    def test_invalid_file(self):
+        """
+        Test if an invalid file is ignored
+        """
+        os.makedirs(os.path.dirname(self.file_path))
+        with open(self.file_path, 'w') as locations_file:
+            locations_file.write('invalid json')
+
+        location_cache = LocationCache(self.file_path)
+        self.assertIsNone(location_cache.get('10.0.0.1'))
+
+        location_cache.set('10.0.0.1', (45.5, -73.5))
+        self.assertEqual(LocationCache(self.file_path).get('10.0.0.1'), (45.5, -73.5))
+
+    def test_failed_save_leaves_no_temporary_file(self):
+        """
+        Test if the temporary file is removed when the locations can't be saved, keeping them in memory
+        """
+        location_cache = LocationCache(self.file_path)
+
+        with unittest.mock.patch('os.replace', side_effect=OSError):
+            location_cache.set('10.0.0.1', (45.5, -73.5))
+        with unittest.mock.patch('json.dump', side_effect=TypeError):
+            location_cache.set('10.0.0.2', (48.8, 2.3))
+
+        self.assertEqual(os.listdir(os.path.dirname(self.file_path)), [])
+        self.assertEqual(location_cache.get('10.0.0.1'), (45.5, -73.5))
+        self.assertEqual(location_cache.get('10.0.0.2'), (48.8, 2.3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from src.metrics import COUNTER, HISTOGRAM, MetricsRegistry
+
+
+class TestMetrics(unittest.TestCase):
+    def test_counters(self):
+        """
+        Test if counters are incremented by name and labels
+        """
+        registry = MetricsRegistry()
+
+        registry.increment('reads_total', result='hit')
+        registry.increment('reads_total', 2, result='hit')
+        registry.increment('reads_total', result='miss')
+
+        self.assertEqual(registry.get_counter('reads_total', result='hit'), 3)
+        self.assertEqual(registry.get_counter('reads_total', result='miss'), 1)
+        self.assertEqual(registry.get_counter('reads_total', result='stale'), 0)
+
+    def test_histograms(self):
+        """
+        Test if histograms count and sum the observations
+        """
+        registry = MetricsRegistry(buckets=(0.1, 1))
+
+        registry.observe('latency_seconds', 0.05, node='a')
+        registry.observe('latency_seconds', 0.5, node='a')
+
+        self.assertEqual(registry.get_histogram('latency_seconds', node='a'), (2, 0.55))
+        self.assertEqual(registry.get_histogram('latency_seconds', node='b'), (0, 0.0))
+
+    def test_hooks(self):
+        """
+        Test if hooks are called on every update until they are removed
+        """
+        registry = MetricsRegistry()
+        updates = []
+        hook = lambda *update: updates.append(update)
+
+        registry.add_hook(hook)
+        registry.increment('reads_total', result='hit')
+        registry.observe('latency_seconds', 0.5)
+        registry.remove_hook(hook)
+        registry.increment('reads_total', result='hit')
+
+        self.assertEqual(updates, [(COUNTER, 'reads_total', 1, {'result': 'hit'}),
+                                   (HISTOGRAM, 'latency_seconds', 0.5, {})])
+
+    def test_render_prometheus(self):
+        """
+        Test the Prometheus text format, with cumulative histogram buckets and escaped labels
+        """
+        registry = MetricsRegistry(buckets=(0.1, 1))
+
+        registry.increment('reads_total', node='a"b')
+        registry.observe('latency_seconds', 0.05)
+        registry.observe('latency_seconds', 0.5)
+        registry.observe('latency_seconds', 5)
+
+        self.assertEqual(registry.render_prometheus(),
+                         '# TYPE reads_total counter\n'
+                         'reads_total{node="a\\"b"} 1\n'
+                         '# TYPE latency_seconds histogram\n'
+                         'latency_seconds_bucket{le="0.1"} 1\n'
+                         'latency_seconds_bucket{le="1"} 2\n'
+                         'latency_seconds_bucket{le="+Inf"} 3\n'
+                         'latency_seconds_sum 5.55\n'
+                         'latency_seconds_count 3\n')
+        self.assertEqual(MetricsRegistry().render_prometheus(), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
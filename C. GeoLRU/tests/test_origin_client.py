@@ -0,0 +1,121 @@
+import http.server
+import os
+import threading
+import unittest
+import unittest.mock
+import urllib.error
+import urllib.request
+from src.origin_client import OriginClient
+
+
+class OriginHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.client_address))
+
+        headers = {}
+        if self.path == '/unavailable' and len(self.requests) % 2:
+            status, body = 503, b''
+        elif self.path.startswith('/redirect/'):
+            # Redirect to /redirect/<hops - 1>, until /redirect/0
+            hops = int(self.path.rsplit('/', 1)[1])
+            status, body = (302, b'') if hops else (200, b'redirected')
+            headers['Location'] = '/redirect/{}'.format(hops - 1)
+        elif self.path == '/missing':
+            status, body = 404, b'not found'
+        else:
+            status, body = 200, self.path.encode()
+
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestOriginClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), OriginHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = 'http://127.0.0.1:{}'.format(cls.server.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        OriginHandler.requests = []
+
+    def test_connections_are_reused(self):
+        """
+        Test if sequential requests to the same host use the same connection
+        """
+        origin_client = OriginClient()
+
+        for index in range(3):
+            response = origin_client.urlopen(urllib.request.Request('{}/{}'.format(self.url, index)))
+            self.assertEqual(response.read(), '/{}'.format(index).encode())
+
+        self.assertEqual(len({client_address for _, client_address in OriginHandler.requests}), 1)
+
+    def test_errors(self):
+        """
+        Test if errors are raised like urllib does
+        """
+        origin_client = OriginClient(connect_timeout_seconds=0.5, retries=0)
+
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            origin_client.urlopen(urllib.request.Request(self.url + '/missing'))
+        self.assertEqual(context.exception.code, 404)
+        self.assertEqual(context.exception.read(), b'not found')
+
+        with self.assertRaises(urllib.error.URLError):
+            origin_client.urlopen(urllib.request.Request('http://127.0.0.1:1/'))
+
+    def test_retries(self):
+        """
+        Test if unavailable responses are retried
+        """
+        origin_client = OriginClient(backoff_factor=0)
+
+        response = origin_client.urlopen(urllib.request.Request(self.url + '/unavailable'))
+
+        self.assertEqual(response.read(), b'/unavailable')
+        self.assertEqual(len(OriginHandler.requests), 2)
+
+    def test_redirects(self):
+        """
+        Test if redirects are followed even without retries, up to the urllib limit
+        """
+        origin_client = OriginClient(retries=0)
+
+        response = origin_client.urlopen(urllib.request.Request(self.url + '/redirect/3'))
+        self.assertEqual(response.read(), b'redirected')
+        self.assertEqual(len(OriginHandler.requests), 4)
+
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            origin_client.urlopen(urllib.request.Request(self.url + '/redirect/20'))
+        self.assertEqual(context.exception.code, 302)
+
+    def test_proxy(self):
+        """
+        Test if the requests go through the proxy configured in the environment
+        """
+        with unittest.mock.patch.dict(os.environ, {'http_proxy': self.url, 'no_proxy': 'localhost'}):
+            origin_client = OriginClient()
+
+        response = origin_client.urlopen(urllib.request.Request('http://origin.test/proxied'))
+
+        self.assertEqual(response.read(), b'http://origin.test/proxied')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import unittest.mock
+from src import quotas
+from src.settings import QuotaConfig
+
+
+class TestQuotas(unittest.TestCase):
+    def setUp(self):
+        patcher = unittest.mock.patch.object(QuotaConfig, 'QUOTAS_BYTES', {'api': 1024})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_namespace(self):
+        """
+        Test if only the namespaces with quota are found
+        """
+        self.assertEqual(quotas.get_namespace('api:http://example.com/'), 'api')
+        self.assertIsNone(quotas.get_namespace('http://example.com/'))
+        self.assertIsNone(quotas.get_namespace('other:key'))
+
+    def test_get_usage(self):
+        """
+        Test if the usage is read from the results of its commands
+        """
+        with unittest.mock.patch.object(QuotaConfig, 'QUOTAS_BYTES', {'api': 1024, 'images': 2048}):
+            self.assertEqual(quotas.get_usage([[], b'100', 2, [], None, 0]),
+                             {'api': {'quota_bytes': 1024, 'used_bytes': 100, 'keys': 2},
+                              'images': {'quota_bytes': 2048, 'used_bytes': 0, 'keys': 0}})
+
+    def test_record_evictions(self):
+        """
+        Test if the keys evicted by many writes are gathered
+        """
+        self.assertEqual(quotas.record_evictions([[b'api:key1'], [], [b'api:key2', b'api:key3']]),
+                         ['api:key1', 'api:key2', 'api:key3'])
+
+    def test_access_batcher(self):
+        """
+        Test if the reads of keys with quota are counted
+        """
+        access_batcher = quotas.AccessBatcher()
+
+        self.assertTrue(access_batcher.record_access('api:key1'))
+        self.assertTrue(access_batcher.record_access('api:key1'))
+        self.assertFalse(access_batcher.record_access('other:key2'))
+
+        self.assertEqual(access_batcher.pop_pending(), {'api:key1': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,18 @@
 import time
 import unittest
+import unittest.mock
+import redis
+from src import invalidation, serializers
+from src.circuit_breaker import CircuitBreaker
+from src.local_cache import LocalCache
 from src.redis_client import RedisCli
-from src.settings import RedisConfig
+from src.settings import FailoverConfig, InvalidationConfig, QuotaConfig, RedisConfig
+
+try:
+    import fakeredis
+    from benchmarks import stand_ins
+except ImportError:
+    stand_ins = None
 
 
 class TestRedisClient(unittest.TestCase):
@@ -121,6 +132,362 @@ class TestRedisClient(unittest.TestCase):
         # Check if value is now None
         self.assertIsNone(value_from_server)
 
+    def test_write_and_read_many(self):
+        """
+        Test the saving and reading of many keys in a single request
+        """
+        redis_cli = self.get_redis_cli_connection()
+        values = dict(key_many_str='value_many', key_many_tuple=(12, 13), key_many_bytes=b'123lkdfuh')
+        redis_cli.delete('key_many_missing')
+
+        self.assertTrue(redis_cli.write_many(values))
+        values_from_server = redis_cli.read_many(list(values) + ['key_many_missing'])
+
+        self.assertEqual(list(values.values()) + [None], values_from_server)
+
+    def test_read_default(self):
+        """
+        Test if keys not found are told from keys whose value is None
+        """
+        redis_cli = self.get_redis_cli_connection()
+        redis_cli.write('key_none', None)
+        redis_cli.delete('key_default_missing')
+
+        # Wait the replication
+        time.sleep(0.1)
+        self.assertIsNone(redis_cli.read('key_none', default=False))
+        self.assertFalse(redis_cli.read('key_default_missing', default=False))
+        self.assertEqual(redis_cli.read_many(['key_none', 'key_default_missing'], default=False), [None, False])
+
+    def test_write_and_read_stream(self):
+        """
+        Test the saving and reading of a key in chunks
+        """
+        redis_cli = self.get_redis_cli_connection()
+        chunks = [b'chunk1', b'chunk2', b'chunk3']
+
+        stream_writer = redis_cli.create_stream_writer('key_stream', 60)
+        for chunk in chunks:
+            stream_writer.write(chunk)
+        self.assertTrue(stream_writer.close())
+
+        # Wait the replication
+        time.sleep(0.1)
+        self.assertEqual(list(redis_cli.read_stream('key_stream')), chunks)
+        self.assertIsNone(redis_cli.read_stream('key_stream_missing'))
+
+    def test_namespace_quota(self):
+        """
+        Test if the least recently used keys of a namespace are evicted when its quota is exceeded
+        """
+        redis_cli = self.get_redis_cli_connection()
+        QuotaConfig.QUOTAS_BYTES = {'test_quota': 100}
+
+        try:
+            for index in range(4):
+                redis_cli.delete('test_quota:key{}'.format(index))
+            for index in range(3):
+                redis_cli.write('test_quota:key{}'.format(index), b'x' * 30, 60)
+            redis_cli.rank_accesses({'test_quota:key0': 1})
+            redis_cli.write('test_quota:key3', b'x' * 30, 60)
+
+            # Wait the replication
+            time.sleep(0.1)
+            self.assertIsNone(redis_cli.read('test_quota:key1'))
+            self.assertEqual(redis_cli.read('test_quota:key0'), b'x' * 30)
+
+            usage = redis_cli.get_quota_usage()['test_quota']
+            self.assertEqual(usage['keys'], 3)
+            self.assertLessEqual(usage['used_bytes'], 100)
+        finally:
+            QuotaConfig.QUOTAS_BYTES = {}
+
+
+@unittest.skipIf(stand_ins is None, 'fakeredis is not installed')
+class TestRedisClientStandIns(unittest.TestCase):
+    """
+    Tests with in-process stand-ins of the sentinel and servers (benchmarks.stand_ins), so they don't need them.
+    """
+
+    def setUp(self):
+        installed = stand_ins.installed()
+        self.server = installed.__enter__()
+        self.addCleanup(installed.__exit__, None, None, None)
+
+    @staticmethod
+    def get_redis_cli_connection(local_cache=None, serializer=None):
+        return RedisCli(RedisConfig.SENTINEL_SERVERS,
+                        RedisConfig.SENTINEL_MASTER_NAME,
+                        RedisConfig.SERVERS_PASSWORD,
+                        RedisConfig.SENTINEL_SOCKET_TIMEOUT,
+                        local_cache,
+                        serializer)
+
+    def patch_slaves_rtt(self, slaves_rtt):
+        """
+        Make the sentinel discover the slaves of a dictionary and their PINGs take its round trip times.
+        :param slaves_rtt: Dictionary with the round trip time in seconds by slave address, or None if it doesn't
+                           answer. Changes are seen by the next discoveries.
+        """
+        for target, attribute, value in ((stand_ins.StandInSentinel, 'discover_slaves',
+                                          staticmethod(lambda master_name: list(slaves_rtt))),
+                                         (RedisCli, '_ping_slave', lambda redis_cli, address: slaves_rtt[address])):
+            patcher = unittest.mock.patch.object(target, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_refresh_topology_drops_dead_slave(self):
+        """
+        Test if a slave that doesn't answer is dropped by the topology refresh
+        """
+        paris, toronto = stand_ins.SLAVES_ADDRESSES
+        slaves_rtt = {paris: 0.01, toronto: 0.02}
+        self.patch_slaves_rtt(slaves_rtt)
+        redis_cli = self.get_redis_cli_connection()
+        redis_cli.refresh_topology()
+
+        slaves_rtt[paris] = None
+        redis_cli.refresh_topology()
+
+        self.assertEqual([slave[:2] for slave in redis_cli.slaves], [toronto])
+        self.assertEqual([address for address, _ in redis_cli.read_servers], [toronto, stand_ins.MASTER_ADDRESS])
+        self.assertNotIn(paris, redis_cli.slaves_rtt)
+
+    def test_refresh_topology_adds_new_slave(self):
+        """
+        Test if a slave discovered by the sentinel after the client was created starts to be used
+        """
+        new_slave = ('10.0.0.4', 6379)
+        slaves_rtt = {address: 0.02 for address in stand_ins.SLAVES_ADDRESSES}
+        self.patch_slaves_rtt(slaves_rtt)
+        redis_cli = self.get_redis_cli_connection()
+
+        slaves_rtt[new_slave] = 0.001
+        redis_cli.refresh_topology()
+
+        self.assertIn(new_slave, [slave[:2] for slave in redis_cli.slaves])
+        self.assertEqual(redis_cli.read_servers[0][0], new_slave)
+
+    def test_refresh_topology_ranks_by_average_rtt(self):
+        """
+        Test if the slave with the lowest average round trip time is ranked first, even if it's the farthest
+        and its last round trip time is not the lowest
+        """
+        paris, toronto = stand_ins.SLAVES_ADDRESSES
+        slaves_rtt = {paris: 0.001, toronto: 0.05}
+        self.patch_slaves_rtt(slaves_rtt)
+        redis_cli = self.get_redis_cli_connection()
+        self.assertEqual(redis_cli.read_servers[0][0], toronto)
+
+        redis_cli.refresh_topology()
+        slaves_rtt[paris] = 0.1
+        redis_cli.refresh_topology()
+
+        self.assertEqual(redis_cli.read_servers[0][0], paris)
+        self.assertIs(redis_cli.nearest_cache, redis_cli.read_servers[0][1])
+
+    def test_start_topology_refresh(self):
+        """
+        Test if the topology is refreshed in background until stopped
+        """
+        paris, toronto = stand_ins.SLAVES_ADDRESSES
+        slaves_rtt = {paris: 0.01, toronto: 0.02}
+        self.patch_slaves_rtt(slaves_rtt)
+        redis_cli = self.get_redis_cli_connection()
+        redis_cli.start_topology_refresh(0.01)
+        self.addCleanup(redis_cli.stop_topology_refresh)
+
+        slaves_rtt[paris] = None
+        deadline = time.monotonic() + 5
+        while paris in [slave[:2] for slave in redis_cli.slaves] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        redis_cli.stop_topology_refresh()
+
+        self.assertEqual([slave[:2] for slave in redis_cli.slaves], [toronto])
+
+    def set_read_servers(self, redis_cli):
+        """
+        Make each slave of a client a separate server, with the key "key" set to its city, and the master too.
+        :param redis_cli: Redis client.
+        :return: Dictionary with the fakeredis server of each slave and of the master by city.
+        """
+        servers = {'paris': fakeredis.FakeServer(), 'toronto': fakeredis.FakeServer(), 'new_york': self.server}
+        read_servers = []
+
+        for city, address in zip(servers, stand_ins.SLAVES_ADDRESSES + [stand_ins.MASTER_ADDRESS]):
+            server = fakeredis.FakeRedis(server=servers[city])
+            server.set('key', serializers.get_serializer('binary').dumps(city))
+            read_servers.append((address, server))
+
+        redis_cli.read_servers = read_servers
+        return servers
+
+    def test_read_failover(self):
+        """
+        Test if reads fall over to the next nearest slave and then to the master when servers fail
+        """
+        paris, toronto = stand_ins.SLAVES_ADDRESSES
+        redis_cli = self.get_redis_cli_connection()
+        servers = self.set_read_servers(redis_cli)
+        self.assertEqual(redis_cli.read('key'), 'paris')
+
+        servers['paris'].connected = False
+        self.assertEqual(redis_cli.read('key'), 'toronto')
+        self.assertEqual(redis_cli.read_many(['key']), ['toronto'])
+
+        servers['toronto'].connected = False
+        self.assertEqual(redis_cli.read('key'), 'new_york')
+        self.assertEqual(redis_cli._get_circuit_breaker(paris).state, CircuitBreaker.OPEN)
+        self.assertEqual(redis_cli._get_circuit_breaker(toronto).state, CircuitBreaker.OPEN)
+
+        servers['new_york'].connected = False
+        self.assertIsNone(redis_cli.read('key'))
+
+    def test_read_failover_skips_open_circuit(self):
+        """
+        Test if a server that failed is skipped while its circuit breaker is open, and used again after it's reset
+        """
+        paris = stand_ins.SLAVES_ADDRESSES[0]
+        redis_cli = self.get_redis_cli_connection()
+        servers = self.set_read_servers(redis_cli)
+
+        servers['paris'].connected = False
+        self.assertEqual(redis_cli.read('key'), 'toronto')
+
+        # The server is back, but it's not tried until the reset timeout
+        servers['paris'].connected = True
+        with unittest.mock.patch.object(redis_cli.read_servers[0][1], 'get', side_effect=AssertionError) as get:
+            self.assertEqual(redis_cli.read('key'), 'toronto')
+        get.assert_not_called()
+
+        redis_cli._get_circuit_breaker(paris).opened_at -= redis_cli._get_circuit_breaker(paris).reset_timeout_seconds
+        self.assertEqual(redis_cli.read('key'), 'paris')
+        self.assertEqual(redis_cli._get_circuit_breaker(paris).state, CircuitBreaker.CLOSED)
+
+    def test_read_failover_pool_exhausted(self):
+        """
+        Test if a server whose local connection pool has no connection available is skipped without opening its
+        circuit breaker
+        """
+        paris = stand_ins.SLAVES_ADDRESSES[0]
+        redis_cli = self.get_redis_cli_connection()
+        self.set_read_servers(redis_cli)
+
+        with unittest.mock.patch.object(redis_cli.read_servers[0][1], 'get',
+                                        side_effect=redis.ConnectionError('No connection available.')):
+            self.assertEqual(redis_cli.read('key'), 'toronto')
+
+        self.assertEqual(redis_cli._get_circuit_breaker(paris).state, CircuitBreaker.CLOSED)
+        self.assertEqual(redis_cli.read('key'), 'paris')
+
+    def test_master_socket_timeout(self):
+        """
+        Test if the master connection has its own socket timeout, used by the writes
+        """
+        with unittest.mock.patch.object(RedisCli, '_redis_server_connection', autospec=True,
+                                        side_effect=RedisCli._redis_server_connection) as create_connection:
+            redis_cli = self.get_redis_cli_connection()
+
+        create_connection.assert_any_call(redis_cli, *stand_ins.MASTER_ADDRESS, FailoverConfig.MASTER_SOCKET_TIMEOUT)
+
+    def test_json_non_utf8_bytes(self):
+        """
+        Test if bytes that are not valid UTF-8 are written with the json serializer
+        """
+        redis_cli = self.get_redis_cli_connection(serializer=serializers.get_serializer('json'))
+        value = b'\xff\xfe\x00 not utf-8'
+
+        self.assertTrue(redis_cli.write('key_bytes', value))
+        self.assertEqual(redis_cli.read('key_bytes'), value)
+
+    def test_local_cache_expires_with_server(self):
+        """
+        Test if keys read from the server expire in the local cache when they expire in the server
+        """
+        redis_cli = self.get_redis_cli_connection(local_cache=LocalCache(default_expiration_seconds=60))
+        redis_cli.master.set('key_ttl', serializers.get_serializer('binary').dumps('value'), px=200)
+        redis_cli.master.set('key_many_ttl', serializers.get_serializer('binary').dumps('value'), px=200)
+
+        self.assertEqual(redis_cli.read('key_ttl'), 'value')
+        self.assertEqual(redis_cli.read_many(['key_many_ttl']), ['value'])
+        time.sleep(0.3)
+
+        self.assertIsNone(redis_cli.read('key_ttl'))
+        self.assertEqual(redis_cli.read_many(['key_many_ttl']), [None])
+
+    def test_local_cache_values_are_copies(self):
+        """
+        Test if changing a value read doesn't change the value read by the next readers
+        """
+        redis_cli = self.get_redis_cli_connection(local_cache=LocalCache())
+        redis_cli.write('key_list', [1, 2])
+
+        for read in (lambda: redis_cli.read('key_list'), lambda: redis_cli.read_many(['key_list'])[0]):
+            redis_cli.local_cache.clear()
+            read().append(3)
+            read().append(3)
+            self.assertEqual(read(), [1, 2])
+
+    def test_write_not_serializable(self):
+        """
+        Test if values that can't be serialized are not written, without preventing the others from being written
+        """
+        redis_cli = self.get_redis_cli_connection(serializer=serializers.get_serializer('json'))
+
+        self.assertFalse(redis_cli.write('key_set', {1, 2}))
+        self.assertIsNone(redis_cli.read('key_set'))
+
+        self.assertFalse(redis_cli.write_many({'key_set': {1, 2}, 'key_str': 'value'}))
+        self.assertEqual(redis_cli.read_many(['key_set', 'key_str']), [None, 'value'])
+
+    def test_quota_lowered_with_key_over_quota(self):
+        """
+        Test if writing a key bigger than a quota lowered below the bytes already used evicts it and the other keys
+        of the namespace, instead of looping forever
+        """
+        redis_cli = self.get_redis_cli_connection()
+
+        with unittest.mock.patch.object(QuotaConfig, 'QUOTAS_BYTES', {'api': 100}):
+            self.assertTrue(redis_cli.write('api:k1', 'a' * 78))
+            self.assertEqual(redis_cli.get_quota_usage()['api']['used_bytes'], 80)
+
+        with unittest.mock.patch.object(QuotaConfig, 'QUOTAS_BYTES', {'api': 50}):
+            self.assertTrue(redis_cli.write('api:k2', 'b' * 58))
+            self.assertEqual(redis_cli.read_many(['api:k1', 'api:k2']), [None, None])
+            self.assertEqual(redis_cli.get_quota_usage()['api'], {'quota_bytes': 50, 'used_bytes': 0, 'keys': 0})
+
+    def test_quota_evictions_invalidated(self):
+        """
+        Test if the keys evicted by a quota are removed from the local cache of the client writing and published
+        for the other clients
+        """
+        redis_cli = self.get_redis_cli_connection(local_cache=LocalCache())
+        other_redis_cli = self.get_redis_cli_connection(local_cache=LocalCache())
+        subscription = redis_cli.master.pubsub(ignore_subscribe_messages=True)
+
+        with unittest.mock.patch.object(QuotaConfig, 'QUOTAS_BYTES', {'api': 100}), \
+                unittest.mock.patch.object(InvalidationConfig, 'ENABLED', True):
+            # The first write loads the quota script in the master
+            self.assertTrue(redis_cli.write('api:key1', 'a' * 60))
+            self.assertEqual(other_redis_cli.read('api:key1'), 'a' * 60)
+            subscription.subscribe(InvalidationConfig.CHANNEL)
+            self.assertTrue(redis_cli.write('api:key2', 'b' * 60))
+
+            self.assertIsNone(redis_cli.read('api:key1'))
+            self.assertEqual(redis_cli.get_quota_usage()['api']['keys'], 1)
+
+            # The first message read is the subscription confirmation, ignored
+            messages = [subscription.get_message(timeout=1.0) for _ in range(3)][1:]
+            self.assertEqual([invalidation.get_invalidated_keys(message, other_redis_cli._client_id)
+                              for message in messages],
+                             [['api:key1'], ['api:key2']])
+            for message in messages:
+                other_redis_cli._invalidate_local_cache(message)
+            self.assertIsNone(other_redis_cli.read('api:key1'))
+
+        subscription.close()
+
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,174 @@
+import json
+import pickle
+import unittest
+import unittest.mock
+from src import compression, serializers
+from src.settings import SerializerConfig
+
+
+class TestSerializers(unittest.TestCase):
+    values = [
+        None,
+        True,
+        False,
+        1000,
+        -2 ** 70,
+        5.9876,
+        'value_key_1',
+        'ação',
+        b'123lkdfuh',
+        b'\xff\xfe\x00 not utf-8',
+        bytearray(b'test 123'),
+        [10, 45, 100],
+        (12, 13),
+        dict(field_1=10, field_2=b'\x80', internal_dict=dict(internal_field=(1, 'a')), field_3=[None, 1.5]),
+        {1: 'integer key'},
+        [],
+        {},
+        b'',
+        '',
+    ]
+
+    def save_and_check_values(self, serializer_name, types_read_as_bytes=()):
+        """
+        Test if all values are restored with their original types
+        """
+        serializer = serializers.get_serializer(serializer_name)
+
+        for value in self.values:
+            value_from_server = serializers.loads(serializer.dumps(value))
+            self.assertEqual(value, value_from_server)
+            expected_type = bytes if isinstance(value, types_read_as_bytes) else type(value)
+            self.assertIs(expected_type, type(value_from_server))
+
+    def test_binary_serializer(self):
+        """
+        Test binary serializer
+        """
+        self.save_and_check_values('binary')
+
+    def test_pickle_serializer(self):
+        """
+        Test pickle serializer
+        """
+        with unittest.mock.patch.object(SerializerConfig, 'SERIALIZER', 'pickle'):
+            self.save_and_check_values('pickle')
+
+    def test_pickle_not_allowed(self):
+        """
+        Test if pickled values are rejected unless pickle is the serializer configured or it's explicitly allowed
+        """
+        class Payload:
+            def __reduce__(self):
+                return exec, ('raise AssertionError("pickled code executed")',)
+
+        writen_value = bytes((serializers.PICKLE_MARKER,)) + pickle.dumps(Payload())
+
+        for serializer_name in ('binary', 'json', 'msgpack'):
+            with unittest.mock.patch.object(SerializerConfig, 'SERIALIZER', serializer_name):
+                with self.assertRaises(serializers.SerializationError):
+                    serializers.loads(writen_value)
+
+        with unittest.mock.patch.object(SerializerConfig, 'ALLOW_PICKLE', True):
+            self.assertEqual(serializers.loads(serializers.get_serializer('pickle').dumps((1, 'a'))), (1, 'a'))
+
+    @unittest.skipIf(serializers.msgpack is None, 'msgpack is not installed')
+    def test_msgpack_serializer(self):
+        """
+        Test msgpack serializer
+        """
+        self.save_and_check_values('msgpack', types_read_as_bytes=(bytearray,))
+
+    def test_binary_bytes_are_written_as_they_are(self):
+        """
+        Test if bytes are written without any encoding
+        """
+        value = b'\xff\xfe\x00 not utf-8'
+        self.assertEqual(serializers.BinarySerializer().dumps(value), b'\xb1b' + value)
+
+    def test_json_envelope_compatibility(self):
+        """
+        Test if values written in json envelopes by previous versions are read
+        """
+        legacy_values = [
+            (dict(value='value_key_1', type='str'), 'value_key_1'),
+            (dict(value=[12, 13], type='tuple'), (12, 13)),
+            (dict(value='123lkdfuh', type='bytes'), b'123lkdfuh'),
+            (dict(value=None, type='none'), None),
+            (dict(value=dict(field_1=10), type='dict'), dict(field_1=10)),
+        ]
+
+        for envelope, value in legacy_values:
+            self.assertEqual(serializers.loads(json.dumps(envelope).encode()), value)
+
+        self.assertEqual(serializers.loads(serializers.get_serializer('json').dumps((12, 13))), (12, 13))
+
+    def test_json_non_utf8_bytes(self):
+        """
+        Test if bytes that are not valid UTF-8 are restored by the json serializer, and valid ones keep the format
+        of previous versions
+        """
+        serializer = serializers.get_serializer('json')
+
+        for value in (b'\xff\xfe\x00 not utf-8', bytearray(b'\x80')):
+            self.assertEqual(serializers.loads(serializer.dumps(value)), bytes(value))
+
+        self.assertEqual(json.loads(serializer.dumps(b'123lkdfuh')), dict(value='123lkdfuh', type='bytes'))
+
+    def test_plain_text(self):
+        """
+        Test if values written by other clients in plain text are read as strings
+        """
+        self.assertEqual(serializers.loads(b'plain text'), 'plain text')
+
+
+class TestCompressedSerializer(unittest.TestCase):
+    big_value = b'{"field": "compressible json payload"}' * 100
+
+    def save_and_check_compressed_value(self, compressor_name):
+        """
+        Test if a big value is compressed and restored
+        """
+        serializer = serializers.CompressedSerializer(serializers.BinarySerializer(),
+                                                      compression.get_compressor(compressor_name))
+        writen_value = serializer.dumps(self.big_value)
+
+        self.assertEqual(writen_value[0], serializers.COMPRESSED_MARKER)
+        self.assertLess(len(writen_value), len(self.big_value))
+        self.assertEqual(serializers.loads(writen_value), self.big_value)
+
+    def test_zlib_compressor(self):
+        """
+        Test zlib compressor
+        """
+        self.save_and_check_compressed_value('zlib')
+
+    @unittest.skipIf(compression.lz4 is None, 'lz4 is not installed')
+    def test_lz4_compressor(self):
+        """
+        Test lz4 compressor
+        """
+        self.save_and_check_compressed_value('lz4')
+
+    @unittest.skipIf(compression.zstandard is None, 'zstandard is not installed')
+    def test_zstd_compressor(self):
+        """
+        Test zstd compressor
+        """
+        self.save_and_check_compressed_value('zstd')
+
+    def test_small_value_is_not_compressed(self):
+        """
+        Test if values smaller than the minimum size are not compressed
+        """
+        serializer = serializers.CompressedSerializer(serializers.BinarySerializer(),
+                                                      compression.get_compressor('zlib'),
+                                                      min_size_bytes=1024)
+        writen_value = serializer.dumps(b'small value')
+
+        self.assertEqual(writen_value, serializers.BinarySerializer().dumps(b'small value'))
+        self.assertEqual(serializers.loads(writen_value), b'small value')
+
+
+if __name__ == '__main__':
+    unittest.main()
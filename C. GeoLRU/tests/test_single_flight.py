@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+import unittest
+from src.single_flight import AsyncSingleFlight, SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_calls_are_deduplicated(self):
+        """
+        Test if concurrent calls with the same key execute the function only once
+        """
+        single_flight = SingleFlight()
+        executions = []
+        results = []
+
+        def slow_function():
+            executions.append(1)
+            time.sleep(0.2)
+            return 'result'
+
+        threads = [threading.Thread(target=lambda: results.append(single_flight.do('key', slow_function)))
+                   for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(executions), 1)
+        self.assertEqual(results, ['result'] * 10)
+
+    def test_sequential_calls_are_executed(self):
+        """
+        Test if calls that are not concurrent are all executed
+        """
+        single_flight = SingleFlight()
+        self.assertEqual(single_flight.do('key', lambda: 1), 1)
+        self.assertEqual(single_flight.do('key', lambda: 2), 2)
+
+    def test_exception_is_shared(self):
+        """
+        Test if the exception raised by the call in progress is raised to all callers
+        """
+        single_flight = SingleFlight()
+        errors = []
+
+        def failing_function():
+            time.sleep(0.2)
+            raise ValueError('origin error')
+
+        def call():
+            try:
+                single_flight.do('key', failing_function)
+            except ValueError as error:
+                errors.append(str(error))
+
+        threads = [threading.Thread(target=call) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, ['origin error'] * 5)
+
+
+class TestAsyncSingleFlight(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_calls_are_deduplicated(self):
+        """
+        Test if concurrent calls with the same key await the coroutine only once
+        """
+        single_flight = AsyncSingleFlight()
+        executions = []
+
+        async def slow_function():
+            executions.append(1)
+            await asyncio.sleep(0.2)
+            return 'result'
+
+        results = await asyncio.gather(*[single_flight.do('key', slow_function) for _ in range(10)])
+
+        self.assertEqual(len(executions), 1)
+        self.assertEqual(results, ['result'] * 10)
+
+    async def test_exception_is_shared(self):
+        """
+        Test if the exception raised by the call in progress is raised to all callers
+        """
+        single_flight = AsyncSingleFlight()
+
+        async def failing_function():
+            await asyncio.sleep(0.2)
+            raise ValueError('origin error')
+
+        results = await asyncio.gather(*[single_flight.do('key', failing_function) for _ in range(5)],
+                                       return_exceptions=True)
+
+        self.assertEqual([str(result) for result in results], ['origin error'] * 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+import unittest.mock
+from src import keys, streams
+from src.geo_lru import LruClient
+from src.settings import StreamConfig
+
+try:
+    from benchmarks import stand_ins
+except ImportError:
+    stand_ins = None
+
+
+class TestStreams(unittest.TestCase):
+    def test_keys(self):
+        """
+        Test if the manifest and the chunks of each writing have their own keys
+        """
+        self.assertEqual(streams.get_manifest_key('key'), 'stream:key')
+        self.assertEqual(streams.get_chunk_key('key', 'id1', 0), 'stream:key:id1:0')
+        self.assertNotEqual(streams.get_chunk_key('key', 'id1', 0), streams.get_chunk_key('key', 'id2', 0))
+
+    def test_chunks_expiration(self):
+        """
+        Test if chunks expire after their manifest
+        """
+        self.assertEqual(streams.get_chunks_expiration(60), 60 + StreamConfig.GRACE_SECONDS)
+        self.assertIsNone(streams.get_chunks_expiration(None))
+
+
+@unittest.skipIf(stand_ins is None, 'fakeredis is not installed')
+class TestStreamsStandIns(unittest.TestCase):
+    """
+    Tests with in-process stand-ins of the sentinel and servers (benchmarks.stand_ins), so they don't need them.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.origin_url, cls.origin = stand_ins.start_origin()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.origin.shutdown()
+        cls.origin.server_close()
+
+    def setUp(self):
+        installed = stand_ins.installed()
+        self.server = installed.__enter__()
+        self.addCleanup(installed.__exit__, None, None, None)
+
+        patcher = unittest.mock.patch.object(StreamConfig, 'CHUNK_SIZE_BYTES', 4)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.lru_client = LruClient()
+        self.redis_client = self.lru_client.redis_client
+
+    def write_stream(self, key_name, chunks, expiration_seconds=60):
+        """
+        Write a value in chunks with a stream writer.
+        """
+        stream_writer = self.redis_client.create_stream_writer(key_name, expiration_seconds)
+        for chunk in chunks:
+            stream_writer.write(chunk)
+        return stream_writer
+
+    def test_request_miss_and_hit(self):
+        """
+        Test if a response is streamed from the origin and written in chunks, and then streamed from the cache
+        """
+        url = self.origin_url + '/10/stream'
+        key_name = keys.get_cache_key(url, namespace=self.lru_client.namespace)
+
+        self.assertIsNone(self.redis_client.read_stream(key_name))
+        self.assertEqual(list(self.lru_client.request_with_cache_stream(url, cache_expiration=60)),
+                         [b'xxxx', b'xxxx', b'xx'])
+
+        manifest = self.redis_client.read(streams.get_manifest_key(key_name))
+        self.assertEqual((manifest['chunks'], manifest['size']), (3, 10))
+        self.assertLessEqual(self.redis_client.master.ttl(streams.get_chunk_key(key_name, manifest['id'], 0)),
+                             60 + StreamConfig.GRACE_SECONDS)
+
+        with unittest.mock.patch('src.geo_lru.get_origin_client', side_effect=AssertionError):
+            self.assertEqual(list(self.lru_client.request_with_cache_stream(url, cache_expiration=60)),
+                             [b'xxxx', b'xxxx', b'xx'])
+
+    def test_replaced_manifest(self):
+        """
+        Test if a value written again is read with its new chunks, while readers of the value replaced can finish
+        reading it until its chunks expire
+        """
+        self.assertTrue(self.write_stream('key_stream', [b'old1', b'old2']).close())
+        old_manifest = self.redis_client.read(streams.get_manifest_key('key_stream'))
+        old_chunks = self.redis_client.read_stream('key_stream')
+
+        self.assertTrue(self.write_stream('key_stream', [b'new1']).close())
+
+        self.assertEqual(list(self.redis_client.read_stream('key_stream')), [b'new1'])
+        self.assertEqual(list(old_chunks), [b'old1', b'old2'])
+        for index in range(old_manifest['chunks']):
+            self.assertLessEqual(
+                self.redis_client.master.ttl(streams.get_chunk_key('key_stream', old_manifest['id'], index)),
+                StreamConfig.GRACE_SECONDS)
+
+    def test_interrupted_stream_not_cached(self):
+        """
+        Test if a response not read until its end, or a stream writer not closed, is not cached
+        """
+        url = self.origin_url + '/10/interrupted'
+        key_name = keys.get_cache_key(url, namespace=self.lru_client.namespace)
+
+        chunks = self.lru_client.request_with_cache_stream(url, cache_expiration=60)
+        self.assertEqual(next(chunks), b'xxxx')
+        chunks.close()
+        self.assertIsNone(self.redis_client.read_stream(key_name))
+
+        stream_writer = self.write_stream('key_not_closed', [b'part'])
+        self.assertIsNone(self.redis_client.read_stream('key_not_closed'))
+        self.assertLessEqual(
+            self.redis_client.master.ttl(streams.get_chunk_key('key_not_closed', stream_writer.stream_id, 0)),
+            StreamConfig.PENDING_EXPIRATION_SECONDS)
+
+
+if __name__ == '__main__':
+    unittest.main()
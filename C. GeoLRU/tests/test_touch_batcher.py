@@ -0,0 +1,57 @@
+import time
+import unittest
+from src.touch_batcher import TouchBatcher
+
+
+class Renewer:
+    def __init__(self):
+        self.renewals = []
+
+    def expire_many(self, expirations):
+        self.renewals.append(expirations)
+
+
+class TestTouchBatcher(unittest.TestCase):
+    def test_touches_are_coalesced(self):
+        """
+        Test if a key touched many times is renewed once, with its last expiration
+        """
+        touch_batcher = TouchBatcher()
+
+        touch_batcher.touch('key1', 10)
+        touch_batcher.touch('key2', 20)
+        touch_batcher.touch('key1', 30)
+
+        self.assertEqual(touch_batcher.pop_pending(), {'key1': 30, 'key2': 20})
+        self.assertEqual(touch_batcher.pop_pending(), {})
+
+    def test_renew_periodically(self):
+        """
+        Test if the touched keys are renewed together in background
+        """
+        touch_batcher = TouchBatcher(interval_seconds=0.05)
+        renewer = Renewer()
+
+        touch_batcher.touch('key1', 10)
+        touch_batcher.touch('key2', 20)
+        touch_batcher.start(renewer.expire_many)
+        time.sleep(0.2)
+
+        self.assertEqual(renewer.renewals, [{'key1': 10, 'key2': 20}])
+
+    def test_stop_when_renewer_is_collected(self):
+        """
+        Test if the background thread stops when the renewal method object is garbage collected
+        """
+        touch_batcher = TouchBatcher(interval_seconds=0.05)
+        renewer = Renewer()
+
+        touch_batcher.start(renewer.expire_many)
+        del renewer
+        touch_batcher._thread.join(1)
+
+        self.assertFalse(touch_batcher._thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
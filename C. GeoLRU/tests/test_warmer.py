@@ -0,0 +1,72 @@
+import os
+import tempfile
+import threading
+import unittest
+import urllib.error
+from src import keys
+from src.warmer import CacheWarmer, read_manifest
+
+
+class RedisClient:
+    def __init__(self, cached_urls):
+        self.cached_keys = {keys.get_cache_key(url) for url in cached_urls}
+
+    def exists_many(self, key_names):
+        return [key_name in self.cached_keys for key_name in key_names]
+
+
+class LruClient:
+    namespace = None
+
+    def __init__(self, cached_urls=()):
+        self.redis_client = RedisClient(cached_urls)
+        self.requests = []
+        self.flushed = False
+        self._lock = threading.Lock()
+
+    def request_with_cache(self, url, cache_expiration=None):
+        if 'fail' in url:
+            raise urllib.error.URLError('failed')
+        with self._lock:
+            self.requests.append((url, cache_expiration))
+
+    def flush_writes(self):
+        self.flushed = True
+
+
+class TestWarmer(unittest.TestCase):
+    def test_read_manifest(self):
+        """
+        Test if the URLs and their expirations are read from the manifest file
+        """
+        file_descriptor, file_path = tempfile.mkstemp()
+        with os.fdopen(file_descriptor, 'w') as manifest_file:
+            manifest_file.write('# comment\nhttp://example.com/a 60\n\nhttp://example.com/b\n')
+
+        try:
+            self.assertEqual(list(read_manifest(file_path)),
+                             [('http://example.com/a', 60), ('http://example.com/b', None)])
+        finally:
+            os.remove(file_path)
+
+    def test_warm(self):
+        """
+        Test if only the URLs missing in the cache are requested, in batches
+        """
+        lru_client = LruClient(cached_urls=['http://example.com/1'])
+        cache_warmer = CacheWarmer(lru_client, workers=2, batch_size=2)
+        progresses = []
+
+        progress = cache_warmer.warm(['http://example.com/0', 'http://example.com/1',
+                                      ('http://example.com/2', 60), 'http://example.com/fail'],
+                                     lambda current: progresses.append(current.urls))
+
+        self.assertEqual(sorted(lru_client.requests),
+                         [('http://example.com/0', None), ('http://example.com/2', 60)])
+        self.assertEqual((progress.urls, progress.warmed, progress.skipped, progress.failed), (4, 2, 1, 1))
+        self.assertEqual(progresses, [2, 4])
+        self.assertTrue(lru_client.flushed)
+
+
+if __name__ == '__main__':
+    unittest.main()
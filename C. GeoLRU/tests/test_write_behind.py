@@ -0,0 +1,160 @@
+import threading
+import time
+import unittest
+from src.write_behind import BLOCK, DROP_NEWEST, DROP_OLDEST, WriteBehindQueue
+
+
+class Writer:
+    def __init__(self):
+        self.writes = []
+
+    def write_many(self, values, expiration_seconds=None):
+        self.writes.append((values, expiration_seconds))
+
+
+class BlockingWriter(Writer):
+    """
+    Writer that blocks each write until released.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def write_many(self, values, expiration_seconds=None):
+        self.writing.set()
+        self.release.wait(1)
+        super().write_many(values, expiration_seconds)
+
+
+class TestWriteBehindQueue(unittest.TestCase):
+    def test_writes_are_batched(self):
+        """
+        Test if the queued writes are sent together, grouped by expiration, and are readable until flushed
+        """
+        write_behind_queue = WriteBehindQueue(flush_interval_seconds=0.05)
+        writer = Writer()
+
+        write_behind_queue.put('key1', 'value1', 10)
+        write_behind_queue.put('key2', 'value2', 20)
+        write_behind_queue.put('key1', 'value3', 10)
+        write_behind_queue.put('key4', 'value4', 10)
+        self.assertEqual(write_behind_queue.get('key1'), 'value3')
+
+        write_behind_queue.start(writer.write_many)
+        self.assertTrue(write_behind_queue.flush(1))
+
+        self.assertEqual(sorted(writer.writes, key=lambda write: write[1]),
+                         [({'key1': 'value3', 'key4': 'value4'}, 10), ({'key2': 'value2'}, 20)])
+        self.assertIsNone(write_behind_queue.get('key1'))
+
+    def test_discard(self):
+        """
+        Test if a discarded write is not sent
+        """
+        write_behind_queue = WriteBehindQueue(flush_interval_seconds=0.01)
+        writer = Writer()
+
+        write_behind_queue.put('key1', 'value1')
+        write_behind_queue.discard('key1')
+        write_behind_queue.start(writer.write_many)
+
+        self.assertTrue(write_behind_queue.flush(1))
+        self.assertEqual(writer.writes, [])
+
+    def test_discard_taken_in_batch(self):
+        """
+        Test if a discarded write already taken in a batch, but not sent yet, is not sent
+        """
+        write_behind_queue = WriteBehindQueue(flush_interval_seconds=0.01)
+        writer = BlockingWriter()
+
+        write_behind_queue.put('key1', 'value1', 10)
+        write_behind_queue.put('key2', 'value2', 20)
+        write_behind_queue.start(writer.write_many)
+
+        # key1 is being sent and key2 waits in the same batch
+        self.assertTrue(writer.writing.wait(1))
+        write_behind_queue.discard('key2')
+        self.assertIsNone(write_behind_queue.get('key2'))
+        writer.release.set()
+
+        self.assertTrue(write_behind_queue.flush(1))
+        self.assertEqual(writer.writes, [({'key1': 'value1'}, 10)])
+
+    def test_discard_waits_for_sending(self):
+        """
+        Test if discarding a write being sent waits for it, so a newer write of the key comes after it
+        """
+        write_behind_queue = WriteBehindQueue(flush_interval_seconds=0.01)
+        writer = BlockingWriter()
+
+        write_behind_queue.put('key1', 'value1')
+        write_behind_queue.start(writer.write_many)
+
+        self.assertTrue(writer.writing.wait(1))
+        threading.Timer(0.1, writer.release.set).start()
+        write_behind_queue.discard('key1')
+
+        self.assertEqual(writer.writes, [({'key1': 'value1'}, None)])
+
+    def test_drop_newest(self):
+        """
+        Test if new writes are dropped when the queue is full, but writes of queued keys replace them
+        """
+        write_behind_queue = WriteBehindQueue(max_pending=2, overflow_policy=DROP_NEWEST)
+
+        self.assertTrue(write_behind_queue.put('key1', 'value1'))
+        self.assertTrue(write_behind_queue.put('key2', 'value2'))
+        self.assertFalse(write_behind_queue.put('key3', 'value3'))
+        self.assertTrue(write_behind_queue.put('key1', 'value4'))
+
+        self.assertEqual(write_behind_queue.dropped, 1)
+        self.assertIsNone(write_behind_queue.get('key3'))
+        self.assertEqual(write_behind_queue.get('key1'), 'value4')
+
+    def test_drop_oldest(self):
+        """
+        Test if the oldest write is dropped when the queue is full
+        """
+        write_behind_queue = WriteBehindQueue(max_pending=2, overflow_policy=DROP_OLDEST)
+
+        write_behind_queue.put('key1', 'value1')
+        write_behind_queue.put('key2', 'value2')
+        self.assertTrue(write_behind_queue.put('key3', 'value3'))
+
+        self.assertEqual(write_behind_queue.dropped, 1)
+        self.assertIsNone(write_behind_queue.get('key1'))
+        self.assertEqual(write_behind_queue.get('key3'), 'value3')
+
+    def test_block(self):
+        """
+        Test if a write waits for space in the full queue, and is dropped after the timeout
+        """
+        write_behind_queue = WriteBehindQueue(max_pending=1, overflow_policy=BLOCK, block_timeout_seconds=0.1)
+
+        write_behind_queue.put('key1', 'value1')
+        started_at = time.monotonic()
+
+        self.assertFalse(write_behind_queue.put('key2', 'value2'))
+        self.assertGreaterEqual(time.monotonic() - started_at, 0.1)
+        self.assertEqual(write_behind_queue.dropped, 1)
+
+    def test_close(self):
+        """
+        Test if closing sends the queued writes and rejects new ones
+        """
+        write_behind_queue = WriteBehindQueue(flush_interval_seconds=10)
+        writer = Writer()
+
+        write_behind_queue.put('key1', 'value1')
+        write_behind_queue.start(writer.write_many)
+
+        self.assertTrue(write_behind_queue.close(1))
+        self.assertFalse(write_behind_queue.put('key2', 'value2'))
+        self.assertEqual(writer.writes, [({'key1': 'value1'}, None)])
+
+
+if __name__ == '__main__':
+    unittest.main()